@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+bench_html.py
+Быстрый разбор HTML (scripts/html_extract.py, lxml + XPath) против прежнего
+BeautifulSoup + CSS select на сохранённых страницах bench/fixtures/:
+  tg_*.html     — t.me/s/<channel> и зеркало r.jina.ai: collector.tg_items;
+  vendor_*.html — страницы трендов: trends.page_text.
+Сначала проверяет, что оба пути дают одно и то же, затем меряет время.
+
+  python bench/bench_html.py [--repeat 20] [файлы...]
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import collector  # noqa: E402
+import html_extract  # noqa: E402
+
+FIXTURES = ROOT / "bench" / "fixtures"
+CHANNEL = "stockphoto_news"   # канал, с которого сохранены tg_*.html
+
+
+def extract(path: pathlib.Path, markup: str, fast: bool):
+    html_extract.FAST = fast
+    try:
+        if path.name.startswith("tg_"):
+            return collector.tg_items(CHANNEL, markup)[0]
+        return html_extract.page_text(markup)
+    finally:
+        html_extract.FAST = True
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*", type=pathlib.Path)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    # в зеркале у записей нет даты — published = iso_now(); для сверки фиксируем
+    collector.iso_now = lambda: "2024-01-01T00:00:00+00:00"
+
+    files = args.files or sorted(FIXTURES.glob("*.html"))
+    ok = True
+    total_bs4 = total_fast = 0.0
+    for path in files:
+        markup = path.read_text(encoding="utf-8")
+        ref = extract(path, markup, fast=False)
+        got = extract(path, markup, fast=True)
+        same = got == ref
+        ok &= same
+        n = len(ref) if isinstance(ref, list) else len(ref.split())
+        unit = "items" if isinstance(ref, list) else "words"
+        t_bs4 = best_of(lambda: extract(path, markup, fast=False), args.repeat)
+        t_fast = best_of(lambda: extract(path, markup, fast=True), args.repeat)
+        total_bs4 += t_bs4
+        total_fast += t_fast
+        print(f"{path.name:24s} {len(markup) / 1024:7.1f} KB  {n:6d} {unit:5s}  "
+              f"bs4 {t_bs4 * 1000:8.2f} ms  lxml {t_fast * 1000:7.2f} ms  "
+              f"x{t_bs4 / t_fast if t_fast else 0:5.1f}  {'OK' if same else 'MISMATCH'}")
+    if total_fast:
+        print(f"{'total':24s} bs4 {total_bs4 * 1000:.2f} ms, lxml {total_fast * 1000:.2f} ms, x{total_bs4 / total_fast:.1f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
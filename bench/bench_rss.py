@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+bench_rss.py
+Потоковый разбор RSS/Atom (scripts/rss_stream.py + feedparser по новым записям)
+против feedparser по всему телу на синтетических лентах: --items записей с полным
+текстом, из них --new новых сверху, остальное уже видели прошлым запуском.
+Сначала проверяет, что новые записи обоих путей совпадают, затем меряет время.
+
+  python bench/bench_rss.py [--items 500] [--new 5] [--repeat 5]
+"""
+
+import argparse
+import datetime
+import pathlib
+import sys
+import time
+from email.utils import format_datetime
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import feedparser  # noqa: E402
+
+import collector  # noqa: E402
+import rss_stream  # noqa: E402
+
+BASE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+BODY = "<p>Полный текст записи со <a href='/rel'>ссылкой</a> и картинкой <img src='x.jpg'></p>" * 20
+CONTENT_TYPE = "application/xml; charset=utf-8"
+
+
+def make_feed(ids, atom: bool) -> bytes:
+    parts = []
+    for i in ids:
+        dt = BASE + datetime.timedelta(hours=i)
+        if atom:
+            parts.append(f'<entry><title>Запись {i}</title><link rel="alternate" href="https://example.com/p/{i}"/>'
+                         f'<published>{dt.isoformat()}</published><content type="html"><![CDATA[{BODY}]]></content>'
+                         f'<summary>Запись {i}</summary></entry>')
+        else:
+            parts.append(f'<item><title>Запись {i}</title><link>https://example.com/p/{i}</link>'
+                         f'<pubDate>{format_datetime(dt)}</pubDate><description><![CDATA[{BODY}]]></description></item>')
+    if atom:
+        head = '<feed xmlns="http://www.w3.org/2005/Atom"><title>bench</title><link href="https://example.com/"/>'
+        return ('<?xml version="1.0" encoding="utf-8"?>' + head + "".join(parts) + "</feed>").encode("utf-8")
+    head = '<rss version="2.0"><channel><title>bench</title><link>https://example.com/</link>'
+    return ('<?xml version="1.0" encoding="utf-8"?>' + head + "".join(parts) + "</channel></rss>").encode("utf-8")
+
+
+def entries(d) -> list[tuple]:
+    return [(e.get("link"), e.get("title"), e.get("summary"), tuple(e.get("published_parsed") or ()))
+            for e in d.entries]
+
+
+def parse_full(body: bytes, known: set[str]) -> list[tuple]:
+    d = feedparser.parse(body, response_headers={"content-type": CONTENT_TYPE})
+    return [e for e in entries(d) if collector.make_uid(e[0]) not in known]
+
+
+def parse_stream(body: bytes, seen: set[str], mark: datetime.datetime) -> list[tuple]:
+    doc, _, _, _ = rss_stream.trim(body, lambda link, dt: collector.make_uid(link) in seen or (dt is not None and dt < mark),
+                                   CONTENT_TYPE)
+    if doc is None:
+        return parse_full(body, seen)
+    return entries(feedparser.parse(doc, response_headers={"content-type": "application/xml"}))
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=500)
+    ap.add_argument("--new", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    old = list(range(args.items - args.new, 0, -1))
+    fresh = list(range(args.items, args.items - args.new, -1))
+    # каталог знает все старые записи, состояние ленты — только последние RSS_SEEN
+    catalog = {collector.make_uid(f"https://example.com/p/{i}") for i in old}
+    seen = {collector.make_uid(f"https://example.com/p/{i}") for i in old[:collector.RSS_SEEN]}
+    mark = BASE + datetime.timedelta(hours=old[0] if old else 0)
+    ok = True
+    for atom in (False, True):
+        body = make_feed(fresh + old, atom)
+        ref = parse_full(body, catalog)
+        got = parse_stream(body, seen, mark)
+        same = got == ref
+        ok &= same
+        t_full = best_of(lambda: parse_full(body, catalog), args.repeat)
+        t_stream = best_of(lambda: parse_stream(body, seen, mark), args.repeat)
+        print(f"{'atom' if atom else 'rss':5s} {len(body) / 1024:8.1f} KB  {args.items:5d} items, {len(ref):3d} new  "
+              f"full {t_full * 1000:8.2f} ms  stream {t_stream * 1000:7.2f} ms  "
+              f"x{t_full / t_stream if t_stream else 0:6.1f}  {'OK' if same else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
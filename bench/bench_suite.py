@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+bench_suite.py
+Масштабирование горячих путей сборщика, трендов и writer на синтетическом каталоге
+(bench/gen_catalog.py). Каждый сценарий идёт в отдельном процессе с пустым data/cache:
+--repeat прогонов меряют время (берётся лучший) и ru_maxrss процесса, ещё один —
+пик Python-памяти через tracemalloc. Данные генерируются в data/cache/bench/<размер>/
+и переиспользуются в течение дня (окно трендов считается от текущей даты).
+
+Результаты — JSON (--out); сравнение с bench/baseline.json: сценарий медленнее
+или прожорливее базового больше чем на --tolerance помечается REGRESSION, код выхода 1.
+База хранит отпечаток машины (процессор, число ядер, версии Python и numpy): на другой
+машине абсолютные секунды и мегабайты не сравнимы — WARN, сравнение пропускается.
+
+  python bench/bench_suite.py                            # 10k и 100k, сравнение с базой
+  python bench/bench_suite.py --sizes 1m --out res.json   # ~20 мин на одном ядре
+  python bench/bench_suite.py --sizes 10m --repeat 1 --no-memory   # ~45 мин, 6 ГБ данных
+  python bench/bench_suite.py --update-baseline          # записать текущие числа как базу
+  python bench/bench_suite.py --case trends.top.cold --data data/cache/bench/100k   # один сценарий
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+BASELINE = ROOT / "bench" / "baseline.json"
+DATA_ROOT = ROOT / "data" / "cache" / "bench"
+APPEND_ROWS = 10_000
+# время меньше этого не сравниваем с базой: на таких масштабах решает шум
+MIN_SEC = 0.25
+
+
+# ---------- сценарии ----------
+# Сценарий получает каталог с данными и пустой кэш, готовит состояние и возвращает
+# функцию, которую меряем. Возвращаемое ей число — сколько строк обработано.
+
+def patch_paths(data: pathlib.Path, cache: pathlib.Path):
+    import catalog
+    catalog.CACHE_DIR = cache
+    return data / "catalog.csv", data / "published.csv"
+
+
+def case_read_existing_uids(data, cache):
+    import collector
+    cat, _ = patch_paths(data, cache)
+    collector.CATALOG = cat
+    return lambda: len(collector.read_existing_uids())
+
+
+def case_uid_index_cold(data, cache):
+    from catalog import UidIndex
+    cat, _ = patch_paths(data, cache)
+
+    def run():
+        idx = UidIndex(cat)
+        n = len(idx)
+        idx.close()
+        return n
+    return run
+
+
+def case_uid_index_warm(data, cache):
+    from catalog import UidIndex, iter_column
+    cat, _ = patch_paths(data, cache)
+    UidIndex(cat).close()
+    probe = [u for u, _ in zip(iter_column(cat, "uid"), range(1000))]
+
+    def run():
+        idx = UidIndex(cat)
+        hits = sum(1 for u in probe if u in idx)
+        idx.close()
+        return hits
+    return run
+
+
+def _trends(data, cache):
+    import trends
+    cat, _ = patch_paths(data, cache)
+    trends.CATALOG = cat
+    trends.SHARDS_DIR = cache / "trends"
+    return trends
+
+
+def case_trends_top_cold(data, cache):
+    trends = _trends(data, cache)
+    return lambda: sum(len(x) for x in trends.top_words_and_phrases())
+
+
+def case_trends_top_warm(data, cache):
+    trends = _trends(data, cache)
+    trends.top_words_and_phrases()
+    return lambda: sum(len(x) for x in trends.top_words_and_phrases())
+
+
+def case_trends_report_cold(data, cache):
+    # окна 1/7/30 дней, рост, по сайтам и Telegram — один проход
+    trends = _trends(data, cache)
+    return lambda: sum(len(x) for x in trends.report_views()["top"])
+
+
+def _trends_nocache(data, cache, engine):
+    trends = _trends(data, cache)
+    trends.USE_SHARDS = False
+    if engine == "python":
+        trends.VECTOR = None
+    elif trends.VECTOR is None:
+        raise RuntimeError("numpy is not installed")
+    return lambda: sum(len(x) for x in trends.top_words_and_phrases())
+
+
+def case_trends_top_python(data, cache):
+    return _trends_nocache(data, cache, "python")
+
+
+def case_trends_top_numpy(data, cache):
+    return _trends_nocache(data, cache, "numpy")
+
+
+def case_tokenize(data, cache):
+    import trends
+    from catalog import iter_rows, read_header
+    cat, _ = patch_paths(data, cache)
+    header = read_header(cat)
+    ti, si = header.index("title"), header.index("summary")
+
+    def run():
+        engine = trends.TokenEngine()
+        n = 0
+        for row in iter_rows(cat):
+            engine.tokenize(row[ti] + " " + row[si])
+            n += 1
+        return n
+    return run
+
+
+def _writer(data, cache):
+    import writer
+    cat, pub = patch_paths(data, cache)
+    writer.CATALOG = cat
+    writer.PUBLISHED = pub
+    writer.CURSOR_STATE = str(cache / "writer_cursor.json")
+    return writer
+
+
+def case_load_published(data, cache):
+    writer = _writer(data, cache)
+
+    def run():
+        idx = writer.load_published()
+        n = len(idx)
+        idx.close()
+        return n
+    return run
+
+
+def _select(writer, order):
+    from catalog import open_catalog
+    published = writer.load_published()
+
+    def run():
+        cat = open_catalog(writer.CATALOG)
+        batch, cursor = writer.select_batch(cat, published, 5, order)
+        if cursor is not None:
+            cursor.save()
+        cat.close()
+        return len(batch)
+    return run
+
+
+def case_select_cold(data, cache):
+    return _select(_writer(data, cache), "oldest")
+
+
+def case_select_warm(data, cache):
+    run = _select(_writer(data, cache), "oldest")
+    run()
+    return run
+
+
+def case_select_newest(data, cache):
+    return _select(_writer(data, cache), "newest")
+
+
+def case_append(data, cache):
+    from catalog import iter_rows, open_catalog, read_header
+    cat, _ = patch_paths(data, cache)
+    header = read_header(cat)
+    rows = [dict(zip(header, r)) for r, _ in zip(iter_rows(cat), range(APPEND_ROWS))]
+    for i, row in enumerate(rows):
+        row["uid"] = f"bench-append-{i}"
+    store = open_catalog(cat)
+    len(store)   # индекс uid строится до замера
+    size = cat.stat().st_size
+
+    def run():
+        try:
+            for row in rows:
+                if row["uid"] not in store:
+                    store.append(row)
+            store.commit()
+            return len(rows)
+        finally:
+            store.close()
+            with open(cat, "r+b") as f:
+                f.truncate(size)
+    return run
+
+
+CASES = {
+    "collector.read_existing_uids": case_read_existing_uids,
+    "catalog.uid_index.cold": case_uid_index_cold,
+    "catalog.uid_index.warm": case_uid_index_warm,
+    "catalog.append": case_append,
+    "trends.top.cold": case_trends_top_cold,
+    "trends.top.warm": case_trends_top_warm,
+    "trends.top.python": case_trends_top_python,
+    "trends.top.numpy": case_trends_top_numpy,
+    "trends.report.cold": case_trends_report_cold,
+    "trends.tokenize": case_tokenize,
+    "writer.load_published": case_load_published,
+    "writer.select.cold": case_select_cold,
+    "writer.select.warm": case_select_warm,
+    "writer.select.newest": case_select_newest,
+}
+
+
+def run_case(name: str, data: pathlib.Path, memory: bool) -> dict:
+    """Выполняется в дочернем процессе: подготовка, затем один замер."""
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull   # сценарии печатают статистику — она тут не нужна
+        try:
+            fn = CASES[name](data, pathlib.Path(tmp))
+            if memory:
+                tracemalloc.start()
+            t0 = time.perf_counter()
+            n = fn()
+            sec = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1] if memory else None
+        finally:
+            sys.stdout = stdout
+    out = {"sec": round(sec, 4), "items": n}
+    if memory:
+        out["peak_mb"] = round(peak / 1e6, 2)
+    else:
+        out["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return out
+
+
+# ---------- прогон набора ----------
+def host_fingerprint() -> dict:
+    """От чего зависят абсолютные числа замеров; база сравнивается только при полном совпадении."""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    try:
+        import numpy
+        np_version = numpy.__version__
+    except ImportError:
+        np_version = None
+    return {"cpu": cpu, "cpus": os.cpu_count(), "machine": platform.machine(),
+            "python": platform.python_version(), "numpy": np_version}
+
+
+def load_baseline(path: pathlib.Path) -> dict:
+    """{"host": отпечаток, "results": {сценарий@размер: замер}}; старая база без отпечатка — host пустой."""
+    if not path.exists():
+        return {"host": {}, "results": {}}
+    base = json.loads(path.read_text(encoding="utf-8"))
+    if "results" not in base:
+        base = {"host": {}, "results": base}
+    return base
+
+
+def ensure_data(size: str, seed: int) -> pathlib.Path:
+    from gen_catalog import GENERATOR_VERSION, generate, parse_size
+    out = DATA_ROOT / size
+    stamp = out / "meta.json"
+    meta = {"rows": parse_size(size), "seed": seed, "generator": GENERATOR_VERSION,
+            "date": time.strftime("%Y-%m-%d", time.gmtime())}
+    if stamp.exists() and json.loads(stamp.read_text(encoding="utf-8")) == meta:
+        return out
+    print(f"generating {size} rows → {out}")
+    generate(meta["rows"], out, seed=seed)
+    stamp.write_text(json.dumps(meta), encoding="utf-8")
+    return out
+
+
+def child(name: str, data: pathlib.Path, memory: bool) -> dict:
+    cmd = [sys.executable, __file__, "--case", name, "--data", str(data)]
+    if memory:
+        cmd.append("--memory")
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode:
+        raise RuntimeError(f"{name}: {res.stderr.strip().splitlines()[-1] if res.stderr else res.returncode}")
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    bad = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base["sec"] >= MIN_SEC and cur["sec"] > base["sec"] * (1 + tolerance):
+            bad.append(f"{key}: {cur['sec']:.3f}s vs {base['sec']:.3f}s")
+        if base.get("peak_mb") and cur.get("peak_mb", 0) > base["peak_mb"] * (1 + tolerance) + 1:
+            bad.append(f"{key}: peak {cur['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB")
+    return bad
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10k,100k", help="через запятую: 10k,100k,1m,10m")
+    ap.add_argument("--cases", help="подстрока имени сценария, через запятую")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", type=pathlib.Path, help="куда записать JSON с результатами")
+    ap.add_argument("--baseline", type=pathlib.Path, default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--repeat", type=int, default=3, help="прогонов на замер времени, берётся лучший")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--no-memory", action="store_true", help="без прогона под tracemalloc")
+    ap.add_argument("--case", help=argparse.SUPPRESS)
+    ap.add_argument("--data", type=pathlib.Path, help=argparse.SUPPRESS)
+    ap.add_argument("--memory", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.data, args.memory)))
+        return 0
+
+    names = list(CASES)
+    if args.cases:
+        pats = args.cases.split(",")
+        names = [n for n in names if any(p in n for p in pats)]
+
+    results = {}
+    for size in args.sizes.split(","):
+        data = ensure_data(size, args.seed)
+        rows = json.loads((data / "meta.json").read_text(encoding="utf-8"))["rows"]
+        for name in names:
+            key = f"{name}@{size}"
+            try:
+                runs = [child(name, data, memory=False) for _ in range(max(1, args.repeat))]
+                r = min(runs, key=lambda x: x["sec"])
+                r["rss_mb"] = max(x["rss_mb"] for x in runs)
+                if not args.no_memory:
+                    r["peak_mb"] = child(name, data, memory=True)["peak_mb"]
+            except RuntimeError as e:
+                print(f"  {key}: FAILED {e}")
+                continue
+            r["rows"] = rows
+            results[key] = r
+            rate = rows / r["sec"] if r["sec"] else 0
+            peak = f"peak {r['peak_mb']:7.1f} MB" if "peak_mb" in r else ""
+            print(f"  {key:40s} {r['sec']:8.3f}s {rate:12.0f} rows/s  rss {r['rss_mb']:7.1f} MB  {peak}")
+
+    host = host_fingerprint()
+    report = {
+        "host": host,
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+    if args.out:
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    base = load_baseline(args.baseline)
+    if args.update_baseline:
+        # замеры с другой машины к новым не подмешиваем
+        merged = base["results"] if base["host"] == host else {}
+        merged.update(results)
+        base = {"host": host, "results": dict(sorted(merged.items()))}
+        args.baseline.write_text(json.dumps(base, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline updated: {args.baseline}")
+        return 0
+
+    if not base["results"]:
+        print("no baseline; run with --update-baseline")
+        return 0
+    if base["host"] != host:
+        diff = ", ".join(f"{k}: {base['host'].get(k)} != {v}" for k, v in host.items() if base["host"].get(k) != v)
+        print(f"WARN: baseline is from another host ({diff}); comparison skipped, "
+              f"run with --update-baseline on this machine")
+        return 0
+    bad = compare(results, base["results"], args.tolerance)
+    for line in bad:
+        print(f"REGRESSION {line}")
+    known = sum(1 for key in results if key in base["results"])
+    print(f"{len(results)} results, {known} in baseline, {len(bad)} regression(s) at tolerance {args.tolerance:.0%}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+bench_summaries.py
+Заглушка Ollama (/api/generate) и прогон writer.Summarizer против неё —
+без настоящей модели. Показывает пропускную способность при разном числе
+воркеров, попадания в кэш на повторном прогоне и откат на «Кратко: ...»
+при исчерпании бюджета по времени и токенам.
+
+  python bench/bench_summaries.py                  # сценарии бенчмарка
+  python bench/bench_summaries.py --serve 11434    # только заглушка: OLLAMA_URL=http://127.0.0.1:11434/api/generate
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.2          # сек. на ответ — «генерация»
+    tokens = 120         # eval_count в ответе
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.delay)
+        prompt = body.get("prompt", "")
+        payload = json.dumps({
+            "model": body.get("model"),
+            "response": f"Выжимка ({len(prompt)} симв. промпта).",
+            "done": True,
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": self.tokens,
+        }, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # клиент уже ушёл по таймауту (сценарий с бюджетом времени) — это не ошибка заглушки
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(port: int = 0, delay: float = 0.2) -> ThreadingHTTPServer:
+    StubHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(url: str, items, cache: pathlib.Path, **kw):
+    import writer
+    s = writer.Summarizer(url=url, cache_path=str(cache), **kw)
+    t0 = time.perf_counter()
+    out = s.summarize_many(items)
+    sec = time.perf_counter() - t0
+    fallback = sum(1 for x in out if x.startswith("Кратко: "))
+    return sec, s.stats, fallback
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--serve", type=int, metavar="PORT", help="только поднять заглушку")
+    ap.add_argument("--delay", type=float, default=0.2)
+    ap.add_argument("--items", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.serve is not None:
+        server = start_stub(args.serve, args.delay)
+        print(f"stub on http://127.0.0.1:{server.server_address[1]}/api/generate (Ctrl+C — выход)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return 0
+
+    server = start_stub(0, args.delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    items = [(f"Заголовок {i}", f"Факты о сюжете номер {i}. " * 5) for i in range(args.items)]
+    tmp = pathlib.Path(tempfile.mkdtemp())
+
+    print(f"{args.items} items, stub delay {args.delay}s")
+    for workers in (1, 2, 4, 8):
+        sec, stats, fb = run(url, items, tmp / f"w{workers}.json", workers=workers, time_budget=600)
+        print(f"  workers={workers}: {sec:6.2f}s  {args.items / sec:6.1f} items/s  {stats}")
+
+    sec, stats, fb = run(url, items, tmp / "w4.json", workers=4, time_budget=600)
+    print(f"  rerun (cache): {sec:6.2f}s  {stats}")
+
+    budget = args.delay * 2.5
+    sec, stats, fb = run(url, items, tmp / "time.json", workers=2, time_budget=budget)
+    print(f"  time budget {budget:.1f}s: {sec:6.2f}s  fallback={fb}/{args.items}  {stats}")
+
+    sec, stats, fb = run(url, items, tmp / "tok.json", workers=1, token_budget=500, time_budget=600)
+    print(f"  token budget 500: {sec:6.2f}s  fallback={fb}/{args.items}  {stats}")
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
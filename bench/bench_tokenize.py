@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+bench_tokenize.py
+Сравнение trends.TokenEngine с эталонным путём tokenize() + token_is_gear() + gram_is_gear().
+Корпус — тексты docs/_posts/*.md и строки data/catalog.csv (если есть) либо CSV из аргумента.
+Сначала проверяет, что результаты совпадают один в один, затем меряет время.
+
+  python bench/bench_tokenize.py [catalog.csv] [--repeat 3]
+"""
+
+import argparse
+import collections
+import csv
+import pathlib
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import trends  # noqa: E402
+
+
+def load_corpus(csv_path: pathlib.Path | None) -> list[str]:
+    texts = [p.read_text(encoding="utf-8") for p in sorted((ROOT / "docs" / "_posts").glob("*.md"))]
+    path = csv_path or (ROOT / "data" / "catalog.csv")
+    if path.exists():
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                texts.append((row.get("title") or "") + " " + (row.get("summary") or ""))
+    return texts
+
+
+def reference_count(texts):
+    words, bi, tri = collections.Counter(), collections.Counter(), collections.Counter()
+    for txt in texts:
+        toks = trends.tokenize(txt)
+        for t in toks:
+            if not trends.token_is_gear(t):
+                words[t] += 1
+        for i in range(len(toks) - 1):
+            g = f"{toks[i]} {toks[i+1]}"
+            if not trends.gram_is_gear(g):
+                bi[g] += 1
+        for i in range(len(toks) - 2):
+            g = f"{toks[i]} {toks[i+1]} {toks[i+2]}"
+            if not trends.gram_is_gear(g):
+                tri[g] += 1
+    return words, bi, tri
+
+
+def engine_count(texts):
+    words, bi, tri = collections.Counter(), collections.Counter(), collections.Counter()
+    trends.TokenEngine().count_many(texts, words, bi, tri)
+    return words, bi, tri
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("csv", nargs="?", type=pathlib.Path)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    texts = load_corpus(args.csv)
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    print(f"corpus: {len(texts)} texts, {mb:.1f} MB")
+
+    engine = trends.TokenEngine()
+    bad = sum(1 for t in texts if engine.tokenize(t) != trends.tokenize(t))
+    same_counts = reference_count(texts) == engine_count(texts)
+    print(f"tokens identical: {len(texts) - bad}/{len(texts)}; counters identical: {same_counts}")
+    if bad or not same_counts:
+        return 1
+
+    results = [
+        ("tokenize (reference)", best_of(lambda: [trends.tokenize(t) for t in texts], args.repeat)),
+        ("TokenEngine.tokenize_many", best_of(lambda: trends.TokenEngine().tokenize_many(texts), args.repeat)),
+        ("count: tokenize+gear (reference)", best_of(lambda: reference_count(texts), args.repeat)),
+        ("count: TokenEngine.count_many", best_of(lambda: engine_count(texts), args.repeat)),
+    ]
+    for name, sec in results:
+        print(f"{name:36s} {sec * 1000:9.1f} ms  {mb / sec:7.2f} MB/s")
+    print(f"speedup tokenize: {results[0][1] / results[1][1]:.2f}x, count: {results[2][1] / results[3][1]:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
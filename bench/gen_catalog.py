@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+gen_catalog.py
+Синтетические catalog.csv и published.csv для бенчмарков: смешанные русские и
+английские заголовки и описания (частоты слов по Ципфу, «железо» и шум в доле строк),
+источники — ALLOWED_DOMAINS из trends.py с весами по DOMAIN_WEIGHTS, даты публикации
+равномерно за последние --days дней в порядке дозаписи, ~5% строк — повторы сюжета
+(cluster_id указывает на строку выше). published.csv покрывает первые --published строк.
+
+  python bench/gen_catalog.py 100k data/cache/bench/100k [--days 365] [--published 0.9] [--seed 1]
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import pathlib
+import random
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from catalog import FIELDS  # noqa: E402
+from trends import ALLOWED_DOMAINS, DOMAIN_WEIGHTS  # noqa: E402
+
+GENERATOR_VERSION = 1
+
+WORDS_EN = (
+    "stock footage video photo contributor earnings royalty license editorial commercial "
+    "drone aerial timelapse slow motion portrait lifestyle business background abstract "
+    "texture nature city travel food people family christmas summer winter holiday "
+    "keyword upload review rejected approved collection trend demand buyer market "
+    "generative ai content creator camera lens lighting studio color grading 4k "
+    "payout subscription price update policy portfolio sales download agency"
+).split()
+WORDS_RU = (
+    "стоки видео фото автор заработок роялти лицензия редакционный коммерческий "
+    "съёмка дрон таймлапс замедленная портрет бизнес фон абстракция текстура природа "
+    "город путешествия еда люди семья новый год лето зима праздник ключевые слова "
+    "загрузка модерация отклонено одобрено коллекция тренд спрос покупатель рынок "
+    "нейросеть контент камера объектив свет студия цветокоррекция выплата подписка "
+    "цена обновление правила портфолио продажи скачивания агентство сегодня покажу"
+).split()
+GEAR = "sony a7 iv canon r5 nikon z8 dji mavic 3 gopro 12 iphone 15 pro 24-70mm f/2.8 1/250".split()
+NOISE = ["https://example.com/post", "подписывайтесь", "<b>", "</b>", "&nbsp;", "#стоки", "@channel"]
+
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def zipf_weights(n: int) -> list[float]:
+    return [1.0 / (i + 1) for i in range(n)]
+
+
+class TextGen:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.en_w = zipf_weights(len(WORDS_EN))
+        self.ru_w = zipf_weights(len(WORDS_RU))
+
+    def words(self, n: int) -> list[str]:
+        rng = self.rng
+        vocab, weights = (WORDS_RU, self.ru_w) if rng.random() < 0.5 else (WORDS_EN, self.en_w)
+        out = rng.choices(vocab, weights, k=n)
+        if rng.random() < 0.15:
+            out.insert(rng.randrange(len(out) + 1), " ".join(rng.sample(GEAR, 2)))
+        if rng.random() < 0.2:
+            out.append(rng.choice(NOISE))
+        return out
+
+    def title(self) -> str:
+        w = self.words(self.rng.randint(5, 12))
+        return " ".join(w).capitalize()
+
+    def summary(self) -> str:
+        return " ".join(self.words(self.rng.randint(15, 45))) + "."
+
+
+def generate(rows: int, out_dir: pathlib.Path, days: int = 365, published: float = 0.9,
+             seed: int = 1) -> tuple[pathlib.Path, pathlib.Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    catalog = out_dir / "catalog.csv"
+    pub = out_dir / "published.csv"
+    rng = random.Random(seed)
+    text = TextGen(rng)
+    sources = ALLOWED_DOMAINS
+    src_w = [DOMAIN_WEIGHTS.get(s, 1.0) for s in sources]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start = now - datetime.timedelta(days=days)
+    span = (now - start).total_seconds()
+    n_pub = int(rows * published)
+    recent: list[tuple[str, str, str]] = []   # (uid, title, summary) последних сюжетов — для повторов
+
+    with open(catalog, "w", newline="", encoding="utf-8") as fc, \
+         open(pub, "w", newline="", encoding="utf-8") as fp:
+        wc, wp = csv.writer(fc), csv.writer(fp)
+        wc.writerow(FIELDS)
+        wp.writerow(["uid", "post_path"])
+        for i in range(rows):
+            uid = hashlib.md5(f"{seed}:{i}".encode()).hexdigest()
+            ts = start + datetime.timedelta(seconds=span * i / max(1, rows))
+            src = rng.choices(sources, src_w)[0]
+            if recent and rng.random() < 0.05:
+                cluster, title, summary = rng.choice(recent)
+            else:
+                cluster, title, summary = uid, text.title(), text.summary()
+                recent.append((uid, title, summary))
+                if len(recent) > 50:
+                    recent.pop(0)
+            link = f"https://{src}/p/{i}"
+            wc.writerow([uid, title, link, src, ts.isoformat(), summary, cluster])
+            if i < n_pub:
+                wp.writerow([uid, f"_posts/{ts.date().isoformat()}-post-{i}.md"])
+    return catalog, pub
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("rows", help="число строк: 10k, 1m, 10m ...")
+    ap.add_argument("out", type=pathlib.Path)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--published", type=float, default=0.9, help="доля строк в published.csv")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    catalog, pub = generate(parse_size(args.rows), args.out, args.days, args.published, args.seed)
+    print(f"{catalog} ({catalog.stat().st_size / 1e6:.1f} MB), {pub} ({pub.stat().st_size / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
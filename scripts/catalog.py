@@ -0,0 +1,1133 @@
+# -*- coding: utf-8 -*-
+"""
+catalog.py
+Общая работа с data/catalog.csv:
+  • CatalogWriter — пакетная дозапись новых строк одним коммитом (write + fsync)
+  • UidIndex — постоянный индекс uid в SQLite, дописывается инкрементально
+  • open_catalog() — хранилище каталога с маленьким API (append, uid in, window,
+    unpublished). CATALOG_BACKEND=csv (по умолчанию) читает CSV напрямую,
+    CATALOG_BACKEND=sqlite держит зеркало CSV в data/cache/catalog.sqlite
+    с индексами по uid, published и source. CSV остаётся основным артефактом в git.
+
+    CATALOG_BACKEND=partitioned — партиции data/catalog/<месяц|неделя>.csv по времени сбора
+    и manifest.json с min/max published (окно трендов читает только нужные партиции).
+
+Проверка и перестройка индексов:
+  python scripts/catalog.py check
+  python scripts/catalog.py rebuild
+Партиции:
+  python scripts/catalog.py partition          # разложить data/catalog.csv по месяцам
+  python scripts/catalog.py compact            # уплотнить холодные партиции
+  python scripts/catalog.py retain 365 [--delete]   # старые — в data/catalog/archive/
+"""
+
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import sys
+import time
+
+from httpstate import StateStore
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+CATALOG = ROOT / "data" / "catalog.csv"
+PUBLISHED = ROOT / "data" / "published.csv"
+CACHE_DIR = ROOT / "data" / "cache"        # производные индексы, восстанавливаются из CSV
+BACKEND = os.environ.get("CATALOG_BACKEND", "csv")
+PARTS_DIR = ROOT / "data" / "catalog"       # CATALOG_BACKEND=partitioned: data/catalog/<период>.csv
+PARTITION = os.environ.get("CATALOG_PARTITION", "month")   # month | week
+
+FIELDS = ["uid", "title", "link", "source", "published", "summary", "cluster_id"]
+
+
+def ensure_header(path: pathlib.Path = CATALOG) -> None:
+    """
+    Создаёт каталог с заголовком FIELDS. Старый заголовок без новых колонок
+    (например, без cluster_id) один раз переписывается; строки остаются как есть —
+    недостающие поля DictReader отдаёт как None.
+    """
+    path = pathlib.Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(FIELDS)
+        return
+    header = read_header(path)
+    if header[:len(FIELDS)] == FIELDS or FIELDS[:len(header)] != header:
+        return
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        src.readline()
+        buf = io.StringIO(newline="")
+        csv.writer(buf).writerow(FIELDS)
+        dst.write(buf.getvalue().encode("utf-8"))
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp, path)
+    print(f"{path.name}: header upgraded to {','.join(FIELDS)}")
+
+
+def is_duplicate(row: dict) -> bool:
+    """Повтор сюжета: cluster_id указывает на более раннюю строку каталога."""
+    cluster = row.get("cluster_id") or ""
+    return bool(cluster) and cluster != row.get("uid")
+
+
+def repair_tail(path: pathlib.Path) -> int:
+    """
+    Если файл обрывается посреди строки (падение во время записи),
+    отрезаем хвост до последнего конца записи. Возвращает число отрезанных байт.
+    Хвост без перевода строки, который разбирается в целую запись (кавычки закрыты,
+    полей столько же, сколько в заголовке), — не обрыв, а правка руками или другой
+    программой: дописываем \r\n, ничего не отрезая.
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return 0
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        # csv.writer заканчивает записи на \r\n, переводы строк внутри полей — обычно \n
+        pos = size
+        block = 64 * 1024
+        cut = 0
+        cut_lf = 0
+        while pos > 0 and not cut:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            i = chunk.rfind(b"\r\n")
+            if i >= 0:
+                cut = start + i + 2
+            if not cut_lf:
+                j = chunk.rfind(b"\n")
+                if j >= 0:
+                    cut_lf = start + j + 1
+            pos = start
+        keep = cut or cut_lf
+        f.seek(keep)
+        tail = f.read(size - keep)
+        if complete_record(tail, read_header(path) if keep else FIELDS):
+            f.seek(size)
+            f.write(b"\r\n")
+            return 0
+        f.truncate(keep)
+    return size - keep
+
+
+def complete_record(tail: bytes, header: list[str]) -> bool:
+    """tail — одна целая CSV-запись (без конца строки) с числом полей заголовка."""
+    try:
+        text = tail.decode("utf-8")
+    except UnicodeDecodeError:
+        return False   # оборвались посреди символа
+    if text.count('"') % 2:
+        return False   # кавычки не закрыты: обрыв внутри поля
+    rows = list(csv.reader(io.StringIO(text, newline="")))
+    return len(rows) == 1 and len(rows[0]) == len(header)
+
+
+class CatalogWriter:
+    """
+    Буферизует новые строки каталога и дописывает их одним commit():
+    один open, одна запись, flush + fsync. До коммита файл не трогается,
+    поэтому падение посреди прогона не оставляет полстроки в каталоге.
+    Для больших догрузок буфер сбрасывается сам, когда превышает flush_bytes.
+    Пустой или отсутствующий файл получает заголовок header.
+    """
+
+    def __init__(self, path: pathlib.Path, header: list[str] = FIELDS,
+                 flush_bytes: int = 8 * 1024 * 1024):
+        self.path = pathlib.Path(path)
+        self.header = header
+        self.flush_bytes = flush_bytes
+        self._buf = io.StringIO(newline="")
+        self._writer = csv.writer(self._buf)
+        self.pending = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.repaired_bytes = 0
+
+    def append(self, row: list) -> None:
+        self._writer.writerow(row)
+        self.pending += 1
+        if self._buf.tell() >= self.flush_bytes:
+            self.commit()
+
+    def commit(self) -> int:
+        """Дописывает буфер в каталог; возвращает число записанных байт."""
+        if not self.pending:
+            return 0
+        data = self._buf.getvalue().encode("utf-8")
+        t0 = time.perf_counter()
+        if not self.commits:
+            self.repaired_bytes = repair_tail(self.path)
+            if self.repaired_bytes:
+                print(f"WARN: {self.path.name}: cut torn tail of {self.repaired_bytes} bytes")
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            head = io.StringIO(newline="")
+            csv.writer(head).writerow(self.header)
+            data = head.getvalue().encode("utf-8") + data
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.commit_seconds += time.perf_counter() - t0
+        self.commits += 1
+        self.rows_written += self.pending
+        self.bytes_written += len(data)
+        self.pending = 0
+        self._buf.seek(0)
+        self._buf.truncate()
+        return len(data)
+
+    def stats(self) -> str:
+        return (f"{self.rows_written} rows, {self.bytes_written} bytes, "
+                f"{self.commits} commit(s) in {self.commit_seconds * 1000:.1f} ms")
+
+
+# ---------- чтение CSV ----------
+def file_size(path: pathlib.Path) -> int:
+    return path.stat().st_size if path.is_file() else 0
+
+def segments_of(path: pathlib.Path) -> list[tuple[str, pathlib.Path]]:
+    """
+    Файлы, из которых состоит каталог: [("", path)] для одиночного CSV,
+    [(имя, файл), ...] по порядку имён для каталога партиций.
+    """
+    path = pathlib.Path(path)
+    if path.is_dir():
+        return [(p.name, p) for p in sorted(path.glob("*.csv"), key=lambda p: p.stem)]
+    return [("", path)]
+
+def meta_key(key: str, name: str) -> str:
+    return f"{key}:{name}" if name else key
+
+def read_header(path: pathlib.Path) -> list[str]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), None) or []
+
+def iter_rows(path: pathlib.Path, offset: int = 0):
+    """
+    Записи CSV списками, начиная с байта offset (граница записи).
+    offset=0 — с начала файла, заголовок пропускается.
+    """
+    with open(path, "rb") as f:
+        if offset:
+            f.seek(offset)
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        reader = csv.reader(text)
+        if not offset:
+            next(reader, None)
+        yield from reader
+
+def iter_records(path: pathlib.Path, offset: int = 0):
+    """
+    (запись, байт сразу после неё) начиная с offset; offset=0 — после заголовка.
+    Позиция считается по сырым строкам, которые отдаются csv.reader, поэтому
+    записи с переводами строк внутри кавычек не ломают смещения.
+    """
+    with open(path, "rb") as f:
+        if offset:
+            f.seek(offset)
+        pos = [offset]
+
+        def lines():
+            for line in f:
+                pos[0] += len(line)
+                yield line.decode("utf-8")
+
+        reader = csv.reader(lines())
+        if not offset:
+            next(reader, None)
+        for row in reader:
+            if row:
+                yield row, pos[0]
+
+def iter_range(path: pathlib.Path, start: int, end: int):
+    """Записи словарями из диапазона байт [start, end); обе границы — границы записей (record_ranges)."""
+    header = read_header(path)
+    if start >= end:
+        return
+    for values, pos in iter_records(path, start):
+        yield dict(zip(header, values))
+        if pos >= end:
+            break
+
+def record_ranges(path: pathlib.Path, parts: int) -> list[tuple[int, int]]:
+    """
+    Делит записи CSV (без заголовка) на ~parts диапазонов байт примерно равного размера.
+    Граница — перевод строки, перед которым чётное число кавычек от начала файла:
+    экранированная кавычка "" даёт два, поэтому нечётность значит «внутри поля»,
+    и переводы строк в кавычках (многострочные summary) запись не режут.
+    Кавычки считаются блоками через bytes.count — один быстрый проход по файлу.
+    """
+    size = file_size(path)
+    if not size:
+        return []
+    bounds: list[int] = []
+    with open(path, "rb") as f:
+        pos = odd = 0
+
+        def next_boundary() -> int:
+            nonlocal pos, odd
+            while True:
+                line = f.readline()
+                if not line:
+                    return pos
+                pos += len(line)
+                odd ^= line.count(b'"') & 1
+                if not odd and line.endswith(b"\n"):
+                    return pos
+
+        start = next_boundary()   # конец заголовка
+        bounds.append(start)
+        for i in range(1, max(1, parts)):
+            target = start + (size - start) * i // parts
+            while pos < target:
+                block = f.read(min(1 << 20, target - pos))
+                if not block:
+                    break
+                pos += len(block)
+                odd ^= block.count(b'"') & 1
+            b = next_boundary()
+            if b >= size:
+                break
+            if b > bounds[-1]:
+                bounds.append(b)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def iter_column(path: pathlib.Path, column: str, offset: int = 0):
+    if pathlib.Path(path).is_dir():
+        for _, part in segments_of(path):
+            yield from iter_column(part, column)
+        return
+    header = read_header(path)
+    if column not in header:
+        return
+    idx = header.index(column)
+    for row in iter_rows(path, offset):
+        yield row[idx] if len(row) > idx else ""
+
+def parse_published(value: str) -> datetime.datetime | None:
+    """ISO-дата из колонки published; без зоны считаем UTC, мусор — None."""
+    dt_str = (value or "").strip().replace("Z", "+00:00")
+    if not dt_str:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(dt_str)
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+# ---------- зеркала CSV в SQLite ----------
+TAIL_BYTES = 4096
+
+def tail_hash(path: pathlib.Path, offset: int) -> str:
+    """Хэш последних TAIL_BYTES байт перед offset — отпечаток уже прочитанной части."""
+    with open(path, "rb") as f:
+        start = max(0, offset - TAIL_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+class Cursor:
+    """
+    Сохраняемая между запусками позиция в CSV: байт + хэш хвоста перед ним.
+    Для каталога партиций — ещё и имя файла (segment), на котором остановились.
+    Если файл с тех пор переписан (короче, хвост другой, файла нет), позиция сбрасывается в начало.
+    """
+
+    def __init__(self, csv_path: pathlib.Path, state_path: pathlib.Path, name: str = ""):
+        self.csv_path = pathlib.Path(csv_path)
+        self.key = name or self.csv_path.name
+        self.store = StateStore(state_path)
+        entry = self.store.get(self.key)
+        self.segment = entry.get("segment") or ""
+        self.offset = int(entry.get("offset") or 0)
+        path = self.path
+        if self.offset > file_size(path) or (self.offset and tail_hash(path, self.offset) != entry.get("tail")):
+            print(f"{self.key}: cursor reset (file changed)")
+            self.segment, self.offset = "", 0
+        self.start = self.offset
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.csv_path / self.segment if self.segment else self.csv_path
+
+    def save(self) -> None:
+        tail = tail_hash(self.path, self.offset) if self.offset else ""
+        self.store.update(self.key, segment=self.segment or None, offset=self.offset, tail=tail)
+        self.store.save()
+
+
+def index_path_for(csv_path: pathlib.Path) -> pathlib.Path:
+    path = pathlib.Path(csv_path)
+    if path.is_dir():
+        return CACHE_DIR / (path.name + ".parts.uids.sqlite")
+    return CACHE_DIR / (path.stem + ".uids.sqlite")
+
+
+class CsvMirror:
+    """
+    Основа для производных SQLite-таблиц над дописываемым CSV.
+    Помнит, до какого байта CSV дочитан, и хэш хвоста перед этим байтом:
+      • CSV дописан — читается только новый хвост;
+      • CSV стал короче или хвост не совпал — всё перестраивается с нуля.
+    csv_path может быть каталогом партиций (data/catalog/*.csv): тогда смещение
+    и хэш хвоста хранятся для каждого файла, файлы читаются по порядку имён.
+    Подклассы задают SCHEMA, TABLES, VERSION и _ingest(header, rows);
+    при смене VERSION или источника таблицы пересоздаются.
+    """
+
+    VERSION = 1
+    SCHEMA: list[str] = []
+    TABLES: list[str] = []
+
+    def __init__(self, csv_path: pathlib.Path, db_path: pathlib.Path):
+        self.csv_path = pathlib.Path(csv_path)
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self._meta("version") != str(self.VERSION):
+            for table in self.TABLES:
+                self.db.execute(f"DROP TABLE IF EXISTS {table}")
+            self.db.execute("DELETE FROM meta")
+        for stmt in self.SCHEMA:
+            self.db.execute(stmt)
+        self.count = int(self._meta("count") or 0)
+        self.sync()
+
+    # --- meta ---
+    def _meta(self, key: str) -> str | None:
+        row = self.db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, **values) -> None:
+        self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                            [(k, str(v)) for k, v in values.items()])
+
+    # --- синхронизация с CSV ---
+    def _source(self) -> str:
+        return str(self.csv_path.resolve())
+
+    def _stored(self) -> dict[str, int]:
+        """{имя сегмента: дочитанное смещение}; у одиночного CSV имя пустое."""
+        out = {}
+        for key, value in self.db.execute("SELECT key, value FROM meta WHERE key = 'offset' OR key LIKE 'offset:%'"):
+            out[key.partition(":")[2]] = int(value or 0)
+        return out
+
+    def _segment_path(self, name: str) -> pathlib.Path:
+        return self.csv_path / name if name else self.csv_path
+
+    def is_consistent(self) -> bool:
+        """Быстрая проверка: зеркало покрывает префиксы CSV, которые с тех пор не менялись."""
+        source = self._meta("source")
+        if source is not None and source != self._source():
+            return False
+        for name, offset in self._stored().items():
+            path = self._segment_path(name)
+            if offset > file_size(path):
+                return False
+            if offset and tail_hash(path, offset) != self._meta(meta_key("tail", name)):
+                return False
+        return True
+
+    def sync(self) -> int:
+        """Доводит зеркало до текущего CSV; возвращает число прочитанных строк."""
+        if not self.is_consistent():
+            self.clear()
+        stored = self._stored()
+        total = 0
+        touched = False
+        for name, path in segments_of(self.csv_path):
+            offset = stored.get(name, 0)
+            size = file_size(path)
+            if size <= offset:
+                continue
+            rows = self._ingest(read_header(path), iter_rows(path, offset))
+            total += rows or 0
+            self._mark(size, name)
+            touched = True
+        if touched:
+            self.db.commit()
+        return total
+
+    def _ingest(self, header: list[str], rows) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        for table in self.TABLES:
+            self.db.execute(f"DELETE FROM {table}")
+        self.db.execute("DELETE FROM meta")
+        self.count = 0
+        self.db.commit()
+
+    def rebuild(self) -> int:
+        self.clear()
+        return self.sync()
+
+    def _mark(self, size: int, name: str = "") -> None:
+        path = self._segment_path(name)
+        tail = tail_hash(path, size) if size else ""
+        self._set_meta(**{meta_key("offset", name): size, meta_key("tail", name): tail},
+                       count=self.count, version=self.VERSION, source=self._source())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def commit(self) -> None:
+        """Фиксирует добавленное вместе с текущим размером CSV — вызывать после записи в CSV."""
+        for name, path in segments_of(self.csv_path):
+            self._mark(file_size(path), name)
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+
+class UidIndex(CsvMirror):
+    """
+    Множество uid из CSV-файла (catalog.csv, published.csv) в SQLite.
+    Поддерживает `uid in index`, len(index), add() и commit().
+    """
+
+    SCHEMA = ["CREATE TABLE IF NOT EXISTS uids (uid TEXT PRIMARY KEY) WITHOUT ROWID"]
+    TABLES = ["uids"]
+
+    def __init__(self, csv_path: pathlib.Path, index_path: pathlib.Path | None = None,
+                 column: str = "uid"):
+        self.column = column
+        super().__init__(csv_path, index_path or index_path_for(csv_path))
+
+    def _ingest(self, header: list[str], rows) -> int:
+        if self.column not in header:
+            return 0
+        idx = header.index(self.column)
+        n = 0
+        for row in rows:
+            self.add(row[idx] if len(row) > idx else "")
+            n += 1
+        return n
+
+    def __contains__(self, uid: str) -> bool:
+        return self.db.execute("SELECT 1 FROM uids WHERE uid=?", (uid,)).fetchone() is not None
+
+    def __iter__(self):
+        for (uid,) in self.db.execute("SELECT uid FROM uids"):
+            yield uid
+
+    def add(self, uid: str) -> None:
+        cur = self.db.execute("INSERT OR IGNORE INTO uids (uid) VALUES (?)", (uid,))
+        self.count += cur.rowcount
+
+
+class CatalogDB(CsvMirror):
+    """
+    Полное зеркало catalog.csv в SQLite: индексы по uid, published и source,
+    флаг done для уже опубликованных строк (частичный индекс по неопубликованным).
+    """
+
+    VERSION = 2
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS items ("
+        " id INTEGER PRIMARY KEY, uid TEXT UNIQUE, title TEXT, link TEXT, source TEXT,"
+        " published TEXT, published_ts REAL, summary TEXT, cluster_id TEXT,"
+        " done INTEGER NOT NULL DEFAULT 0)",
+        "CREATE INDEX IF NOT EXISTS items_published ON items (published_ts)",
+        "CREATE INDEX IF NOT EXISTS items_source ON items (source, published_ts)",
+        "CREATE INDEX IF NOT EXISTS items_todo ON items (done, id) WHERE done = 0",
+    ]
+    TABLES = ["items"]
+
+    def _ingest(self, header: list[str], rows) -> int:
+        n = 0
+        for row in rows:
+            self.add(dict(zip(header, row)))
+            n += 1
+        return n
+
+    def add(self, row: dict) -> None:
+        dt = parse_published(row.get("published"))
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO items"
+            " (uid, title, link, source, published, published_ts, summary, cluster_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (row.get("uid") or "", row.get("title") or "", row.get("link") or "",
+             row.get("source") or "", row.get("published") or "",
+             dt.timestamp() if dt else None, row.get("summary") or "", row.get("cluster_id") or ""))
+        self.count += cur.rowcount
+
+
+# ---------- хранилища каталога ----------
+class CsvCatalog:
+    """
+    Каталог как плоский CSV: дозапись через CatalogWriter, проверка uid через UidIndex,
+    запросы — потоковым проходом по файлу.
+    """
+
+    def __init__(self, path: pathlib.Path = CATALOG):
+        self.path = pathlib.Path(path)
+        self.writer = CatalogWriter(self.path)
+        self._uids: UidIndex | None = None
+
+    @property
+    def uids(self) -> UidIndex:
+        if self._uids is None:
+            self._uids = UidIndex(self.path)
+        return self._uids
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.uids
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def append(self, row: dict) -> None:
+        self.writer.append([row.get(k, "") for k in FIELDS])
+        self.uids.add(row["uid"])
+
+    def commit(self) -> None:
+        self.writer.commit()
+        if self._uids is not None:
+            self._uids.commit()
+
+    def rows(self):
+        if not self.path.exists():
+            return
+        with open(self.path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+    def window(self, since: datetime.datetime, sources: list[str] | None = None):
+        """Строки с published >= since (и source из sources), в порядке каталога."""
+        allowed = set(sources) if sources else None
+        for row in self.rows():
+            if allowed is not None and (row.get("source") or "") not in allowed:
+                continue
+            dt = parse_published(row.get("published"))
+            if dt is None or dt < since:
+                continue
+            yield row
+
+    def window_ranges(self, since: datetime.datetime, parts: int) -> list[tuple[pathlib.Path, int, int]]:
+        """
+        Куски (файл, start, end) для параллельного чтения окна через iter_range;
+        фильтр по since — на стороне читателя. У SQLite-зеркала источник тот же CSV.
+        """
+        return [(self.path, a, b) for a, b in record_ranges(self.path, parts)]
+
+    def unpublished(self, published, cursor: Cursor | None = None):
+        """
+        Строки, чьих uid нет в published, в порядке каталога.
+        Повторы сюжетов (is_duplicate) пропускаются: один сюжет — один пост.
+        С cursor проход начинается с cursor.offset, а cursor.offset сдвигается
+        за каждую просмотренную строку — до конца последней отданной.
+        """
+        if cursor is None:
+            for row in self.rows():
+                if is_duplicate(row):
+                    continue
+                if row.get("uid") not in published:
+                    yield row
+            return
+        for row in self.appended(cursor):
+            if is_duplicate(row) or row.get("uid") in published:
+                continue
+            yield row
+
+    def appended(self, cursor: Cursor):
+        """Строки CSV после cursor.offset; cursor.offset сдвигается за каждую отданную строку."""
+        if not self.path.exists():
+            return
+        header = read_header(self.path)
+        for values, end in iter_records(self.path, cursor.offset):
+            cursor.offset = end
+            yield dict(zip(header, values))
+
+    def close(self) -> None:
+        self.commit()
+        if self._uids is not None:
+            self._uids.close()
+
+
+class SqliteCatalog(CsvCatalog):
+    """
+    CSV + зеркало в SQLite (CatalogDB). Новые строки пишутся в оба места,
+    окно по времени и неопубликованные строки выбираются по индексам.
+    """
+
+    def __init__(self, path: pathlib.Path = CATALOG, db_path: pathlib.Path | None = None):
+        super().__init__(path)
+        self.db = CatalogDB(self.path, db_path or CACHE_DIR / (self.path.stem + ".sqlite"))
+
+    def __contains__(self, uid: str) -> bool:
+        return self.db.db.execute("SELECT 1 FROM items WHERE uid=?", (uid,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return len(self.db)
+
+    def append(self, row: dict) -> None:
+        self.writer.append([row.get(k, "") for k in FIELDS])
+        self.db.add(row)
+
+    def commit(self) -> None:
+        self.writer.commit()
+        self.db.commit()
+
+    def _select(self, where: str, params: tuple):
+        cur = self.db.db.execute(
+            f"SELECT {', '.join(FIELDS)} FROM items WHERE {where} ORDER BY id", params)
+        for values in cur:
+            yield dict(zip(FIELDS, values))
+
+    def rows(self):
+        yield from self._select("1", ())
+
+    def window(self, since: datetime.datetime, sources: list[str] | None = None):
+        ts = since.timestamp()
+        if sources:
+            marks = ", ".join("?" * len(sources))
+            yield from self._select(f"published_ts >= ? AND source IN ({marks})", (ts, *sources))
+        else:
+            yield from self._select("published_ts >= ?", (ts,))
+
+    def unpublished(self, published, cursor: Cursor | None = None):
+        """
+        Курсор не нужен: идём по частичному индексу done=0; встреченные опубликованные строки
+        и повторы сюжетов помечаются done=1 и больше не просматриваются.
+        """
+        cur = self.db.db.execute(
+            f"SELECT id, {', '.join(FIELDS)} FROM items WHERE done = 0 ORDER BY id")
+        done = []
+        try:
+            for rowid, *values in cur:
+                row = dict(zip(FIELDS, values))
+                if is_duplicate(row) or row["uid"] in published:
+                    done.append((rowid,))
+                    continue
+                yield row
+        finally:
+            cur.close()
+            self.db.db.executemany("UPDATE items SET done = 1 WHERE id = ?", done)
+            self.db.db.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
+
+
+# ---------- партиции ----------
+def partition_name(dt: datetime.datetime, scheme: str = PARTITION) -> str:
+    """Имя партиции: 2026-10 для месяца, 2026-10-12 (понедельник) для недели — сортируются по времени."""
+    if scheme == "week":
+        return (dt.date() - datetime.timedelta(days=dt.weekday())).isoformat()
+    if scheme == "month":
+        return dt.strftime("%Y-%m")
+    raise ValueError(f"unknown CATALOG_PARTITION: {scheme}")
+
+def parts_dir_for(path: pathlib.Path) -> pathlib.Path:
+    """data/catalog.csv -> data/catalog/ (каталог партиций рядом с одиночным CSV)."""
+    path = pathlib.Path(path)
+    return path.with_suffix("") if path.suffix == ".csv" else path
+
+
+class Manifest:
+    """
+    data/catalog/manifest.json: для каждой партиции число строк, размер в байтах
+    и min/max published. Запись считается верной, только пока размер файла совпадает
+    с записанным; иначе партиция пересканируется (refresh) или читается целиком.
+    """
+
+    def __init__(self, parts_dir: pathlib.Path):
+        self.path = pathlib.Path(parts_dir) / "manifest.json"
+        self.parts: dict[str, dict] = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                self.parts = json.loads(self.path.read_text(encoding="utf-8")).get("parts") or {}
+            except Exception as e:
+                print(f"WARN: cannot read {self.path.name}, rescanning: {e}")
+
+    def fresh(self, name: str, path: pathlib.Path) -> dict | None:
+        entry = self.parts.get(name)
+        return entry if entry and entry.get("bytes") == file_size(path) else None
+
+    def extend(self, name: str, path: pathlib.Path, published: list[str], wrote: int) -> None:
+        """Дописано wrote байт со строками published; если учёт разошёлся — пересканировать."""
+        entry = self.parts.get(name) or {"rows": 0, "bytes": 0, "min": None, "max": None}
+        if entry["bytes"] + wrote != file_size(path):
+            self.scan(name, path)
+            return
+        for value in published:
+            entry = observe(entry, value)
+        entry["rows"] += len(published)
+        entry["bytes"] = file_size(path)
+        self.parts[name] = entry
+        self.dirty = True
+
+    def scan(self, name: str, path: pathlib.Path) -> dict:
+        entry = {"rows": 0, "bytes": file_size(path), "min": None, "max": None}
+        for value in iter_column(path, "published"):
+            entry = observe(entry, value)
+            entry["rows"] += 1
+        self.parts[name] = entry
+        self.dirty = True
+        return entry
+
+    def refresh(self, parts_dir: pathlib.Path) -> int:
+        """Пересканирует устаревшие записи и убирает записи удалённых файлов."""
+        segments = {p.stem: p for _, p in segments_of(parts_dir)} if pathlib.Path(parts_dir).is_dir() else {}
+        for name in [n for n in self.parts if n not in segments]:
+            del self.parts[name]
+            self.dirty = True
+        n = 0
+        for name, path in segments.items():
+            if self.fresh(name, path) is None:
+                self.scan(name, path)
+                n += 1
+        return n
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        payload = {"partition": PARTITION, "parts": dict(sorted(self.parts.items()))}
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def observe(entry: dict, value: str) -> dict:
+    """Расширяет min/max партиции датой value (UTC ISO); мусор в published не учитывается."""
+    dt = parse_published(value)
+    if dt is None:
+        return entry
+    iso = dt.astimezone(datetime.timezone.utc).isoformat()
+    if entry["min"] is None or iso < entry["min"]:
+        entry["min"] = iso
+    if entry["max"] is None or iso > entry["max"]:
+        entry["max"] = iso
+    return entry
+
+
+class PartitionedCatalog(CsvCatalog):
+    """
+    Каталог партициями data/catalog/<период>.csv по времени сбора: новые строки
+    дописываются только в текущую (головную) партицию, старые файлы не меняются.
+    manifest.json хранит min/max published каждой партиции — окно по времени
+    открывает только партиции, которые с ним пересекаются.
+    Индексы (UidIndex, NearDupIndex) — те же CsvMirror поверх каталога партиций.
+    """
+
+    def __init__(self, path: pathlib.Path = PARTS_DIR, scheme: str = PARTITION):
+        self.path = parts_dir_for(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.scheme = scheme
+        self.manifest = Manifest(self.path)
+        self.head = self.path / f"{partition_name(datetime.datetime.now(datetime.timezone.utc), scheme)}.csv"
+        self.writer = CatalogWriter(self.head)
+        self._uids: UidIndex | None = None
+        self._pending: list[str] = []
+        self._written = 0
+        self.scanned = 0
+        self.pruned = 0
+
+    def append(self, row: dict) -> None:
+        super().append(row)
+        self._pending.append(row.get("published") or "")
+
+    def commit(self) -> None:
+        before = self.writer.bytes_written
+        self.writer.commit()
+        wrote = self.writer.bytes_written - before
+        if wrote:
+            self.manifest.extend(self.head.stem, self.head, self._pending, wrote)
+        self._pending = []
+        self.manifest.save()
+        if self._uids is not None:
+            self._uids.commit()
+
+    def partitions(self) -> list[tuple[str, pathlib.Path]]:
+        return segments_of(self.path)
+
+    def rows(self):
+        for _, part in self.partitions():
+            with open(part, newline="", encoding="utf-8") as f:
+                yield from csv.DictReader(f)
+
+    def window(self, since: datetime.datetime, sources: list[str] | None = None):
+        """Как CsvCatalog.window, но партиции с max published < since не читаются."""
+        allowed = set(sources) if sources else None
+        bound = since.astimezone(datetime.timezone.utc).isoformat()
+        for _, part in self.partitions():
+            entry = self.manifest.fresh(part.stem, part)
+            if entry is not None and (entry["max"] is None or entry["max"] < bound):
+                self.pruned += 1
+                continue
+            self.scanned += 1
+            with open(part, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if allowed is not None and (row.get("source") or "") not in allowed:
+                        continue
+                    dt = parse_published(row.get("published"))
+                    if dt is None or dt < since:
+                        continue
+                    yield row
+
+    def window_ranges(self, since: datetime.datetime, parts: int) -> list[tuple[pathlib.Path, int, int]]:
+        """Как CsvCatalog.window_ranges по партициям, пересекающимся с окном; куски делятся по размеру."""
+        bound = since.astimezone(datetime.timezone.utc).isoformat()
+        live = []
+        for _, part in self.partitions():
+            entry = self.manifest.fresh(part.stem, part)
+            if entry is not None and (entry["max"] is None or entry["max"] < bound):
+                self.pruned += 1
+                continue
+            self.scanned += 1
+            live.append(part)
+        total = sum(file_size(p) for p in live) or 1
+        return [(part, a, b) for part in live
+                for a, b in record_ranges(part, max(1, round(parts * file_size(part) / total)))]
+
+    def unpublished(self, published, cursor: Cursor | None = None):
+        """Как CsvCatalog.unpublished; курсор помнит партицию и смещение в ней."""
+        if cursor is None:
+            yield from super().unpublished(published)
+            return
+        for row in self.appended(cursor):
+            if is_duplicate(row) or row.get("uid") in published:
+                continue
+            yield row
+
+    def appended(self, cursor: Cursor):
+        """Как CsvCatalog.appended по партициям в порядке имён (дописывается только головная)."""
+        parts = self.partitions()
+        names = [name for name, _ in parts]
+        start = names.index(cursor.segment) if cursor.segment in names else 0
+        if cursor.segment not in names:
+            cursor.offset = 0
+        for name, part in parts[start:]:
+            if name != cursor.segment:
+                cursor.segment, cursor.offset = name, 0
+            header = read_header(part)
+            for values, end in iter_records(part, cursor.offset):
+                cursor.offset = end
+                yield dict(zip(header, values))
+
+
+def open_catalog(path: pathlib.Path = CATALOG, backend: str | None = None) -> CsvCatalog:
+    backend = backend or BACKEND
+    if backend == "sqlite":
+        return SqliteCatalog(path)
+    if backend == "csv":
+        return CsvCatalog(path)
+    if backend == "partitioned":
+        return PartitionedCatalog(parts_dir_for(path))
+    raise ValueError(f"unknown CATALOG_BACKEND: {backend}")
+
+
+# ---------- обслуживание партиций ----------
+def store_path() -> pathlib.Path:
+    """Путь, над которым строятся индексы: CSV или каталог партиций."""
+    return parts_dir_for(CATALOG) if BACKEND == "partitioned" else CATALOG
+
+def head_name(scheme: str = PARTITION) -> str:
+    return partition_name(datetime.datetime.now(datetime.timezone.utc), scheme)
+
+def split_catalog(src: pathlib.Path = CATALOG, parts_dir: pathlib.Path = PARTS_DIR,
+                  scheme: str = PARTITION) -> dict[str, int]:
+    """
+    Разовый переход: раскладывает одиночный CSV по партициям по месяцу (неделе) published,
+    порядок строк внутри партиции сохраняется. Строки без даты идут в партицию предыдущей строки.
+    """
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    if segments_of(parts_dir):
+        raise SystemExit(f"{parts_dir} already has partitions")
+    header = read_header(src)
+    writers: dict[str, CatalogWriter] = {}
+    last = head_name(scheme)
+    for values in iter_rows(src):
+        row = dict(zip(header, values))
+        dt = parse_published(row.get("published"))
+        name = partition_name(dt, scheme) if dt else last
+        last = name
+        if name not in writers:
+            writers[name] = CatalogWriter(parts_dir / f"{name}.csv", flush_bytes=1024 * 1024)
+        writers[name].append([row.get(k) or "" for k in FIELDS])
+    for w in writers.values():
+        w.commit()
+    manifest = Manifest(parts_dir)
+    manifest.refresh(parts_dir)
+    manifest.save()
+    return {name: w.rows_written for name, w in sorted(writers.items())}
+
+def compact(parts_dir: pathlib.Path = PARTS_DIR, scheme: str = PARTITION) -> list[str]:
+    """
+    Уплотнение холодных партиций (всех, кроме текущей): повторы uid и строки без uid/link
+    выбрасываются, заголовок приводится к FIELDS; недельные партиции закончившихся месяцев
+    сливаются в месячные. Индексы в data/cache после этого перестроятся сами.
+    """
+    head = head_name(scheme)
+    month = head[:7]
+    groups: dict[str, list[pathlib.Path]] = {}
+    for _, part in segments_of(parts_dir):
+        if part.stem >= head:
+            continue
+        target = part.stem[:7] if scheme == "week" and part.stem[:7] < month else part.stem
+        groups.setdefault(target, []).append(part)
+
+    report = []
+    for target, sources in groups.items():
+        dest = parts_dir / f"{target}.csv"
+        tmp = parts_dir / f"{target}.csv.tmp"
+        seen: set[str] = set()
+        kept = dropped = 0
+        changed = sources != [dest]
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(FIELDS)
+            for src in sources:
+                header = read_header(src)
+                changed = changed or header != FIELDS
+                for values in iter_rows(src):
+                    row = dict(zip(header, values))
+                    uid = row.get("uid") or ""
+                    if not uid or not row.get("link") or uid in seen:
+                        dropped += 1
+                        continue
+                    seen.add(uid)
+                    w.writerow([row.get(k) or "" for k in FIELDS])
+                    kept += 1
+            f.flush()
+            os.fsync(f.fileno())
+        if not changed and not dropped:
+            tmp.unlink()
+            continue
+        os.replace(tmp, dest)
+        for src in sources:
+            if src != dest:
+                src.unlink()
+        report.append(f"{dest.name}: {len(sources)} file(s), {kept} rows kept, {dropped} dropped")
+    manifest = Manifest(parts_dir)
+    manifest.refresh(parts_dir)
+    manifest.save()
+    return report
+
+def retain(days: int, parts_dir: pathlib.Path = PARTS_DIR, scheme: str = PARTITION,
+           delete: bool = False) -> list[str]:
+    """
+    Холодные партиции, где самая свежая запись старше days дней, уходят в data/catalog/archive/
+    (или удаляются с delete=True). Их uid выпадают из индекса: такая запись, встреченная снова,
+    будет добавлена заново.
+    """
+    manifest = Manifest(parts_dir)
+    manifest.refresh(parts_dir)
+    cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).isoformat()
+    head = head_name(scheme)
+    archive = parts_dir / "archive"
+    moved = []
+    for _, part in segments_of(parts_dir):
+        entry = manifest.parts.get(part.stem) or {}
+        if part.stem >= head or (entry.get("max") or "") >= cutoff:
+            continue
+        if delete:
+            part.unlink()
+        else:
+            archive.mkdir(exist_ok=True)
+            os.replace(part, archive / part.name)
+        moved.append(part.name)
+    manifest.refresh(parts_dir)
+    manifest.save()
+    return moved
+
+
+# ---------- проверка / перестройка ----------
+def check_index(csv_path: pathlib.Path) -> bool:
+    """Полная сверка индекса с CSV: те же uid, то же количество."""
+    index = UidIndex(csv_path)
+    in_csv = set(iter_column(csv_path, index.column)) if csv_path.exists() else set()
+    in_index = set(index)
+    ok = in_csv == in_index and len(index) == len(in_index)
+    print(f"{csv_path.name}: csv={len(in_csv)} index={len(in_index)} count={len(index)} "
+          f"missing={len(in_csv - in_index)} extra={len(in_index - in_csv)} -> {'OK' if ok else 'MISMATCH'}")
+    index.close()
+    return ok
+
+
+def main(argv: list[str]) -> int:
+    cmd = argv[1] if len(argv) > 1 else "check"
+    if cmd == "check":
+        ok = all([check_index(store_path()), check_index(PUBLISHED)])
+        return 0 if ok else 1
+    if cmd == "rebuild":
+        for path in (store_path(), PUBLISHED):
+            index = UidIndex(path)
+            print(f"{path.name}: indexed {index.rebuild()} rows, {len(index)} uids")
+            index.close()
+        if BACKEND == "partitioned":
+            manifest = Manifest(PARTS_DIR)
+            print(f"{manifest.path.name}: rescanned {manifest.refresh(PARTS_DIR)} partition(s)")
+            manifest.save()
+        if BACKEND == "sqlite":
+            db = SqliteCatalog(CATALOG).db
+            print(f"{CATALOG.name}: mirrored {db.rebuild()} rows into {db.db_path.name}")
+            db.close()
+        return 0
+    if cmd == "export":
+        # выгрузка зеркала data/cache/catalog.sqlite обратно в CSV
+        out = pathlib.Path(argv[2]) if len(argv) > 2 else CATALOG.with_suffix(".export.csv")
+        cat = SqliteCatalog(CATALOG)
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(FIELDS)
+            for row in cat.rows():
+                w.writerow([row[k] for k in FIELDS])
+        print(f"exported {len(cat)} rows to {out}")
+        return 0
+    if cmd == "partition":
+        for name, n in split_catalog().items():
+            print(f"{name}.csv: {n} rows")
+        print(f"done; set CATALOG_BACKEND=partitioned and remove {CATALOG.name}")
+        return 0
+    if cmd == "manifest":
+        manifest = Manifest(PARTS_DIR)
+        print(f"rescanned {manifest.refresh(PARTS_DIR)} partition(s)")
+        manifest.save()
+        return 0
+    if cmd == "compact":
+        for line in compact() or ["nothing to compact"]:
+            print(line)
+        return 0
+    if cmd == "retain":
+        if len(argv) < 3:
+            print("usage: catalog.py retain DAYS [--delete]")
+            return 2
+        moved = retain(int(argv[2]), delete="--delete" in argv)
+        print(f"{'deleted' if '--delete' in argv else 'archived'} {len(moved)} partition(s): {' '.join(moved)}")
+        return 0
+    print(f"unknown command: {cmd} (check | rebuild | export [path] | partition | manifest | compact | retain DAYS)")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -5,18 +5,39 @@ collector.py
   • RSS-лент (feedparser)
   • публичных Telegram-каналов (через RSS-прокси + HTML-фолбэк)
 Пишет/дополняет data/catalog.csv с колонками:
-uid,title,link,source,published,summary
+uid,title,link,source,published,summary,cluster_id
+cluster_id — общий id почти-дубликатов одного сюжета (см. dedupe.py).
 """
 
-import csv, hashlib, re, time, datetime, pathlib
+import csv, hashlib, re, time, datetime, pathlib, os
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import requests
 import feedparser
-from bs4 import BeautifulSoup
+
+import catalog
+import html_extract
+import http_client
+import metrics
+import rss_stream
+from catalog import open_catalog, parse_published
+from dedupe import NearDupIndex
+from httpstate import StateStore, conditional_get
+from pathhealth import PathHealth
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 FEEDS_FILE = ROOT / "data" / "feeds.txt"
 CATALOG = ROOT / "data" / "catalog.csv"
+NEARDUP = os.environ.get("COLLECT_NEARDUP", "1") != "0"     # кластеризация почти-дубликатов
+FEED_STATE = ROOT / "data" / "feed_state.json"   # ETag/Last-Modified/хэш по каждой ленте
+TG_HEALTH = ROOT / "data" / "tg_health.json"     # здоровье путей к Telegram-каналам (pathhealth.py)
+
+# параллельная загрузка: общий пул; вежливость к хосту — http_client.HOSTS (HTTP_PER_HOST, HTTP_HOST_INTERVAL)
+WORKERS = int(os.environ.get("COLLECT_WORKERS", "8"))
+TG_MAX_PAGES = int(os.environ.get("TG_MAX_PAGES", "10"))   # страниц t.me/s?after= на догонку канала
+# потоковый разбор RSS до первых известных записей (rss_stream.py); RSS_STREAM=0 — feedparser целиком
+RSS_STREAM = os.environ.get("RSS_STREAM", "1") != "0"
+RSS_SEEN = int(os.environ.get("RSS_SEEN", "50"))   # uid самых новых записей ленты в feed_state.json
 
 # ---------- базовые утилиты ----------
 def iso_now() -> str:
@@ -39,14 +60,40 @@ def clean_text(s: str, maxlen: int | None = None) -> str:
         txt = txt[:maxlen].rstrip() + "…"
     return txt
 
+STATE = StateStore(FEED_STATE)
+
+def fetch_parsed(url: str, known=None):
+    """
+    Условный GET ленты + feedparser по полученному телу.
+    None — лента не изменилась (304 или тот же хэш), разбирать нечего.
+    known(link, dt) — потоковый режим: feedparser получает только записи
+    до первых известных (rss_stream.trim), битый XML разбирается целиком.
+    """
+    r, body = conditional_get(url, STATE, limit=True)
+    if body is None:
+        return None
+    headers = {
+        "content-type": r.headers.get("Content-Type", ""),
+        "content-location": r.url,
+    }
+    with metrics.timer("parse_sec"):
+        if known is not None:
+            doc, status, new, dropped = rss_stream.trim(body, known, headers["content-type"])
+            metrics.note(stream=status, stream_new=new, stream_known=dropped)
+            if doc is not None:
+                # документ пересобран в UTF-8 — кодировку из заголовка не передаём
+                body = doc
+                headers["content-type"] = "application/xml"
+        return feedparser.parse(body, response_headers=headers)
+
 # ---------- подготовка каталога ----------
 def ensure_header():
-    if not CATALOG.exists() or CATALOG.stat().st_size == 0:
-        with open(CATALOG, "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["uid", "title", "link", "source", "published", "summary"])
+    # партиции получают заголовок при первой записи
+    if catalog.BACKEND != "partitioned":
+        catalog.ensure_header(CATALOG)
 
 def read_existing_uids() -> set[str]:
+    """Полный проход по каталогу; в main используется постоянный UidIndex."""
     uids = set()
     if CATALOG.exists():
         with open(CATALOG, newline="", encoding="utf-8") as f:
@@ -74,9 +121,41 @@ def load_feeds() -> list[tuple[str, str]]:
     return feeds
 
 # ---------- RSS ----------
-def parse_rss(url: str) -> list[dict]:
+def rss_known(url: str):
+    """
+    Признак известной записи для потокового разбора: uid среди последних RSS_SEEN
+    записей ленты или дата старше её водяной метки (самой новой даты прошлого разбора).
+    None — ленту ещё не разбирали или поток выключен: разбор целиком.
+    """
+    entry = STATE.get(url)
+    seen = set(entry.get("seen") or ())
+    mark = parse_published(entry.get("newest") or "")
+    if not RSS_STREAM or not (seen or mark):
+        return None
+    return lambda link, dt: make_uid(link) in seen or (mark is not None and dt is not None and dt < mark)
+
+def remember_rss(url: str, items: list[dict], newest: datetime.datetime | None) -> None:
+    """
+    Запоминает uid новых записей и водяную метку. Вызывается из fetch_feed под STATE.deferred():
+    поля попадают в STATE через apply() только после записи ленты в каталог — иначе
+    rss_stream.trim остановился бы на записях, которых в каталоге нет.
+    """
+    entry = STATE.get(url)
+    mark = parse_published(entry.get("newest") or "")
+    seen = list(dict.fromkeys([make_uid(it["link"]) for it in items] + list(entry.get("seen") or ())))
+    fields = {"seen": seen[:RSS_SEEN]}
+    if newest is not None and (mark is None or newest > mark):
+        fields["newest"] = newest.isoformat()
+    STATE.update(url, **fields)
+
+def parse_rss(url: str) -> list[dict] | None:
     items = []
-    d = feedparser.parse(url)
+    d = fetch_parsed(url, rss_known(url))
+    if d is None:
+        metrics.note(path="not_modified")
+        return None
+    metrics.note(path="rss")
+    newest = None
     for e in d.entries:
         link = e.get("link") or ""
         if not link:
@@ -89,7 +168,9 @@ def parse_rss(url: str) -> list[dict]:
         for key in ("published_parsed", "updated_parsed"):
             t = e.get(key)
             if t:
-                published = datetime.datetime(*t[:6], tzinfo=datetime.timezone.utc).isoformat()
+                dt = datetime.datetime(*t[:6], tzinfo=datetime.timezone.utc)
+                newest = dt if newest is None else max(newest, dt)
+                published = dt.isoformat()
                 break
         if not published:
             published = iso_now()
@@ -101,15 +182,25 @@ def parse_rss(url: str) -> list[dict]:
             "published": published,
             "summary": summary
         })
+    remember_rss(url, items, newest)
     return items
 
 # ---------- TELEGRAM ----------
 TG_RSS_PROXY = "https://tg.i-c-a.su/rss/{channel}"  # часто работает для публичных каналов
 
-def parse_tg_rss(channel: str) -> list[dict]:
+def parse_tg_rss(channel: str, after: int = 0) -> tuple[list[dict] | None, bool]:
+    """
+    (записи новее after, встретились ли известные). None вместо записей — лента прокси
+    не изменилась (и в прошлый раз была непустой) или новых сообщений в ней нет.
+    Ошибки сети — наружу.
+    """
     url = TG_RSS_PROXY.format(channel=channel)
     items = []
-    d = feedparser.parse(url)
+    known = 0
+    d = fetch_parsed(url)
+    if d is None:
+        # пустая лента прокси не должна отключать HTML-фолбэк
+        return (None if STATE.get(url).get("entries") else items), False
     for e in d.entries:
         link = e.get("link") or ""
         if not link:
@@ -119,6 +210,9 @@ def parse_tg_rss(channel: str) -> list[dict]:
                 link = f"https://t.me/{channel}/{m.group(1)}"
         if not link:
             continue
+        if after and 0 < html_extract.msg_id(link) <= after:
+            known += 1   # уже в каталоге — не разбираем
+            continue
         title = (e.get("title") or "").strip()
         summary = clean_text(e.get("summary") or e.get("description") or "", 500)
         # time
@@ -137,7 +231,8 @@ def parse_tg_rss(channel: str) -> list[dict]:
             "published": published,
             "summary": summary or title
         })
-    return items
+    STATE.update(url, entries=len(items) + known)
+    return (None if known and not items else items), bool(known)
 
 def normalize_tg_url(url: str) -> tuple[str, str]:
     m = re.match(r"^https?://t\.me/(?:s/)?([^/?#]+)", url.strip())
@@ -147,39 +242,55 @@ def normalize_tg_url(url: str) -> tuple[str, str]:
     page_url = f"https://t.me/s/{channel}"
     return channel, page_url
 
-def parse_tg_html(channel: str) -> list[dict]:
+def timed_get(url: str, **kw) -> requests.Response:
+    """GET через http_client под HOSTS.slot; статус, время и размер — в метрики."""
+    return http_client.get(url, limit=True, **kw)
+
+def parse_tg_html(channel: str, after: int = 0, query: str = "") -> tuple[list[dict] | None, bool]:
     """
-    HTML-фолбэк: пытаемся взять t.me/s/<channel>;
-    если не удалось/JS-страница — используем зеркальный рендер r.jina.ai.
+    HTML t.me/s/<channel>[?query]; ошибка HTTP или страница без блоков сообщений
+    (JS-заглушка) — исключение. Результат — как у tg_page_items.
     """
-    headers = {"User-Agent": "Mozilla/5.0"}
-    items = []
-    page_url = f"https://t.me/s/{channel}"
+    r = timed_get(f"https://t.me/s/{channel}{query}", headers={"User-Agent": "Mozilla/5.0"}, timeout=25)
+    r.raise_for_status()
+    if "tgme_widget_message_wrap" not in r.text:
+        if query:
+            return [], False   # пустая страница листания: решает tg_catch_up
+        raise ValueError("no message blocks on t.me/s page")
+    with metrics.timer("parse_sec"):
+        return tg_page_items(channel, r.text, after)
+
+def parse_tg_mirror(channel: str, after: int = 0) -> tuple[list[dict] | None, bool]:
+    """Зеркальный рендер t.me/s через r.jina.ai."""
+    r = timed_get(f"https://r.jina.ai/http://t.me/s/{channel}", headers={"User-Agent": "Mozilla/5.0"}, timeout=25)
+    r.raise_for_status()
+    with metrics.timer("parse_sec"):
+        return tg_page_items(channel, r.text, after)
+
+def tg_page_items(channel: str, markup: str, after: int = 0) -> tuple[list[dict] | None, bool]:
+    """
+    (записи новее after, встретились ли известные); None вместо записей — на странице
+    есть сообщения, но все уже известны.
+    """
+    items, known = tg_items(channel, markup, after)
+    return (None if known and not items else items), bool(known)
 
-    try:
-        r = requests.get(page_url, headers=headers, timeout=25)
-        use_mirror = (r.status_code >= 400) or ("tgme_widget_message_wrap" not in r.text)
-        if use_mirror:
-            mirror = f"https://r.jina.ai/http://t.me/s/{channel}"
-            r = requests.get(mirror, headers=headers, timeout=25)
-            r.raise_for_status()
-        soup = BeautifulSoup(r.text, "lxml")
-    except Exception as e:
-        print(f"WARN: telegram html failed for {channel}: {e}")
-        return items
-
-    blocks = soup.select("div.tgme_widget_message_wrap")
+def tg_items(channel: str, markup: str, after: int = 0) -> tuple[list[dict], int]:
+    """
+    Записи каталога из HTML t.me/s/<channel> или его зеркала (разбор — html_extract.tg_page)
+    с номером сообщения больше after и число встреченных известных сообщений.
+    """
+    items = []
+    blocks, links, known = html_extract.tg_page(markup, after)
 
     # Если «зеркало» отдало плоский текст — выковыриваем ссылки/текст
     if not blocks:
-        for a in soup.select("a[href*='t.me/']"):
-            href = a.get("href", "")
+        for href, text in links:
             m = re.match(rf"^https?://t\.me/{re.escape(channel)}/(\d+)", href)
             if not m:
                 continue
             msgid = m.group(1)
             link = f"https://t.me/{channel}/{msgid}"
-            text = a.get_text(" ", strip=True)
             if not text:
                 continue
             items.append({
@@ -189,10 +300,10 @@ def parse_tg_html(channel: str) -> list[dict]:
                 "published": iso_now(),
                 "summary": clean_text(text, 500)
             })
-        return items
+        return items, known
 
-    for block in blocks:
-        dp = block.get("data-post")  # channel/1234
+    for dp, text, dt in blocks:
+        # dp: channel/1234
         if not dp:
             continue
         try:
@@ -200,25 +311,19 @@ def parse_tg_html(channel: str) -> list[dict]:
         except ValueError:
             continue
         link = f"https://t.me/{channel}/{msgid}"
-
-        text_el = block.select_one(".tgme_widget_message_text") or block.select_one(".js-message_text")
-        text = text_el.get_text(" ", strip=True) if text_el else ""
         title = clean_text(text, 100) or f"Telegram post {msgid}"
 
         published = iso_now()
-        ttag = block.select_one("time")
-        if ttag:
-            dt = ttag.get("datetime") or ttag.get("datetime-original")
-            if dt:
-                try:
-                    if dt.endswith("Z"):
-                        dt = dt.replace("Z", "+00:00")
-                    dtobj = datetime.datetime.fromisoformat(dt)
-                    if dtobj.tzinfo is None:
-                        dtobj = dtobj.replace(tzinfo=datetime.timezone.utc)
-                    published = dtobj.isoformat()
-                except Exception:
-                    pass
+        if dt:
+            try:
+                if dt.endswith("Z"):
+                    dt = dt.replace("Z", "+00:00")
+                dtobj = datetime.datetime.fromisoformat(dt)
+                if dtobj.tzinfo is None:
+                    dtobj = dtobj.replace(tzinfo=datetime.timezone.utc)
+                published = dtobj.isoformat()
+            except Exception:
+                pass
 
         items.append({
             "title": title,
@@ -228,63 +333,252 @@ def parse_tg_html(channel: str) -> list[dict]:
             "summary": clean_text(text, 500)
         })
 
-    return items
+    return items, known
+
+# пути к каналу в порядке по умолчанию: прокси дешевле всего (условный GET), зеркало — последнее
+TG_PATHS = {"tg_rss": parse_tg_rss, "tg_html": parse_tg_html, "tg_mirror": parse_tg_mirror}
+HEALTH = PathHealth(TG_HEALTH, tuple(TG_PATHS))
+
+def tg_watermark_key(channel: str) -> str:
+    return f"telegram:{channel}"
 
-def fetch_telegram(url: str, throttle: float = 1.0) -> list[dict]:
+def tg_catch_up(channel: str, after: int, first: int) -> tuple[list[dict], int]:
     """
-    1) Пытаемся через RSS-прокси tg.i-c-a.su;
-    2) если пусто — парсим HTML (t.me/s + r.jina.ai).
-    Печатаем статистику по каналу.
+    Дыра между известным after и первой записью свежей страницы (first): листаем
+    t.me/s/<channel>?after=<id> вперёд, пока не дойдём до first (не больше TG_MAX_PAGES).
+    Возвращает записи из дыры и номер, до которого всё прочитано без пропусков:
+    first — только если листание до него дошло.
+    """
+    items: list[dict] = []
+    cursor = after
+    if HEALTH.paused(channel, "tg_html"):
+        return items, cursor
+    for _ in range(TG_MAX_PAGES):
+        try:
+            page, _ = parse_tg_html(channel, cursor, f"?after={cursor}")
+        except Exception as e:
+            print(f"WARN: telegram catch-up failed for {channel} after {cursor}: {e}")
+            return items, cursor
+        ids = [html_extract.msg_id(it["link"]) for it in page or []]
+        if not ids or max(ids) <= cursor:
+            # first точно есть, значит страница без новых сообщений — заглушка, лимит
+            # или другая вёрстка: дыру не закрываем, следующий запуск дочитает с cursor
+            print(f"WARN: telegram catch-up got no messages for {channel} after {cursor}")
+            return items, cursor
+        items.extend(it for it, i in zip(page, ids) if i < first)
+        cursor = max(ids)
+        if cursor >= first:
+            return items, first
+    print(f"TG channel {channel}: catch-up stopped after {TG_MAX_PAGES} page(s) at id {cursor}")
+    return items, cursor
+
+def fetch_telegram(url: str) -> list[dict] | None:
+    """
+    Пути к каналу — по маршруту HEALTH.route(): сначала тот, что сработал последним;
+    разомкнутые (подряд падавшие) пропускаются до конца паузы. Первый путь, который
+    дал записи, — результат; пустой ответ или ошибка — следующий путь.
+    Известные сообщения (номер не больше водяного знака канала в STATE) не разбираются;
+    если свежая страница до них не дошла, дыра дочитывается листанием t.me/s (tg_catch_up).
+    Печатаем статистику по каналу. Паузы между запросами к хостам — в http_client.HOSTS.
+    Дедлайн прогона (DeadlineExceeded) — не ошибка пути: здоровье не трогаем, канал пропущен.
+    None — лента прокси не изменилась с прошлого запуска или новых сообщений нет.
     """
     channel, _ = normalize_tg_url(url)
-    via_rss = parse_tg_rss(channel)
-    via_html = []
-    if not via_rss:
-        via_html = parse_tg_html(channel)
-
-    total = len(via_rss) or len(via_html)
-    print(f"TG channel {channel}: rss={len(via_rss)} html={len(via_html)} total={total}")
-    time.sleep(throttle)
-    return via_rss if via_rss else via_html
+    after = STATE.get(tg_watermark_key(channel)).get("last_id", 0)
+    tried = []
+    for path in HEALTH.route(channel):
+        if not HEALTH.allowed(channel, path):
+            metrics.event("tg_path", channel=channel, path=path, outcome="skipped", sec=0.0)
+            tried.append(f"{path}=skipped")
+            continue
+        metrics.note(path=path)
+        t0 = time.perf_counter()
+        error = ""
+        reached = False
+        try:
+            items, reached = TG_PATHS[path](channel, after)
+            outcome = "not_modified" if items is None else "ok" if items else "empty"
+        except http_client.DeadlineExceeded:
+            HEALTH.release(channel, path)   # иначе проба пути занята до перезапуска (демон)
+            raise
+        except Exception as e:
+            if http_client.expired():
+                # таймаут, урезанный дедлайном, — тоже пропуск, а не сбой пути
+                HEALTH.release(channel, path)
+                raise http_client.DeadlineExceeded(f"run deadline reached during {path}") from e
+            items, outcome, error = [], "error", repr(e)[:200]
+            print(f"WARN: telegram {path} failed for {channel}: {e}")
+            metrics.note(error=error)
+        sec = time.perf_counter() - t0
+        HEALTH.record(channel, path, outcome, sec, error)
+        metrics.event("tg_path", channel=channel, path=path, outcome=outcome, sec=sec)
+        tried.append(f"{path}={outcome}")
+        if items is None:
+            print(f"TG channel {channel}: not modified ({path})")
+            metrics.note(path="not_modified")
+            return None
+        if items:
+            ids = [i for i in (html_extract.msg_id(it["link"]) for it in items) if i]
+            covered = max(ids, default=after)
+            if after and ids and not reached:
+                gap, upto = tg_catch_up(channel, after, min(ids))
+                metrics.note(catch_up=len(gap))
+                items = gap + items
+                if upto < min(ids):
+                    covered = upto   # дыра дочитана не вся: следующий запуск продолжит с upto
+            print(f"TG channel {channel}: {len(items)} via {path} after id {after} [{' '.join(tried)}]")
+            if covered > after:
+                STATE.update(tg_watermark_key(channel), last_id=covered)
+            return items
+    print(f"TG channel {channel}: nothing [{' '.join(tried)}]")
+    return []
+
+# ---------- загрузка лент ----------
+def fetch_feed(typ: str, url: str) -> tuple[list[dict] | None, dict]:
+    """
+    Записи ленты и изменения её состояния (валидаторы, хэш, водяные метки): они
+    не попадают в STATE, пока вызывающий не сделает STATE.apply(changes) — после
+    записи в каталог. Ошибка — изменения отброшены, лента перечитается целиком.
+    """
+    if http_client.expired():
+        # дедлайн прогона: ленты из очереди пула не начинаем
+        raise http_client.DeadlineExceeded(f"run deadline reached, skip {url}")
+    with metrics.feed(typ, url), STATE.deferred() as changes:
+        entries = None
+        if typ == "rss":
+            entries = parse_rss(url)
+        elif typ == "telegram":
+            entries = fetch_telegram(url)
+    return entries, changes
+
+def fetch_all(feeds: list[tuple[str, str]], workers: int = WORKERS):
+    """
+    Качаем ленты пулом потоков, но отдаём результаты строго в порядке feeds.txt:
+    (typ, url, entries, changes, error). Так запись в каталог и счётчики детерминированы.
+    """
+    if workers <= 1:
+        for typ, url in feeds:
+            try:
+                yield typ, url, *fetch_feed(typ, url), None
+            except Exception as e:
+                yield typ, url, None, {}, e
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fetch_feed, typ, url) for typ, url in feeds]
+        for (typ, url), fut in zip(feeds, futures):
+            try:
+                yield typ, url, *fut.result(), None
+            except Exception as e:
+                yield typ, url, None, {}, e
+
+# ---------- запись в каталог ----------
+def add_entries(existing, dups, typ: str, url: str, entries: list[dict]) -> int:
+    """Дописывает в каталог записи ленты с новыми uid; возвращает, сколько добавлено."""
+    rec = metrics.feed_record(url)
+    rec["seen"] = len(entries)
+    added = 0
+    for it in entries:
+        uid = make_uid(it["link"])
+        if uid in existing:
+            continue
+        cluster = ""
+        if dups is not None:
+            dt = parse_published(it["published"])
+            cluster = dups.assign(uid, it["title"] + " " + it["summary"],
+                                  dt.timestamp() if dt else None)
+        existing.append({"uid": uid, **it, "cluster_id": cluster})
+        added += 1
+        rec["added"] = rec.get("added", 0) + 1
+    return added
+
+def commit_all(existing, dups) -> None:
+    """Каталог, индекс почти-дубликатов, затем состояние лент и путей Telegram."""
+    with metrics.stage("catalog.commit") as st:
+        existing.commit()
+        st["rows"] = existing.writer.rows_written
+        st["bytes"] = existing.writer.bytes_written
+    print(f"Catalog commit: {existing.writer.stats()}")
+    if dups is not None:
+        with metrics.stage("neardup.commit") as st:
+            dups.commit()
+            st["items"] = dups.clustered
+        print(f"Near-duplicates: {dups.clustered} joined existing stories")
+    # состояние сохраняем только после записи каталога: при падении ленты перечитаются
+    with metrics.stage("state.save"):
+        STATE.save()
+        HEALTH.save()
+
+def report_health() -> None:
+    for path, h in HEALTH.summary().items():
+        metrics.event("tg_health", path=path, **h)
+        if h["open"] or h["global_open"]:
+            print(f"TG path {path}: {h['open']}/{h['channels']} channel(s) paused"
+                  + (", paused for all channels" if h["global_open"] else ""))
 
 # ---------- точка входа ----------
-def main():
+def collect():
     ensure_header()
-    existing = read_existing_uids()
+    with metrics.stage("catalog.index") as st:
+        existing = open_catalog(CATALOG)   # uid-индекс в data/cache, дочитывает только новый хвост CSV
+        st["rows"] = len(existing)
     added_total = 0
     fetched = {"rss": 0, "telegram": 0}
     added = {"rss": 0, "telegram": 0}
+    unchanged = 0
+    skipped = 0
+    dups = NearDupIndex(existing.path) if NEARDUP else None
 
     feeds = load_feeds()
-    for typ, url in feeds:
-        try:
-            if typ == "rss":
-                entries = parse_rss(url)
-            elif typ == "telegram":
-                entries = fetch_telegram(url)
-            else:
+    with metrics.stage("fetch", feeds=len(feeds)) as st:
+        for typ, url, entries, changes, err in fetch_all(feeds):
+            if isinstance(err, http_client.DeadlineExceeded):
+                skipped += 1   # состояние ленты не тронуто — следующий прогон её возьмёт
                 continue
-
-            fetched[typ] += len(entries)
-
-            for it in entries:
-                uid = make_uid(it["link"])
-                if uid in existing:
-                    continue
-                with open(CATALOG, "a", newline="", encoding="utf-8") as f:
-                    w = csv.writer(f)
-                    w.writerow([uid, it["title"], it["link"], it["source"], it["published"], it["summary"]])
-                existing.add(uid)
-                added_total += 1
-                added[typ] += 1
-
-        except Exception as e:
-            print(f"WARN: failed {typ} {url}: {e}")
-            continue
-
-    print(f"Fetched: RSS={fetched['rss']}, TG={fetched['telegram']}")
-    print(f"Added:   RSS={added['rss']}, TG={added['telegram']}, Total unique={len(existing)}")
+            if err is not None:
+                print(f"WARN: failed {typ} {url}: {err}")
+                continue
+            if entries is None:
+                STATE.apply(changes)
+                unchanged += 1
+                continue
+            try:
+                fetched[typ] += len(entries)
+                n = add_entries(existing, dups, typ, url, entries)
+            except Exception as e:
+                # состояние ленты не применяем: следующий прогон получит её тело заново
+                print(f"WARN: failed {typ} {url}: {e}")
+                metrics.feed_record(url)["error"] = repr(e)[:200]
+                continue
+            STATE.apply(changes)
+            added_total += n
+            added[typ] += n
+        st["items"] = added_total
+        st["skipped"] = skipped
+    if skipped:
+        print(f"Run deadline: {skipped} feed(s) skipped, {http_client.DEADLINE.budget:.0f}s budget")
+    report_health()
+
+    commit_all(existing, dups)
+    if dups is not None:
+        dups.close()
+
+    # известные записи (поток RSS до первых известных, водяной знак Telegram) не разбираются,
+    # поэтому это записи новее состояния ленты, а не всё, что было в ленте
+    print(f"Parsed new: RSS={fetched['rss']}, TG={fetched['telegram']}, not modified={unchanged}")
+    print(f"Added:      RSS={added['rss']}, TG={added['telegram']}, Total unique={len(existing)}")
     print(f"Added {added_total} new items. Total: {len(existing)}")
+    existing.close()
+
+def main():
+    metrics.start("collector")
+    http_client.start()   # дедлайн сетевой части прогона (RUN_DEADLINE)
+    ok = False
+    try:
+        collect()
+        ok = True
+    finally:
+        metrics.finish(ok)
 
 if __name__ == "__main__":
     main()
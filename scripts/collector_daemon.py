@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+collector_daemon.py
+Долгоживущий режим collector.py: вместо прохода по всем лентам раз в час каждая лента
+опрашивается со своим интервалом — частые Telegram-каналы часто, спящие блоги редко.
+
+  • темп ленты (новых записей в час) при старте берётся из истории каталога за
+    DAEMON_HISTORY_DAYS дней, дальше уточняется по каждому опросу (EWMA новых записей
+    на час с прошлого опроса);
+  • интервал — DAEMON_TARGET_ITEMS / темп, в пределах [DAEMON_MIN_INTERVAL, DAEMON_MAX_INTERVAL],
+    ±DAEMON_JITTER случайного разброса, чтобы ленты одного хоста не сходились в одну секунду;
+    ошибка — интервал удваивается (до максимума), темп не трогается;
+  • asyncio-планировщик: ожидание — в цикле событий, загрузка — в пуле потоков
+    (collector.fetch_feed как есть), запись в каталог — в основном потоке;
+  • каталог, индекс почти-дубликатов и состояние лент сбрасываются раз в DAEMON_FLUSH секунд
+    (тот же порядок, что в collector: состояние — после каталога), там же перечитывается
+    feeds.txt и пишутся метрики за прошедший отрезок. Состояние ленты применяется вместе
+    с её записями (collector.fetch_feed отдаёт изменения, STATE.apply — после add_entries),
+    а сброс ждёт, пока начатые опросы закончатся, и на это время не начинает новые;
+  • SIGINT/SIGTERM или DAEMON_RUN_FOR секунд — начатые опросы дожидаются, последний сброс.
+
+Расписание (темп, время прошлого и следующего опроса) — data/cache/poll_state.json:
+после перезапуска ленты не опрашиваются все разом. Файл можно удалить — темп снова
+возьмётся из каталога.
+
+  python scripts/collector_daemon.py                       # до Ctrl+C / SIGTERM
+  DAEMON_RUN_FOR=3300 python scripts/collector_daemon.py   # ~55 минут (cron, CI)
+"""
+
+import asyncio
+import datetime
+import os
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import collector
+import http_client
+import metrics
+from catalog import CACHE_DIR, open_catalog
+from dedupe import NearDupIndex
+from httpstate import StateStore
+
+POLL_STATE = CACHE_DIR / "poll_state.json"
+
+MIN_INTERVAL = float(os.environ.get("DAEMON_MIN_INTERVAL", "300"))       # сек.
+MAX_INTERVAL = float(os.environ.get("DAEMON_MAX_INTERVAL", "86400"))
+TARGET_ITEMS = float(os.environ.get("DAEMON_TARGET_ITEMS", "1"))         # новых записей на опрос
+JITTER = float(os.environ.get("DAEMON_JITTER", "0.2"))                   # ±доля интервала
+FLUSH = float(os.environ.get("DAEMON_FLUSH", "300"))                     # сек. между сбросами
+HISTORY_DAYS = int(os.environ.get("DAEMON_HISTORY_DAYS", "30"))
+RUN_FOR = float(os.environ.get("DAEMON_RUN_FOR", "0"))                   # сек., 0 — до сигнала
+WORKERS = int(os.environ.get("DAEMON_WORKERS", str(collector.WORKERS)))
+EWMA = 0.3
+
+
+# ---------- темп лент ----------
+def source_key(typ: str, url: str) -> str:
+    """Ключ, по которому строки каталога относятся к ленте: канал Telegram или хост."""
+    if typ == "telegram":
+        return "t.me/" + collector.normalize_tg_url(url)[0].lower()
+    return collector.norm_source(url)
+
+
+def row_key(row: dict) -> str:
+    source = row.get("source") or ""
+    if source == "t.me":
+        parts = urlparse(row.get("link") or "").path.strip("/").split("/")
+        return "t.me/" + parts[0].lower() if parts[0] else ""
+    return source
+
+
+def history_rates(existing, feeds: list[tuple[str, str]], days: int = HISTORY_DAYS) -> dict[str, float]:
+    """
+    Новых записей в час по каждой ленте за последние days дней каталога.
+    Ссылки RSS-ленты часто ведут на другой хост (feedburner): хост берётся у записей из
+    её uid в feed_state.json (collector.RSS_SEEN), иначе — хост самой ленты.
+    Ленты с общим ключом делят его записи поровну.
+    """
+    seen_by = {}
+    for typ, url in feeds:
+        if typ == "rss":
+            for uid in collector.STATE.get(url).get("seen") or ():
+                seen_by[uid] = url
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    counts: dict[str, int] = {}
+    hosts: dict[str, str] = {}
+    for row in existing.window(since):
+        key = row_key(row)
+        counts[key] = counts.get(key, 0) + 1
+        url = seen_by.get(row.get("uid"))
+        if url is not None:
+            hosts[url] = key
+    keys = {url: hosts.get(url) or source_key(typ, url) for typ, url in feeds}
+    share: dict[str, int] = {}
+    for key in keys.values():
+        share[key] = share.get(key, 0) + 1
+    return {url: counts.get(key, 0) / share[key] / (days * 24) for url, key in keys.items()}
+
+
+def interval_for(rate: float) -> float:
+    """Интервал опроса без разброса: ожидаем TARGET_ITEMS новых записей за опрос."""
+    if rate <= 0:
+        return MAX_INTERVAL
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, TARGET_ITEMS / rate * 3600))
+
+
+def jittered(sec: float) -> float:
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, sec * random.uniform(1 - JITTER, 1 + JITTER)))
+
+
+# ---------- планировщик ----------
+class Daemon:
+    def __init__(self, existing, dups, poll: StateStore, workers: int = WORKERS):
+        self.existing = existing
+        self.dups = dups
+        self.poll = poll
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.stop = asyncio.Event()
+        # сброс идёт только между опросами: gate закрыт — новые опросы ждут,
+        # idle — ни одного опроса в работе (состояние лент и метрики отрезка целы)
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.inflight = 0
+        self.tasks: dict[tuple[str, str], asyncio.Task] = {}
+        self.added = 0
+        self.polls = 0
+
+    # --- расписание ---
+    def schedule(self, feeds: list[tuple[str, str]]) -> None:
+        """Запускает опрос новых лент из feeds.txt, снимает удалённые."""
+        wanted = set(feeds)
+        for feed, task in list(self.tasks.items()):
+            if feed not in wanted:
+                task.cancel()
+                del self.tasks[feed]
+        fresh = [feed for feed in feeds if feed not in self.tasks]
+        if not fresh:
+            return
+        now = time.time()
+        unknown = [feed for feed in fresh if "rate" not in self.poll.get(feed[1])]
+        rates = history_rates(self.existing, unknown) if unknown else {}
+        for typ, url in fresh:
+            p = self.poll.get(url)
+            if url in rates:
+                p["rate"] = round(rates[url], 4)
+                self.poll.update(url, rate=p["rate"])
+            if p.get("next_ts", 0) <= now:
+                # первый опрос и просроченные за время простоя — вразброс, а не все разом
+                spread = min(MIN_INTERVAL, p.get("interval", MIN_INTERVAL))
+                self.poll.update(url, next_ts=round(now + random.uniform(0, spread), 1))
+        for feed in fresh:
+            self.tasks[feed] = asyncio.create_task(self.run_feed(*feed))
+
+    def reschedule(self, url: str, added: int | None, now: float) -> float:
+        """added=None — ошибка опроса. Возвращает следующий интервал."""
+        p = self.poll.get(url)
+        rate = p.get("rate", 0.0)
+        if added is None:
+            sec = min(MAX_INTERVAL, max(MIN_INTERVAL, 2 * p.get("interval", 0)))
+        else:
+            last = p.get("last_ts")
+            if last:
+                hours = max(now - last, MIN_INTERVAL) / 3600
+                rate += EWMA * (added / hours - rate)
+            sec = jittered(interval_for(rate))
+        self.poll.update(url, rate=round(rate, 4), interval=round(sec, 1), last_ts=round(now, 1),
+                         next_ts=round(now + sec, 1), added=added)
+        return sec
+
+    # --- опрос ---
+    async def run_feed(self, typ: str, url: str) -> None:
+        loop = asyncio.get_running_loop()
+        while not self.stop.is_set():
+            delay = self.poll.get(url).get("next_ts", 0) - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.stop.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            await self.gate.wait()
+            if self.stop.is_set():
+                return
+            added = None
+            self.inflight += 1
+            self.idle.clear()
+            try:
+                entries, changes = await loop.run_in_executor(self.pool, collector.fetch_feed, typ, url)
+                added = 0 if entries is None else collector.add_entries(
+                    self.existing, self.dups, typ, url, entries)
+                collector.STATE.apply(changes)
+            except Exception as e:
+                print(f"WARN: failed {typ} {url}: {e}")
+            finally:
+                self.inflight -= 1
+                if not self.inflight:
+                    self.idle.set()
+            self.polls += 1
+            self.added += added or 0
+            sec = self.reschedule(url, added, time.time())
+            if added:
+                print(f"{typ} {url}: +{added}, next poll in {sec / 60:.0f} min")
+
+    async def flush_loop(self) -> None:
+        while not self.stop.is_set():
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=FLUSH)
+            except asyncio.TimeoutError:
+                self.gate.clear()
+                try:
+                    await self.idle.wait()
+                    self.flush()
+                    self.schedule(collector.load_feeds())
+                finally:
+                    self.gate.set()
+
+    def flush(self, restart: bool = True) -> None:
+        collector.report_health()
+        metrics.event("daemon", polls=self.polls, added=self.added, feeds=len(self.tasks))
+        collector.commit_all(self.existing, self.dups)
+        self.poll.save()
+        print(f"Flush: {self.polls} poll(s), {self.added} new item(s), {len(self.tasks)} feed(s)")
+        self.polls = self.added = 0
+        if restart:
+            # метрики — отрезками между сбросами
+            metrics.finish(True)
+            metrics.start("collector_daemon")
+
+    async def run(self, run_for: float = RUN_FOR) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop.set)
+        if run_for > 0:
+            loop.call_later(run_for, self.stop.set)
+        self.schedule(collector.load_feeds())
+        flusher = asyncio.create_task(self.flush_loop())
+        await self.stop.wait()
+        print("Stopping: waiting for polls in progress")
+        # начатые опросы доводим до конца: иначе состояние ленты (хэш, водяные метки)
+        # могло бы записаться без её записей в каталоге
+        await asyncio.gather(flusher, *self.tasks.values(), return_exceptions=True)
+        self.pool.shutdown(wait=True)
+        self.flush(restart=False)
+
+
+def main():
+    metrics.start("collector_daemon")
+    http_client.start(0)   # без общего дедлайна: у каждой ленты свой интервал
+    collector.ensure_header()
+    existing = open_catalog(collector.CATALOG)
+    dups = NearDupIndex(existing.path) if collector.NEARDUP else None
+    poll = StateStore(POLL_STATE)
+    ok = False
+    try:
+        asyncio.run(Daemon(existing, dups, poll).run())
+        ok = True
+    finally:
+        if dups is not None:
+            dups.close()
+        existing.close()
+        metrics.finish(ok)
+
+
+if __name__ == "__main__":
+    main()
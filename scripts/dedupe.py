@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+dedupe.py
+Поиск почти-дубликатов при сборе: один и тот же сюжет из нескольких RSS
+и репостов в Telegram получает общий cluster_id.
+
+Заголовок + описание → словесные 3-шинглы → MinHash-подпись (NUM_PERM значений)
+→ LSH: подпись режется на BANDS полос, совпадение хотя бы одной полосы даёт кандидата,
+кандидат подтверждается оценкой сходства Жаккара по подписям.
+Вставка — BANDS индексных запросов в SQLite, без сравнения со всем каталогом.
+
+cluster_id — uid первой строки сюжета; у первой строки cluster_id == uid.
+Индекс data/cache/neardup.sqlite восстанавливается из catalog.csv и хранит
+только последние HORIZON_DAYS дней.
+"""
+
+import hashlib
+import pathlib
+import random
+import re
+import struct
+import time
+import zlib
+
+from catalog import CACHE_DIR, CsvMirror, parse_published
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.7        # минимальное оценённое сходство Жаккара для склейки; ниже — шаблонные посты (сводки, курсы)
+MIN_WORDS = 6          # короткие тексты не кластеризуем — слишком много ложных совпадений
+SHINGLE = 3
+HORIZON_DAYS = 30
+
+P = (1 << 31) - 1
+_rng = random.Random(20250804)
+PERMS = [(_rng.randrange(1, P), _rng.randrange(0, P)) for _ in range(NUM_PERM)]
+
+RE_WORD = re.compile(r"[a-zа-яё0-9]+")
+
+
+def words_of(text: str) -> list[str]:
+    return RE_WORD.findall((text or "").lower())
+
+def shingles(words: list[str]) -> set[int]:
+    if len(words) < SHINGLE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)]
+    return {zlib.crc32(g.encode("utf-8")) % P for g in grams}
+
+def signature(hs: set[int]) -> list[int]:
+    return [min((a * x + b) % P for x in hs) for a, b in PERMS]
+
+def band_keys(sig: list[int]) -> list[int]:
+    keys = []
+    for i in range(BANDS):
+        chunk = struct.pack(f"<{ROWS}I", *sig[i * ROWS:(i + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+def similarity(a: list[int], b: list[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+def pack(sig: list[int]) -> bytes:
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+def unpack(blob: bytes) -> list[int]:
+    return list(struct.unpack(f"<{NUM_PERM}I", blob))
+
+def row_text(row: dict) -> str:
+    return (row.get("title") or "") + " " + (row.get("summary") or "")
+
+
+class NearDupIndex(CsvMirror):
+    """LSH-индекс MinHash-подписей строк каталога за последние HORIZON_DAYS дней."""
+
+    VERSION = 1
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS members (uid TEXT PRIMARY KEY, cluster TEXT, sig BLOB, ts REAL)",
+        "CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, uid TEXT)",
+        "CREATE INDEX IF NOT EXISTS bands_key ON bands (band, key)",
+        "CREATE INDEX IF NOT EXISTS members_ts ON members (ts)",
+    ]
+    TABLES = ["members", "bands"]
+
+    def __init__(self, csv_path: pathlib.Path, db_path: pathlib.Path | None = None):
+        self.clustered = 0
+        super().__init__(csv_path, db_path or CACHE_DIR / "neardup.sqlite")
+
+    def _horizon(self) -> float:
+        return time.time() - HORIZON_DAYS * 86400
+
+    def _ingest(self, header: list[str], rows) -> int:
+        horizon = self._horizon()
+        n = 0
+        for values in rows:
+            row = dict(zip(header, values))
+            dt = parse_published(row.get("published"))
+            ts = dt.timestamp() if dt else time.time()
+            if ts < horizon:
+                continue
+            self.assign(row.get("uid") or "", row_text(row), ts, cluster=row.get("cluster_id") or None)
+            n += 1
+        return n
+
+    def assign(self, uid: str, text: str, ts: float | None = None, cluster: str | None = None) -> str:
+        """
+        Возвращает cluster_id для новой строки и запоминает её подпись.
+        cluster задан — строка уже размечена (чтение из CSV), только индексируем.
+        """
+        words = words_of(text)
+        if len(words) < MIN_WORDS:
+            return cluster or uid
+        sig = signature(shingles(words))
+        keys = band_keys(sig)
+
+        if cluster is None:
+            cluster = uid
+            best = THRESHOLD
+            seen = set()
+            for band, key in enumerate(keys):
+                for (cand,) in self.db.execute("SELECT uid FROM bands WHERE band=? AND key=?", (band, key)):
+                    if cand in seen or cand == uid:
+                        continue
+                    seen.add(cand)
+                    got = self.db.execute("SELECT cluster, sig FROM members WHERE uid=?", (cand,)).fetchone()
+                    if not got:
+                        continue
+                    sim = similarity(sig, unpack(got[1]))
+                    if sim >= best:
+                        best, cluster = sim, got[0]
+            if cluster != uid:
+                self.clustered += 1
+
+        cur = self.db.execute("INSERT OR IGNORE INTO members (uid, cluster, sig, ts) VALUES (?, ?, ?, ?)",
+                              (uid, cluster, pack(sig), ts if ts is not None else time.time()))
+        if cur.rowcount:
+            self.db.executemany("INSERT INTO bands (band, key, uid) VALUES (?, ?, ?)",
+                                [(band, key, uid) for band, key in enumerate(keys)])
+            self.count += 1
+        return cluster
+
+    def prune(self) -> int:
+        """Удаляет подписи старше горизонта, чтобы индекс не рос вместе с каталогом."""
+        horizon = self._horizon()
+        self.db.execute("DELETE FROM bands WHERE uid IN (SELECT uid FROM members WHERE ts < ?)", (horizon,))
+        cur = self.db.execute("DELETE FROM members WHERE ts < ?", (horizon,))
+        self.count -= cur.rowcount
+        return cur.rowcount
+
+    def commit(self) -> None:
+        self.prune()
+        super().commit()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+html_extract.py
+Извлечение текста из HTML для collector (t.me/s/<channel> и зеркало r.jina.ai)
+и trends (страницы трендов).
+
+Быстрый путь — lxml напрямую: дерево строит C-парсер, нужные узлы берутся XPath,
+текст собирается только у них. Эталон — прежний BeautifulSoup + CSS select;
+результаты совпадают (bench/bench_html.py сверяет оба пути на bench/fixtures/).
+HTML_FAST=0 — эталонный путь.
+"""
+
+import os
+import re
+
+import lxml.html
+from bs4 import BeautifulSoup
+from lxml import etree
+
+FAST = os.environ.get("HTML_FAST", "1") != "0"
+
+WRAP = "tgme_widget_message_wrap"
+RE_MSG_ID = re.compile(r"t\.me/[^/?#]+/(\d+)")
+
+
+def msg_id(post: str) -> int:
+    """Номер сообщения из data-post ("channel/1234") или ссылки t.me/<channel>/<id>; 0 — нет."""
+    tail = post.rsplit("/", 1)[-1] if "t.me/" not in post else ""
+    if tail.isdigit():
+        return int(tail)
+    m = RE_MSG_ID.search(post)
+    return int(m.group(1)) if m else 0
+
+
+def has_class(name: str) -> str:
+    """XPath-условие «в class есть слово name» — как CSS .name."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+X_WRAPS = etree.XPath(f"//div[{has_class(WRAP)}]")
+X_POST = etree.XPath(".//*[@data-post]/@data-post")
+X_TEXT = etree.XPath(f".//*[{has_class('tgme_widget_message_text')}]")
+X_JS_TEXT = etree.XPath(f".//*[{has_class('js-message_text')}]")
+X_TIME = etree.XPath(".//time")
+X_TG_LINKS = etree.XPath("//a[contains(@href, 't.me/')]")
+X_PAGE = etree.XPath("//*[self::h1 or self::h2 or self::h3 or self::p or self::li or self::a]")
+
+
+def parse(markup: str):
+    """Корень документа или None для пустой/нечитаемой разметки."""
+    if not markup or not markup.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(markup)
+    except (etree.ParserError, ValueError):
+        # строка с XML-декларацией кодировки — отдаём байтами
+        try:
+            return lxml.html.document_fromstring(markup.encode("utf-8"))
+        except (etree.ParserError, ValueError):
+            return None
+
+
+# Теги, строки внутри которых BeautifulSoup хранит особым типом (Script, Stylesheet,
+# TemplateString, ...) — по ближайшему такому предку. get_text() тега отдаёт только
+# строки «своего» типа: у обычного тега — без содержимого script/style/template, у
+# самого script — только его код.
+CONTAINERS = {"rt", "rp", "style", "script", "template"}
+
+
+def text_of(el) -> str:
+    """Как Tag.get_text(" ", strip=True): непустые текстовые узлы поддерева через пробел."""
+    want = el.tag if el.tag in CONTAINERS else None
+    cur = want or next((a.tag for a in el.iterancestors() if a.tag in CONTAINERS), None)
+    parts: list[str] = []
+    collect_text(el, parts, want, cur)
+    return " ".join(parts)
+
+
+def collect_text(el, parts: list[str], want, cur) -> None:
+    """cur — тип строк, лежащих прямо в el; берутся только строки типа want."""
+    if cur == want and el.text and el.text.strip():
+        parts.append(el.text.strip())
+    for child in el:
+        if isinstance(child.tag, str):   # у комментариев и инструкций текст не берётся, хвост — да
+            collect_text(child, parts, want, child.tag if child.tag in CONTAINERS else cur)
+        if cur == want and child.tail and child.tail.strip():
+            parts.append(child.tail.strip())
+
+
+# ---------- Telegram ----------
+def tg_page(markup: str, after: int = 0) -> tuple[list[tuple[str, str, str]], list[tuple[str, str]], int]:
+    """
+    Сообщения страницы t.me/s: [(data-post, текст, datetime у <time>)] и, если блоков
+    сообщений нет (плоское зеркало), ссылки [(href, текст)] на t.me/...
+    data-post берётся у блока-обёртки или первого вложенного элемента с ним.
+    after — последний известный номер: страница идёт по возрастанию, поэтому блоки
+    разбираются с конца до первого известного; ссылки зеркала просто фильтруются.
+    Третье значение — сколько известных сообщений встретилось (0 — до after не дошли).
+    """
+    if not FAST:
+        return tg_page_bs4(markup, after)
+    root = parse(markup)
+    if root is None:
+        return [], [], 0
+    blocks = []
+    known = 0
+    for wrap in reversed(X_WRAPS(root)):
+        post = wrap.get("data-post")
+        if not post:
+            found = X_POST(wrap)
+            post = found[0] if found else ""
+        if after and 0 < msg_id(post) <= after:
+            known += 1
+            break
+        el = (X_TEXT(wrap) or X_JS_TEXT(wrap) or [None])[0]
+        times = X_TIME(wrap)
+        dt = ""
+        if times:
+            dt = times[0].get("datetime") or times[0].get("datetime-original") or ""
+        blocks.append((post, text_of(el) if el is not None else "", dt))
+    if blocks or known:
+        return blocks[::-1], [], known
+    return [], *new_links([(a.get("href", ""), a) for a in X_TG_LINKS(root)], text_of, after)
+
+
+def new_links(anchors, text, after: int) -> tuple[list[tuple[str, str]], int]:
+    """Ссылки зеркала новее after (текст считается только у них) и число известных."""
+    out, known = [], 0
+    for href, a in anchors:
+        if after and 0 < msg_id(href) <= after:
+            known += 1
+        else:
+            out.append((href, text(a)))
+    return out, known
+
+
+def tg_page_bs4(markup: str, after: int = 0) -> tuple[list[tuple[str, str, str]], list[tuple[str, str]], int]:
+    soup = BeautifulSoup(markup, "lxml")
+    blocks = []
+    known = 0
+    for block in reversed(soup.select(f"div.{WRAP}")):
+        post = block.get("data-post")
+        if not post:
+            inner = block.select_one("[data-post]")
+            post = inner.get("data-post") if inner else ""
+        if after and 0 < msg_id(post) <= after:
+            known += 1
+            break
+        el = block.select_one(".tgme_widget_message_text") or block.select_one(".js-message_text")
+        ttag = block.select_one("time")
+        dt = ""
+        if ttag:
+            dt = ttag.get("datetime") or ttag.get("datetime-original") or ""
+        blocks.append((post, el.get_text(" ", strip=True) if el else "", dt))
+    if blocks or known:
+        return blocks[::-1], [], known
+    anchors = [(a.get("href", ""), a) for a in soup.select("a[href*='t.me/']")]
+    return [], *new_links(anchors, lambda a: a.get_text(" ", strip=True), after)
+
+
+# ---------- Страницы трендов ----------
+def page_text(markup: str) -> str:
+    """Текст заголовков, абзацев, пунктов списков и ссылок в порядке документа."""
+    if not FAST:
+        return page_text_bs4(markup)
+    root = parse(markup)
+    if root is None:
+        return ""
+    return " ".join(text_of(el) for el in X_PAGE(root))
+
+
+def page_text_bs4(markup: str) -> str:
+    soup = BeautifulSoup(markup, "lxml")
+    return " ".join(t.get_text(" ", strip=True) for t in soup.select("h1, h2, h3, p, li, a"))
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+http_client.py
+Общий HTTP-клиент для collector / trends / writer / post_telegram.
+
+  • одна requests.Session на процесс: keep-alive пулы соединений по хостам
+    (HTTP_POOL соединений на хост), сжатие gzip/deflate;
+  • повторы с экспоненциальной паузой и случайным разбросом (jitter): сетевые
+    ошибки, таймауты, 429 и 5xx; для POST — только 429 и таймаут соединения
+    (запрос до сервера не дошёл), чтобы не отправить сообщение дважды;
+  • общий дедлайн прогона (start(budget), RUN_DEADLINE): таймаут каждого запроса
+    урезается до оставшегося времени, запрос, на который его меньше HTTP_MIN_FETCH,
+    не начинается — DeadlineExceeded; повтор, не влезающий в дедлайн, не делается;
+  • HostLimiter — вежливость к хосту (одновременных запросов и пауза между стартами).
+
+  r = http_client.get(url, timeout=25)               # статус, время и байты — в metrics.http
+  r = http_client.get(url, limit=True)               # под http_client.HOSTS.slot(url)
+  r = http_client.post(url, json=..., retries=0)
+
+Без start() дедлайна нет — удобно для bench/ и разовых вызовов.
+"""
+
+import contextlib
+import os
+import random
+import threading
+import time
+
+import requests
+
+import metrics
+
+RUN_DEADLINE = float(os.environ.get("RUN_DEADLINE", "0"))       # сек. на прогон скрипта, 0 — без лимита
+MIN_FETCH = float(os.environ.get("HTTP_MIN_FETCH", "3"))        # меньше осталось — запрос не начинаем
+RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))              # повторов сверх первой попытки
+BACKOFF = float(os.environ.get("HTTP_BACKOFF", "1.0"))          # пауза перед 1-м повтором, дальше ×2
+BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", "30"))
+POOL = int(os.environ.get("HTTP_POOL", "8"))                    # keep-alive соединений на хост
+# вежливость к хосту (для запросов с limit=True); прежние имена из collector — запасные
+PER_HOST = int(os.environ.get("HTTP_PER_HOST", os.environ.get("COLLECT_PER_HOST", "2")))
+HOST_INTERVAL = float(os.environ.get("HTTP_HOST_INTERVAL", os.environ.get("COLLECT_HOST_INTERVAL", "1.0")))
+
+HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "gzip, deflate"}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS"}
+
+
+class DeadlineExceeded(requests.RequestException):
+    """Времени прогона не хватает на запрос — он не начат (лента пропускается)."""
+
+
+class Deadline:
+    """Момент, к которому прогон должен закончить сетевую часть; budget <= 0 — без лимита."""
+
+    def __init__(self, budget: float = 0.0):
+        self.budget = budget
+        self.end = time.monotonic() + budget if budget > 0 else None
+
+    def remaining(self) -> float | None:
+        return None if self.end is None else self.end - time.monotonic()
+
+    def expired(self) -> bool:
+        left = self.remaining()
+        return left is not None and left < MIN_FETCH
+
+    def fits(self, sec: float) -> bool:
+        """Успеем ли подождать sec и ещё начать запрос."""
+        left = self.remaining()
+        return left is None or left - sec >= MIN_FETCH
+
+    def timeout(self, timeout: float, url: str = "") -> float:
+        """Таймаут запроса, урезанный до остатка; остатка нет — DeadlineExceeded."""
+        left = self.remaining()
+        if left is None:
+            return timeout
+        if left < MIN_FETCH:
+            raise DeadlineExceeded(f"run deadline ({self.budget:.0f}s) reached, skip {url}")
+        return min(timeout, left)
+
+
+DEADLINE = Deadline()
+
+
+def start(budget: float = RUN_DEADLINE) -> Deadline:
+    """Дедлайн прогона: вызывается в начале main, отсчёт — с этого момента."""
+    global DEADLINE
+    DEADLINE = Deadline(budget)
+    return DEADLINE
+
+
+def remaining() -> float | None:
+    return DEADLINE.remaining()
+
+
+def expired() -> bool:
+    return DEADLINE.expired()
+
+
+class HostLimiter:
+    """
+    Ограничитель по хостам: не больше per_host одновременных запросов
+    и не чаще одного старта запроса в interval секунд. Очередь, не успевающая
+    до дедлайна, получает DeadlineExceeded, а не ждёт впустую.
+    """
+    def __init__(self, per_host: int = 2, interval: float = 1.0):
+        self.per_host = max(1, per_host)
+        self.interval = max(0.0, interval)
+        self._lock = threading.Lock()
+        self._sems: dict[str, threading.BoundedSemaphore] = {}
+        self._next: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def slot(self, url: str):
+        host = metrics.host_of(url)
+        with self._lock:
+            sem = self._sems.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        left = DEADLINE.remaining()
+        if not sem.acquire(timeout=None if left is None else max(0.0, left - MIN_FETCH)):
+            raise DeadlineExceeded(f"run deadline reached waiting for {host}")
+        try:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next.get(host, 0.0))
+                if not DEADLINE.fits(start - now):
+                    raise DeadlineExceeded(f"run deadline reached waiting for {host}")
+                self._next[host] = start + self.interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            sem.release()
+
+
+HOSTS = HostLimiter(PER_HOST, HOST_INTERVAL)
+
+
+def make_session(pool: int = POOL) -> requests.Session:
+    session = requests.Session()
+    # pool_connections — сколько хостов держим открытыми, pool_maxsize — соединений на хост
+    adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=max(1, pool))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+SESSION = make_session()
+
+
+def backoff(attempt: int, retry_after: str | None = None) -> float:
+    """Пауза перед повтором attempt (с 0): BACKOFF·2^attempt ±50%, не меньше Retry-After."""
+    delay = min(BACKOFF_MAX, BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+    if retry_after and retry_after.strip().isdigit():
+        delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+    return delay
+
+
+def request(method: str, url: str, *, timeout: float = 25, retries: int | None = None,
+            limit: bool = False, record: bool = True, log_url: str | None = None,
+            **kw) -> requests.Response:
+    """
+    Запрос через общую сессию с повторами и дедлайном прогона.
+    limit — под HOSTS.slot(url); record=False — метрики пишет вызывающий
+    (потоковое чтение: r.content здесь трогать нельзя); log_url — URL для метрик
+    вместо настоящего (без секретов вроде токена бота).
+    Ответ с ошибочным статусом возвращается как есть (raise_for_status — у вызывающего).
+    """
+    method = method.upper()
+    log_url = log_url or url
+    retries = RETRIES if retries is None else retries
+    idempotent = method in IDEMPOTENT
+    retry_exc = (requests.ConnectionError, requests.Timeout) if idempotent else (requests.ConnectTimeout,)
+    retry_status = RETRY_STATUS if idempotent else {429}
+    attempt = 0
+    while True:
+        try:
+            with HOSTS.slot(url) if limit else contextlib.nullcontext():
+                t = DEADLINE.timeout(timeout, log_url)
+                t0 = time.perf_counter()
+                r = SESSION.request(method, url, timeout=t, **kw)
+        except DeadlineExceeded:
+            metrics.event("http_skip", url=log_url, host=metrics.host_of(log_url))
+            raise
+        except retry_exc as e:
+            delay = backoff(attempt)
+            if attempt >= retries or not DEADLINE.fits(delay):
+                raise
+            reason = type(e).__name__
+        else:
+            if record:
+                metrics.http(log_url, r.status_code, time.perf_counter() - t0, len(r.content))
+            if r.status_code not in retry_status or attempt >= retries:
+                return r
+            delay = backoff(attempt, r.headers.get("Retry-After"))
+            if not DEADLINE.fits(delay):
+                return r
+            reason = str(r.status_code)
+            r.close()
+        metrics.event("http_retry", url=log_url, host=metrics.host_of(log_url), reason=reason, attempt=attempt + 1)
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url: str, **kw) -> requests.Response:
+    return request("GET", url, **kw)
+
+
+def post(url: str, **kw) -> requests.Response:
+    return request("POST", url, **kw)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+httpstate.py
+Состояние HTTP-загрузок между запусками: ETag, Last-Modified и хэш тела
+для каждого URL. Хранится в JSON (например, data/feed_state.json).
+Повторный запрос отправляет валидаторы; при 304 или том же теле
+разбирать ленту заново не нужно.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+import http_client
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+
+class StateStore:
+    """
+    JSON-словарь url -> {etag, last_modified, hash, ...}; потокобезопасен.
+    Внутри deferred() изменения текущего потока копятся отдельно (get() их видит,
+    save() — нет) и попадают в словарь только через apply(): так состояние ленты
+    записывается после её строк в каталоге, а не при загрузке.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dirty = False
+        self._data: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8")) or {}
+            except Exception as e:
+                print(f"WARN: cannot read {self.path.name}, starting fresh: {e}")
+
+    @staticmethod
+    def _merge(entry: dict, fields: dict) -> dict:
+        for k, v in fields.items():
+            if v is None:
+                entry.pop(k, None)
+            else:
+                entry[k] = v
+        return entry
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            entry = dict(self._data.get(key) or {})
+        changes = getattr(self._local, "changes", None)
+        if changes is not None and key in changes:
+            reset, fields = changes[key]
+            entry = self._merge({} if reset else entry, fields)
+        return entry
+
+    def update(self, key: str, **fields) -> None:
+        changes = getattr(self._local, "changes", None)
+        if changes is not None:
+            reset, pending = changes.get(key, (False, {}))
+            changes[key] = (reset, {**pending, **fields})
+            return
+        with self._lock:
+            self._merge(self._data.setdefault(key, {}), fields)
+            self._dirty = True
+
+    def delete(self, key: str) -> None:
+        changes = getattr(self._local, "changes", None)
+        if changes is not None:
+            changes[key] = (True, {})
+            return
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._dirty = True
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """Изменения в блоке (в этом потоке) — в отдаваемый dict; применить — apply(changes)."""
+        prev = getattr(self._local, "changes", None)
+        changes: dict[str, tuple[bool, dict]] = {}
+        self._local.changes = changes
+        try:
+            yield changes
+        finally:
+            self._local.changes = prev
+
+    def apply(self, changes: dict[str, tuple[bool, dict]]) -> None:
+        with self._lock:
+            for key, (reset, fields) in changes.items():
+                entry = self._merge({} if reset else dict(self._data.get(key) or {}), fields)
+                if entry or not reset:
+                    self._data[key] = entry
+                else:
+                    self._data.pop(key, None)
+                self._dirty = True
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._data)
+
+    def save(self) -> None:
+        """
+        Атомарно: пишем во временный файл и переименовываем. Файла ещё нет —
+        пишется и пустой словарь: workflow коммитит файлы состояния по имени.
+        """
+        with self._lock:
+            if not self._dirty and self.path.exists():
+                return
+            payload = json.dumps(self._data, ensure_ascii=False, indent=1, sort_keys=True)
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(payload + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def body_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def conditional_get(url: str, state: StateStore, timeout: int = 25, headers: dict | None = None,
+                    limit: bool = False):
+    """
+    GET с If-None-Match / If-Modified-Since из state через http_client
+    (повторы, дедлайн прогона; limit — под http_client.HOSTS).
+    Возвращает (response, body): body=None, если сервер ответил 304
+    или тело совпало по хэшу с прошлым разом.
+    """
+    entry = state.get(url)
+    h = dict(HEADERS)
+    h.update(headers or {})
+    if entry.get("etag"):
+        h["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        h["If-Modified-Since"] = entry["last_modified"]
+
+    r = http_client.get(url, headers=h, timeout=timeout, limit=limit)
+    checked = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    if r.status_code == 304:
+        state.update(url, checked=checked, status=304)
+        return r, None
+    r.raise_for_status()
+
+    body = r.content
+    digest = body_hash(body)
+    state.update(
+        url,
+        etag=r.headers.get("ETag"),
+        last_modified=r.headers.get("Last-Modified"),
+        hash=digest,
+        checked=checked,
+        status=r.status_code,
+    )
+    if digest == entry.get("hash"):
+        return r, None
+    return r, body
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+Метрики прогона, общие для collector / trends / writer / post_telegram.
+
+  metrics.start("collector")                 # в начале main
+  with metrics.stage("catalog.commit") as s: # время этапа; в s можно дописать поля (rows, bytes, ...)
+      ...
+  with metrics.feed("rss", url) as f:        # всё про одну ленту: HTTP-запросы, разбор, путь
+      ...
+  metrics.http(url, status, sec, nbytes)     # из мест, где делается запрос; попадает и в текущую ленту
+  metrics.finish()                           # в конце main: запись в data/metrics/
+
+На выходе:
+  data/metrics/<script>.jsonl — по строке на событие (run_id, ts, kind, ...), дописывается;
+  data/metrics/<script>.prom  — последний прогон в текстовом формате Prometheus
+                                (textfile collector у node_exporter), пишется атомарно.
+Без start() события копятся в пустом прогоне и никуда не пишутся. METRICS=0 — не писать файлы.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+from urllib.parse import urlparse
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+METRICS_DIR = pathlib.Path(os.environ.get("METRICS_DIR", ROOT / "data" / "metrics"))
+ENABLED = os.environ.get("METRICS", "1") != "0"
+JSONL_MAX_BYTES = 20 * 1024 * 1024   # дальше .jsonl переезжает в .jsonl.1
+PREFIX = "niche"
+
+
+def host_of(url: str) -> str:
+    try:
+        return urlparse(url).netloc.lower()
+    except Exception:
+        return ""
+
+
+class Run:
+    """События одного прогона скрипта; потокобезопасен."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self.started = time.time()
+        self.run_id = datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.events: list[dict] = []
+        self.feeds: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def event(self, kind: str, **fields) -> dict:
+        """Добавляет событие и возвращает его: поля можно дописывать до finish()."""
+        rec = {"kind": kind, **fields}
+        with self._lock:
+            self.events.append(rec)
+        return rec
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **fields):
+        rec = {"stage": name, **fields}
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        except Exception as e:
+            rec["error"] = repr(e)[:200]
+            raise
+        finally:
+            rec["sec"] = time.perf_counter() - t0
+            self.event("stage", **rec)
+
+    @contextlib.contextmanager
+    def feed(self, typ: str, url: str):
+        """Контекст ленты в текущем потоке: http() и timer() дописывают в него."""
+        rec = self.event("feed", type=typ, feed=url, host=host_of(url), path="", status=0,
+                         requests=0, bytes=0, fetch_sec=0.0, parse_sec=0.0, seen=0, added=0)
+        with self._lock:
+            self.feeds[url] = rec
+        prev = getattr(self._local, "feed", None)
+        self._local.feed = rec
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        except Exception as e:
+            rec["error"] = repr(e)[:200]
+            raise
+        finally:
+            rec["sec"] = time.perf_counter() - t0
+            self._local.feed = prev
+
+    def current_feed(self) -> dict | None:
+        return getattr(self._local, "feed", None)
+
+    def note(self, **fields) -> None:
+        """Дописывает поля в текущую ленту (например path="tg_html")."""
+        rec = self.current_feed()
+        if rec is not None:
+            rec.update(fields)
+
+    def http(self, url: str, status: int, sec: float, nbytes: int) -> None:
+        self.event("http", url=url, host=host_of(url), status=status, sec=sec, bytes=nbytes)
+        rec = self.current_feed()
+        if rec is not None:
+            rec["requests"] += 1
+            rec["bytes"] += nbytes
+            rec["fetch_sec"] += sec
+            rec["status"] = status
+
+    @contextlib.contextmanager
+    def timer(self, field: str):
+        """Прибавляет время блока к полю field текущей ленты (например parse_sec)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            rec = self.current_feed()
+            if rec is not None:
+                rec[field] = rec.get(field, 0.0) + time.perf_counter() - t0
+
+    # --- запись ---
+    def finish(self, ok: bool = True) -> None:
+        self.event("run", sec=time.time() - self.started, ok=ok)
+        if not ENABLED:
+            return
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        self._write_jsonl(METRICS_DIR / f"{self.script}.jsonl")
+        self._write_prom(METRICS_DIR / f"{self.script}.prom")
+
+    def _write_jsonl(self, path: pathlib.Path) -> None:
+        if path.exists() and path.stat().st_size > JSONL_MAX_BYTES:
+            os.replace(path, path.with_suffix(".jsonl.1"))
+        ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with open(path, "a", encoding="utf-8") as f:
+            for rec in self.events:
+                line = {"run_id": self.run_id, "script": self.script, "ts": ts, **rec}
+                f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+
+    def _write_prom(self, path: pathlib.Path) -> None:
+        families: dict[str, list[str]] = {}   # формат требует, чтобы строки метрики шли подряд
+
+        def put(name: str, value, help_: str, kind: str = "gauge", **labels) -> None:
+            metric = f"{PREFIX}_{name}"
+            if metric not in families:
+                families[metric] = [f"# HELP {metric} {help_}", f"# TYPE {metric} {kind}"]
+            lab = ",".join(f'{k}="{prom_escape(v)}"' for k, v in {"script": self.script, **labels}.items())
+            families[metric].append(f"{metric}{{{lab}}} {float(value):.12g}")
+
+        by_kind: dict[str, list[dict]] = {}
+        for rec in self.events:
+            by_kind.setdefault(rec["kind"], []).append(rec)
+
+        for rec in by_kind.get("run", []):
+            put("run_duration_seconds", rec["sec"], "Длительность прогона")
+            put("run_success", int(bool(rec["ok"])), "1 — прогон завершился без исключения")
+        put("run_timestamp_seconds", self.started, "Время старта прогона (unix)")
+
+        for rec in by_kind.get("stage", []):
+            put("stage_duration_seconds", rec["sec"], "Длительность этапа", stage=rec["stage"])
+            for key in ("rows", "items", "bytes"):
+                if isinstance(rec.get(key), (int, float)):
+                    put(f"stage_{key}", rec[key], f"Этап: {key}", stage=rec["stage"])
+
+        for rec in by_kind.get("feed", []):
+            labels = {"type": rec["type"], "feed": rec["feed"], "path": rec.get("path") or ""}
+            put("feed_duration_seconds", rec.get("sec", 0.0), "Лента: общее время", **labels)
+            put("feed_fetch_seconds", rec["fetch_sec"], "Лента: время HTTP-запросов", **labels)
+            put("feed_parse_seconds", rec["parse_sec"], "Лента: время разбора", **labels)
+            put("feed_bytes", rec["bytes"], "Лента: байт получено", **labels)
+            put("feed_http_status", rec["status"], "Лента: статус последнего HTTP-ответа", **labels)
+            put("feed_entries_seen", rec["seen"], "Лента: записей разобрано", **labels)
+            put("feed_entries_added", rec["added"], "Лента: новых записей в каталоге", **labels)
+            put("feed_error", int("error" in rec), "Лента: 1 — ошибка", **labels)
+
+        for rec in by_kind.get("worker", []):
+            put("worker_rows", rec["rows"], "Процесс: строк прочитано", worker=rec["worker"])
+            put("worker_seconds", rec["sec"], "Процесс: время работы над кусками", worker=rec["worker"])
+            put("worker_rows_per_second", rec["rows_per_sec"], "Процесс: строк в секунду", worker=rec["worker"])
+
+        routes: dict[tuple[str, str], list[float]] = {}
+        for rec in by_kind.get("tg_path", []):
+            agg = routes.setdefault((rec["path"], rec["outcome"]), [0, 0.0])
+            agg[0] += 1
+            agg[1] += rec["sec"]
+        for (route, outcome), (n, sec) in sorted(routes.items()):
+            put("tg_path_attempts", n, "Telegram: попыток по пути и исходу", path=route, outcome=outcome)
+            put("tg_path_seconds", sec, "Telegram: время попыток по пути и исходу", path=route, outcome=outcome)
+        for rec in by_kind.get("tg_health", []):
+            put("tg_path_channels_paused", rec["open"], "Telegram: каналов с разомкнутым путём", path=rec["path"])
+            put("tg_path_paused", int(rec["global_open"]), "Telegram: 1 — путь разомкнут для всех каналов",
+                path=rec["path"])
+
+        for rec in by_kind.get("sketch", []):
+            put("sketch_counters", rec["counters"], "Space-Saving: занято счётчиков", kind=rec["table"])
+            put("sketch_error_bound", rec["bound"], "Space-Saving: потолок веса вне таблицы", kind=rec["table"])
+            if "max_error" in rec:
+                put("sketch_max_error", rec["max_error"], "Space-Saving: макс. занижение в ТОПе против точного",
+                    kind=rec["table"])
+
+        hosts: dict[tuple[str, str], list[float]] = {}
+        for rec in by_kind.get("http", []):
+            agg = hosts.setdefault((rec["host"], str(rec["status"])), [0, 0.0, 0])
+            agg[0] += 1
+            agg[1] += rec["sec"]
+            agg[2] += rec["bytes"]
+        for (host, status), (n, sec, nbytes) in sorted(hosts.items()):
+            put("http_requests", n, "HTTP-запросов за прогон", host=host, status=status)
+            put("http_seconds", sec, "Суммарное время HTTP-запросов", host=host, status=status)
+            put("http_bytes", nbytes, "Байт получено по HTTP", host=host, status=status)
+
+        for kind, name, help_ in (("http_retry", "http_retries", "HTTP-повторов за прогон"),
+                                  ("http_skip", "http_skipped", "HTTP-запросов не начато: дедлайн прогона")):
+            counts: dict[str, int] = {}
+            for rec in by_kind.get(kind, []):
+                counts[rec["host"]] = counts.get(rec["host"], 0) + 1
+            for host, n in sorted(counts.items()):
+                put(name, n, help_, host=host)
+
+        tmp = path.with_suffix(".prom.tmp")
+        lines = [line for family in families.values() for line in family]
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def prom_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+RUN = Run("unknown")
+
+
+def start(script: str) -> Run:
+    global RUN
+    RUN = Run(script)
+    return RUN
+
+def stage(name: str, **fields):
+    return RUN.stage(name, **fields)
+
+def feed(typ: str, url: str):
+    return RUN.feed(typ, url)
+
+def feed_record(url: str) -> dict:
+    """Запись ленты по url (создаётся в feed()); пустой dict, если ленты не было."""
+    return RUN.feeds.get(url, {})
+
+def current_feed() -> dict | None:
+    return RUN.current_feed()
+
+def note(**fields) -> None:
+    RUN.note(**fields)
+
+def http(url: str, status: int, sec: float, nbytes: int) -> None:
+    RUN.http(url, status, sec, nbytes)
+
+def timer(field: str):
+    return RUN.timer(field)
+
+def event(kind: str, **fields) -> dict:
+    return RUN.event(kind, **fields)
+
+def finish(ok: bool = True) -> None:
+    RUN.finish(ok)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+ngram_np.py
+Подсчёт слов и n-грамм для trends.py на NumPy (необязательная зависимость).
+
+Токены один раз получают целые id (словарь растёт вместе с TokenEngine.vocab),
+строки окна склеиваются в один массив id, биграммы и триграммы упаковываются
+в int64-ключи a·V² + b·V + c и считаются через np.unique / np.bincount.
+Фильтр «железа» — по флагам токенов, как в TokenEngine.count.
+
+Два режима:
+  • count_rows(rows) — те же невзвешенные счётчики {source: {kind: Counter}}, что
+    trends.count_rows: дневные шарды взаимозаменяемы с Python-путём;
+  • top(rows_by_weight, ...) — всё окно без шардов: счёт в id-пространстве, строки
+    собираются только для кандидатов в ТОП, их вес пересчитывается через fsum —
+    рейтинг совпадает с trends.rank(merge_counts(...)) один в один.
+"""
+
+import collections
+import heapq
+import math
+
+import numpy as np
+
+# упаковка триграммы в int64 требует V³ < 2⁶³
+MAX_VOCAB = 1 << 21
+
+
+class VectorCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.raw_ids: dict[str, int] = {}   # «сырой» токен -> id или -1 (шум)
+        self.tokens: list[str] = []
+        self.ids: dict[str, int] = {}
+        self._gear: list[bool] = []
+        self._gram_gear: list[bool] = []
+
+    # --- словарь ---
+    def _id_of(self, raw: str) -> int:
+        info = self.engine.vocab[raw] if raw in self.engine.vocab else self.engine._classify(raw)
+        if info is None:
+            tid = -1
+        else:
+            t, gear, gram_gear = info
+            tid = self.ids.get(t)
+            if tid is None:
+                tid = self.ids[t] = len(self.tokens)
+                self.tokens.append(t)
+                self._gear.append(gear)
+                self._gram_gear.append(gram_gear)
+        self.raw_ids[raw] = tid
+        return tid
+
+    def encode(self, text: str) -> list[int]:
+        raw_ids = self.raw_ids
+        out = []
+        for raw in self.engine.raw_tokens(text):
+            tid = raw_ids[raw] if raw in raw_ids else self._id_of(raw)
+            if tid >= 0:
+                out.append(tid)
+        return out
+
+    # --- подсчёт ---
+    def _arrays(self, texts):
+        """Все id подряд и маска «позиция i и i+1 из одной строки»."""
+        flat: list[int] = []
+        ends: list[int] = []
+        for text in texts:
+            flat.extend(self.encode(text))
+            ends.append(len(flat))
+        tok = np.fromiter(flat, dtype=np.int64, count=len(flat))
+        same = np.ones(max(len(flat) - 1, 0), dtype=bool)
+        cut = np.asarray(ends[:-1], dtype=np.int64) - 1
+        cut = cut[(cut >= 0) & (cut < len(same))]
+        same[cut] = False
+        return tok, same
+
+    def count_arrays(self, tok, same):
+        """
+        По массивам из _arrays: (слова: счёт по id, (ключи биграмм, счёт), (ключи триграмм, счёт)).
+        Ключи уникальны и отсортированы; упакованы при текущем размере словаря V —
+        поэтому сначала кодируются все тексты, потом считается.
+        Словарь не меньше MAX_VOCAB — OverflowError (trends.vector_overflow: дальше Python-путь).
+        """
+        V = len(self.tokens)
+        if V >= MAX_VOCAB:
+            raise OverflowError(f"vocabulary too large for int64 trigram keys: {V}")
+        gear = np.asarray(self._gear, dtype=bool)
+        free = ~np.asarray(self._gram_gear, dtype=bool)
+
+        words = np.bincount(tok[~gear[tok]], minlength=V) if V else np.zeros(0, dtype=np.int64)
+
+        ok = free[tok] if len(tok) else np.zeros(0, dtype=bool)
+        bi_ok = same & ok[:-1] & ok[1:] if len(tok) > 1 else np.zeros(0, dtype=bool)
+        bi_keys = tok[:-1][bi_ok] * V + tok[1:][bi_ok]
+        tri_ok = bi_ok[:-1] & bi_ok[1:] if len(bi_ok) > 1 else np.zeros(0, dtype=bool)
+        tri_keys = (tok[:-2][tri_ok] * V + tok[1:-1][tri_ok]) * V + tok[2:][tri_ok]
+        return words, np.unique(bi_keys, return_counts=True), np.unique(tri_keys, return_counts=True)
+
+    # --- строки ---
+    def decode(self, key: int, n: int) -> str:
+        V = len(self.tokens)
+        parts = []
+        for _ in range(n):
+            key, i = divmod(key, V)
+            parts.append(self.tokens[i])
+        return " ".join(reversed(parts))
+
+    def _counters(self, words, bi, tri) -> dict:
+        nz = np.flatnonzero(words)
+        tokens = self.tokens
+        return {
+            "words": collections.Counter(dict(zip((tokens[i] for i in nz.tolist()), words[nz].tolist()))),
+            "bi": collections.Counter({self.decode(k, 2): n for k, n in zip(bi[0].tolist(), bi[1].tolist())}),
+            "tri": collections.Counter({self.decode(k, 3): n for k, n in zip(tri[0].tolist(), tri[1].tolist())}),
+        }
+
+    def count_rows(self, rows) -> dict:
+        """Как trends.count_rows: {source: {"words"|"bi"|"tri": Counter}}, целые счёты."""
+        by_src: dict[str, list[str]] = {}
+        for row in rows:
+            by_src.setdefault(row.get("source") or "", []).append(
+                (row.get("title") or "") + " " + (row.get("summary") or ""))
+        arrays = {src: self._arrays(texts) for src, texts in by_src.items()}
+        return {src: self._counters(*self.count_arrays(*arr)) for src, arr in arrays.items()}
+
+    def top(self, texts_by_weight: dict, n_words: int, n_bi: int, n_tri: int):
+        """
+        ТОП по взвешенной сумме без шардов: {вес: [тексты]} -> три списка (грамма, вес),
+        как trends.rank(merge_counts(...)). Строки собираются только для кандидатов.
+        """
+        arrays = [(w, self._arrays(texts)) for w, texts in sorted(texts_by_weight.items())]
+        per_weight = [(w, self.count_arrays(*arr)) for w, arr in arrays]
+        V = len(self.tokens)
+
+        # слова: счёт по id для каждого веса
+        word_tables = []
+        for w, (words, _, _) in per_weight:
+            table = np.zeros(V, dtype=np.int64)
+            table[:len(words)] = words
+            word_tables.append((w, np.arange(V, dtype=np.int64), table))
+        out = [self._top(word_tables, n_words, lambda k: self.tokens[k])]
+        for pos, n, size in ((1, n_bi, 2), (2, n_tri, 3)):
+            tables = [(w, arrs[pos][0], arrs[pos][1]) for w, arrs in per_weight]
+            out.append(self._top(tables, n, lambda k, size=size: self.decode(k, size)))
+        return tuple(out)
+
+    @staticmethod
+    def _top(tables, n: int, decode):
+        """tables — [(вес, ключи, счёт)]; точный ТОП-n с тем же порядком, что trends.rank."""
+        if not tables or n <= 0:
+            return []
+        keys = np.concatenate([k for _, k, _ in tables])
+        if not len(keys):
+            return []
+        counts = np.concatenate([c for _, _, c in tables]).astype(np.float64)
+        approx = np.concatenate([w * c.astype(np.float64) for w, _, c in tables])
+        uniq, inv = np.unique(keys, return_inverse=True)
+        score = np.bincount(inv, weights=approx, minlength=len(uniq))
+        seen = np.bincount(inv, weights=counts, minlength=len(uniq)) > 0
+        uniq, score = uniq[seen], score[seen]
+        if not len(uniq):
+            return []
+        # граница ТОПа по приближённой сумме с запасом на погрешность округления
+        k = min(n, len(score))
+        bound = np.partition(score, len(score) - k)[len(score) - k]
+        pick = score >= bound - abs(bound) * 1e-9 - 1e-12
+        cand = uniq[pick]
+
+        exact = {}
+        for key in cand.tolist():
+            terms = []
+            for w, ks, cs in tables:
+                i = np.searchsorted(ks, key)
+                if i < len(ks) and ks[i] == key and cs[i]:
+                    terms.append(w * int(cs[i]))
+            exact[decode(key)] = math.fsum(terms)
+        return heapq.nsmallest(n, exact.items(), key=lambda kv: (-kv[1], kv[0]))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+pathhealth.py
+Здоровье путей загрузки Telegram-каналов (RSS-прокси, t.me/s, зеркало r.jina.ai)
+между запусками: по каждой паре канал/путь — счётчики исходов, задержка (EWMA),
+доля успехов (EWMA), последний успех и последняя ошибка. Хранится через StateStore
+в data/tg_health.json под ключами "<канал>:<путь>"; "*:<путь>" — путь целиком.
+
+Маршрут канала (route): сначала путь, который сработал последним, остальные — по
+порядку по умолчанию. Путь, упавший TG_BREAKER_FAILS раз подряд, «размыкается»
+на TG_BACKOFF_BASE·2^k секунд (не больше TG_BACKOFF_MAX); после паузы одна попытка
+(проба) решает, вернуть его или удвоить паузу. Путь приоритетнее текущего, к которому
+не обращались TG_PROBE_EVERY секунд, пробуется первым — так канал возвращается на
+RSS-прокси, когда тот оживает. Если путь подряд падает у TG_GLOBAL_FAILS каналов
+(прокси лёг целиком), он размыкается для всех — остальные каналы не ждут таймаутов.
+"""
+
+import os
+import pathlib
+import threading
+import time
+
+from httpstate import StateStore
+
+BREAKER_FAILS = int(os.environ.get("TG_BREAKER_FAILS", "2"))
+GLOBAL_FAILS = int(os.environ.get("TG_GLOBAL_FAILS", "5"))
+BACKOFF_BASE = float(os.environ.get("TG_BACKOFF_BASE", "3600"))
+BACKOFF_MAX = float(os.environ.get("TG_BACKOFF_MAX", "86400"))
+PROBE_EVERY = float(os.environ.get("TG_PROBE_EVERY", str(6 * 3600)))
+EWMA = 0.3
+
+# исходы попытки: ok, not_modified (успех), empty, error (неудача)
+GOOD = {"ok", "not_modified"}
+ALL = "*"
+
+
+def backoff(streak: int, fails: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, streak - fails))
+
+
+class PathHealth:
+    def __init__(self, path: pathlib.Path, paths: tuple[str, ...]):
+        self.store = StateStore(path)
+        self.paths = paths
+        self._lock = threading.Lock()
+        self._probing: set[str] = set()   # ключи, по которым сейчас идёт проба
+
+    @staticmethod
+    def key(channel: str, path: str) -> str:
+        return f"{channel}:{path}"
+
+    def get(self, channel: str, path: str) -> dict:
+        return self.store.get(self.key(channel, path))
+
+    # --- маршрут ---
+    def _state(self, key: str, now: float) -> str:
+        """closed — можно; open — пауза; half_open — пауза прошла, нужна одна проба."""
+        until = self.store.get(key).get("open_until")
+        if not until:
+            return "closed"
+        return "open" if now < until else "half_open"
+
+    def allowed(self, channel: str, path: str, now: float | None = None) -> bool:
+        """Можно ли сейчас идти этим путём; проба после паузы занимается здесь же."""
+        now = time.time() if now is None else now
+        with self._lock:
+            states = {key: self._state(key, now) for key in (self.key(ALL, path), self.key(channel, path))}
+            if "open" in states.values():
+                return False
+            probes = [key for key, state in states.items() if state == "half_open"]
+            if any(key in self._probing for key in probes):
+                return False
+            self._probing.update(probes)
+            return True
+
+    def release(self, channel: str, path: str) -> None:
+        """Проба, занятая allowed(), не состоялась (дедлайн прогона) — без записи исхода."""
+        with self._lock:
+            self._probing.difference_update((self.key(ALL, path), self.key(channel, path)))
+
+    def paused(self, channel: str, path: str, now: float | None = None) -> bool:
+        """Путь на паузе или ждёт пробы — для вспомогательных запросов (без занятия пробы)."""
+        now = time.time() if now is None else now
+        return any(self._state(key, now) != "closed" for key in (self.key(ALL, path), self.key(channel, path)))
+
+    def route(self, channel: str, now: float | None = None) -> list[str]:
+        """Порядок путей для канала (без учёта разомкнутых — их отсеивает allowed())."""
+        now = time.time() if now is None else now
+        entries = {p: self.get(channel, p) for p in self.paths}
+        worked = [p for p in self.paths if entries[p].get("last_ok_ts")]
+        if not worked:
+            return list(self.paths)
+        best = max(worked, key=lambda p: entries[p]["last_ok_ts"])
+        order = [best] + [p for p in self.paths if p != best]
+        # пробы: пути приоритетнее best, которые давно не пробовали, идут первыми
+        ahead = self.paths[:self.paths.index(best)]
+        probes = [p for p in ahead if now - entries[p].get("last_try_ts", 0) >= PROBE_EVERY]
+        return probes + [p for p in order if p not in probes]
+
+    # --- исходы ---
+    def record(self, channel: str, path: str, outcome: str, sec: float, error: str = "",
+               now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, fails in ((self.key(channel, path), BREAKER_FAILS), (self.key(ALL, path), GLOBAL_FAILS)):
+                self._probing.discard(key)
+                e = self.store.get(key)
+                good = outcome in GOOD
+                counts = dict(e.get("counts") or {})
+                counts[outcome] = counts.get(outcome, 0) + 1
+                fields = {
+                    "counts": counts,
+                    "last_try_ts": round(now),
+                    "latency": round(sec if "latency" not in e else e["latency"] + EWMA * (sec - e["latency"]), 3),
+                    "success": round(float(good) if "success" not in e else e["success"] + EWMA * (good - e["success"]), 3),
+                }
+                if good:
+                    fields.update(last_ok_ts=round(now), streak=0, open_until=None)
+                else:
+                    streak = e.get("streak", 0) + 1
+                    fields.update(last_fail_ts=round(now), streak=streak,
+                                  last_error=(error or outcome)[:200])
+                    if streak >= fails:
+                        fields["open_until"] = round(now + backoff(streak, fails))
+                self.store.update(key, **fields)
+
+    def summary(self, now: float | None = None) -> dict[str, dict]:
+        """По каждому пути: каналов всего, разомкнутых, и разомкнут ли путь целиком."""
+        now = time.time() if now is None else now
+        out = {p: {"channels": 0, "open": 0, "global_open": False} for p in self.paths}
+        for key in self.store.keys():
+            channel, _, path = key.rpartition(":")
+            if path not in out:
+                continue
+            is_open = self._state(key, now) == "open"
+            if channel == ALL:
+                out[path]["global_open"] = is_open
+            else:
+                out[path]["channels"] += 1
+                out[path]["open"] += int(is_open)
+        return out
+
+    def save(self) -> None:
+        self.store.save()
@@ -1,4 +1,7 @@
-import os, sys, re, requests
+import os, sys, re
+
+import http_client
+import metrics
 
 TOKEN = os.environ.get("TELEGRAM_TOKEN")
 CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
@@ -28,10 +31,13 @@ def send(msg):
         print("No TELEGRAM_TOKEN/CHAT_ID provided; skip")
         return
     url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    r = requests.post(url, json={"chat_id": CHAT_ID, "text": msg, "disable_web_page_preview": True})
+    # повтор только на 429 и таймаут соединения — сообщение не уйдёт дважды;
+    # в метрики — без токена бота в URL
+    r = http_client.post(url, json={"chat_id": CHAT_ID, "text": msg, "disable_web_page_preview": True},
+                         timeout=30, log_url="https://api.telegram.org/sendMessage")
     print("Telegram status:", r.status_code, r.text[:200])
 
-def main():
+def post():
     if len(sys.argv) < 2:
         print("No files provided")
         return
@@ -44,7 +50,19 @@ def main():
         title = parse_title(p)
         url = path_to_url(p.replace("docs/",""))
         lines.append(f"• {title}\n{url}")
-    send("\n\n".join(lines))
+    with metrics.stage("telegram.send") as st:
+        send("\n\n".join(lines))
+        st["items"] = len(lines) - 1
+
+def main():
+    metrics.start("post_telegram")
+    http_client.start()   # дедлайн сетевой части прогона (RUN_DEADLINE)
+    ok = False
+    try:
+        post()
+        ok = True
+    finally:
+        metrics.finish(ok)
 
 if __name__ == "__main__":
     main()
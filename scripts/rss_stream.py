@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+rss_stream.py
+Потоковый разбор RSS/Atom для collector: ленты отдают записи от новых к старым,
+поэтому тело читается lxml.etree.iterparse по одной записи, и разбор останавливается,
+как только STOP_AFTER записей подряд оказались известными (uid уже встречался у этой
+ленты или дата старше сохранённой водяной метки — самой новой даты прошлого разбора).
+Известные записи сразу удаляются из недостроенного дерева; оставшийся документ —
+заголовок ленты и только новые записи — сериализуется и отдаётся feedparser, так что
+нормализация полей (ссылки, даты, санитайзинг HTML) та же, что и при полном разборе,
+а время и память зависят от числа новых записей, а не от размера ленты.
+
+Битый XML (неизвестные сущности, обрезанное тело), не RSS/Atom или расхождение
+кодировки в HTTP-заголовке и XML-декларации — (None, "fallback"): лента разбирается
+feedparser целиком, как раньше.
+
+  doc, status, new, known = rss_stream.trim(body, lambda link, dt: ..., r.headers.get("Content-Type", ""))
+"""
+
+import datetime
+import email.utils
+import io
+import os
+import re
+
+from lxml import etree
+
+STOP_AFTER = int(os.environ.get("RSS_STOP_AFTER", "3"))   # известных записей подряд до остановки
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+RSS1 = "{http://purl.org/rss/1.0/}"
+DC_DATE = "{http://purl.org/dc/elements/1.1/}date"
+ROOTS = {"rss", "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF", ATOM + "feed"}
+ITEMS = {"item", RSS1 + "item", ATOM + "entry"}
+# теги даты записи по убыванию приоритета (как published_parsed / updated_parsed у feedparser)
+DATES = ("pubDate", ATOM + "published", DC_DATE, ATOM + "updated", RSS1 + "date")
+
+RE_XML_ENCODING = re.compile(rb"""^\s*<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z0-9._-]+)""")
+RE_CHARSET = re.compile(r"""charset\s*=\s*["']?([A-Za-z0-9._-]+)""", re.I)
+
+
+def to_utc(dt: datetime.datetime) -> datetime.datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc)
+
+
+def parse_date(s: str | None) -> datetime.datetime | None:
+    """RFC 822 (pubDate) или ISO 8601 (Atom, dc:date); не разобрали — None."""
+    s = (s or "").strip()
+    if not s:
+        return None
+    try:
+        return to_utc(datetime.datetime.fromisoformat(s))
+    except ValueError:
+        pass
+    try:
+        return to_utc(email.utils.parsedate_to_datetime(s))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def entry_link(el) -> str:
+    """Ссылка записи: Atom — alternate-ссылка, RSS — <link>, иначе guid-permalink."""
+    if el.tag == ATOM + "entry":
+        for link in el.iterchildren(ATOM + "link"):
+            if link.get("rel", "alternate") == "alternate" and link.get("href"):
+                return link.get("href").strip()
+        return ""
+    link = el.findtext("link") if el.tag == "item" else el.findtext(RSS1 + "link")
+    if link and link.strip():
+        return link.strip()
+    guid = el.find("guid")
+    if guid is not None and guid.get("isPermaLink", "true") != "false" and guid.text:
+        return guid.text.strip()
+    return ""
+
+
+def entry_date(el) -> datetime.datetime | None:
+    for tag in DATES:
+        dt = parse_date(el.findtext(tag))
+        if dt is not None:
+            return dt
+    return None
+
+
+def encoding_conflict(body: bytes, content_type: str) -> bool:
+    """Кодировка из Content-Type не та, что в XML-декларации (по умолчанию UTF-8)."""
+    m = RE_CHARSET.search(content_type or "")
+    if not m:
+        return False
+    charset = m.group(1)
+    m = RE_XML_ENCODING.match(body[:200])
+    declared = m.group(1).decode("ascii") if m else "utf-8"
+    return declared.lower().replace("_", "-") != charset.lower().replace("_", "-")
+
+
+def trim(body: bytes, known, content_type: str = "", stop_after: int = STOP_AFTER):
+    """
+    known(link, dt) -> bool — запись уже видели. Возвращает (doc, status, new, known_n):
+      early    — остановились на известных, doc — документ только с новыми записями;
+      trimmed  — дошли до конца, известные вырезаны;
+      full     — известных нет, doc=None: тело отдаётся feedparser как есть;
+      fallback — не разобрали потоково, doc=None.
+    """
+    if encoding_conflict(body, content_type):
+        return None, "fallback", 0, 0
+    ctx = etree.iterparse(io.BytesIO(body), events=("end",), resolve_entities=False,
+                          no_network=True, huge_tree=True)
+    root = None
+    new = dropped = streak = 0
+    stopped = False
+    try:
+        for _, el in ctx:
+            if el.tag not in ITEMS:
+                continue
+            if root is None:
+                root = el.getroottree().getroot()
+                if root.tag not in ROOTS:
+                    return None, "fallback", 0, 0
+            link = entry_link(el)
+            if link and known(link, entry_date(el)):
+                parent = el.getparent()
+                dropped += 1
+                streak += 1
+                if streak >= stop_after:
+                    # парсер читает кусками: записи за этой уже могут быть в дереве
+                    for tail in list(el.itersiblings()):
+                        parent.remove(tail)
+                    parent.remove(el)
+                    stopped = True
+                    break
+                parent.remove(el)
+            else:
+                new += 1
+                streak = 0
+    except etree.XMLSyntaxError:
+        return None, "fallback", 0, 0
+    if root is None:
+        # записей нет вовсе (или не лента) — пусть решает feedparser
+        return None, "fallback", 0, 0
+    if not dropped:
+        return None, "full", new, 0
+    doc = etree.tostring(root, encoding="utf-8", xml_declaration=True)
+    return doc, "early" if stopped else "trimmed", new, dropped
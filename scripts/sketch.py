@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+sketch.py
+Ограниченные по памяти счётчики «тяжёлых» элементов для trends.py (TRENDS_SCORING=decay).
+
+SpaceSaving — взвешенный Space-Saving (Metwally и др.): не больше k счётчиков на любой
+словарь. Новый элемент при заполненной таблице вытесняет минимальный счётчик и наследует
+его значение как погрешность. Для отслеживаемого элемента истинный вес лежит в
+[count - error, count]; для неотслеживаемого — не больше min_count() (а тот ≤ total/k).
+
+ForwardDecay — экспоненциальное затухание «вперёд» (Cormode и др.): вклад строки со
+временем t хранится как w·2^((t - L)/H) от опорной точки L, на момент now делится на
+2^((now - L)/H). Старые счётчики не пересчитываются при каждом добавлении; когда опорная
+точка отстаёт больше чем на REBASE_HALF_LIVES полураспадов, все счётчики масштабируются разом.
+"""
+
+import heapq
+import math
+
+
+class SpaceSaving:
+    def __init__(self, k: int):
+        self.k = max(1, k)
+        self.counts: dict[str, float] = {}
+        self.errors: dict[str, float] = {}
+        self.total = 0.0
+        self._heap: list[tuple[float, str]] = []   # (count, item); устаревшие записи отсеиваются лениво
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, item: str, w: float) -> None:
+        if w <= 0:
+            return
+        self.total += w
+        c = self.counts.get(item)
+        if c is None:
+            if len(self.counts) < self.k:
+                c, err = 0.0, 0.0
+            else:
+                c, victim = self._pop_min()
+                del self.counts[victim], self.errors[victim]
+                err = c
+            self.errors[item] = err
+        c += w
+        self.counts[item] = c
+        heapq.heappush(self._heap, (c, item))
+        if len(self._heap) > 4 * self.k + 64:
+            self._rebuild()
+
+    def _pop_min(self) -> tuple[float, str]:
+        while True:
+            c, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == c:
+                return c, item
+
+    def _rebuild(self) -> None:
+        self._heap = [(c, item) for item, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def min_count(self) -> float:
+        """Потолок веса любого неотслеживаемого элемента: 0, пока таблица не заполнена."""
+        if len(self.counts) < self.k:
+            return 0.0
+        while True:
+            c, item = self._heap[0]
+            if self.counts.get(item) == c:
+                return c
+            heapq.heappop(self._heap)
+
+    def scale(self, f: float) -> None:
+        for item in self.counts:
+            self.counts[item] *= f
+            self.errors[item] *= f
+        self.total *= f
+        self._rebuild()
+
+    def top(self, n: int) -> list[tuple[str, float, float]]:
+        """
+        ТОП-n по гарантированному весу count - error: (элемент, гарантированный вес, погрешность).
+        Элемент, только что вытеснивший минимум, наверх не попадает; при равенстве — по алфавиту.
+        """
+        errors = self.errors
+        best = heapq.nsmallest(n, self.counts.items(), key=lambda kv: (errors[kv[0]] - kv[1], kv[0]))
+        return [(item, c - errors[item], errors[item]) for item, c in best]
+
+    # --- сохранение ---
+    def to_state(self) -> dict:
+        return {"k": self.k, "total": self.total,
+                "items": [[item, c, self.errors[item]] for item, c in self.counts.items()]}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SpaceSaving":
+        ss = cls(state["k"])
+        ss.total = state["total"]
+        for item, c, err in state["items"]:
+            ss.counts[item] = c
+            ss.errors[item] = err
+        ss._rebuild()
+        return ss
+
+
+class ForwardDecay:
+    REBASE_HALF_LIVES = 32
+
+    def __init__(self, half_life: float, landmark: float):
+        self.half_life = half_life
+        self.landmark = landmark
+
+    def weight(self, ts: float) -> float:
+        """Множитель строки со временем ts относительно опорной точки."""
+        return math.pow(2.0, (ts - self.landmark) / self.half_life)
+
+    def at(self, now: float) -> float:
+        """Множитель, переводящий хранимые значения в веса на момент now."""
+        return math.pow(2.0, -(now - self.landmark) / self.half_life)
+
+    def advance(self, now: float, sketches) -> None:
+        """Переносит опорную точку к now, если она ушла далеко, — чтобы weight() не переполнялся."""
+        if now - self.landmark <= self.REBASE_HALF_LIVES * self.half_life:
+            return
+        f = self.at(now)
+        for sk in sketches:
+            sk.scale(f)
+        self.landmark = now
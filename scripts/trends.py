@@ -4,24 +4,52 @@
 Берём сигналы из data/catalog.csv за 7 дней (RSS + Telegram) и со страниц трендов
 (Getty/Adobe/Shutterstock/Pond5), чистим «мусор», занижаем вес «железных» новостей,
 подсчитываем биграммы/триграммы и сохраняем docs/trends/index.md.
+
+Счётчики по каталогу кэшируются по UTC-дням в data/cache/trends/ (TRENDS_SHARDS=0 — без кэша):
+отчёт за 7 дней — это слияние дневных шардов, заново токенизируются только изменившиеся дни.
+--workers N (TRENDS_WORKERS) — окно читается кусками по записям CSV в N процессах, частичные
+счётчики складываются; итог тот же, что у последовательного пути (для широких окон и бэкфилла).
+Отчёт собирается за один проход по 30 дням: строки раскладываются по корзинам (день; дни на
+границах окон 1/7/30 — по частям), окна, рост 7 дней против 30, срезы по стокам и Telegram —
+слияния нужных корзин (report_views).
+TRENDS_SCORING=decay (--scoring decay) — без окна: веса строк затухают с полураспадом
+TRENDS_HALF_LIFE_DAYS, граммы считаются в Space-Saving фиксированного размера (sketch.py),
+состояние дочитывает только новые строки; в отчёте — границы погрешности (--sketch-check —
+сверка с точным подсчётом).
+Страницы трендов качаются параллельно с ETag/Last-Modified; для неизменившейся страницы
+берутся сохранённые счётчики токенов (data/cache/vendor_pages.json).
 """
 
-import csv
+import os
 import re
+import time
+import argparse
 import html
+import json
+import math
+import heapq
+import hashlib
 import datetime
 import collections
 import pathlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Tuple
 
-import requests
-from bs4 import BeautifulSoup
+import html_extract
+import http_client
+import metrics
+from catalog import Cursor, is_duplicate, iter_range, open_catalog, parse_published
+from sketch import ForwardDecay, SpaceSaving
+from httpstate import StateStore, conditional_get
 
 
 # ---------- Пути ----------
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 CATALOG = ROOT / "data" / "catalog.csv"
 OUT_DIR = ROOT / "docs" / "trends"
+SHARDS_DIR = ROOT / "data" / "cache" / "trends"
+VENDOR_CACHE = ROOT / "data" / "cache" / "vendor_pages.json"
+SKETCH_STATE = ROOT / "data" / "cache" / "trends_sketch.json"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # ---------- Страницы с трендами (не RSS) ----------
@@ -110,14 +138,16 @@ ALLOWED_DOMAINS = [
 def fetch_text(url: str, timeout: int = 25) -> str:
     """Текст со страниц трендов: заголовки и абзацы."""
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
+        r = http_client.get(url, timeout=timeout)
         r.raise_for_status()
-        soup = BeautifulSoup(r.text, "lxml")
-        parts = [t.get_text(" ", strip=True) for t in soup.select("h1, h2, h3, p, li, a")]
-        return " ".join(parts)
+        return page_text(r.text)
     except Exception:
         return ""
 
+def page_text(markup: str) -> str:
+    """Текст h1-h3, p, li, a в порядке документа (html_extract: lxml + XPath)."""
+    return html_extract.page_text(markup)
+
 def is_noise_token(t: str) -> bool:
     if not t:
         return True
@@ -167,6 +197,94 @@ def gram_is_gear(gram: str) -> bool:
         return True
     return False
 
+# ---------- Быстрый токенайзер ----------
+# тег целиком или серия недопустимых символов (кроме «<», чтобы не съесть начало тега)
+RE_CLEAN = re.compile(r"<[^>]+>|[^a-zа-яё0-9\s\-:x<]+|<")
+GEAR_PARTS = {"lens", "mm", "camera"}
+
+class TokenEngine:
+    """
+    Тот же результат, что tokenize() + token_is_gear() / gram_is_gear(), но быстрее:
+      • html.unescape, lower и один regex-проход вместо двух;
+      • классификация каждого уникального «сырого» токена запоминается в словаре vocab:
+        (токен, «железный» сам по себе, «железный» в составе граммы) или None для шума;
+      • граммы фильтруются по флагам токенов — без split и регексов на каждую грамму.
+    """
+
+    def __init__(self):
+        self.vocab: dict = {}
+
+    def _classify(self, raw: str):
+        t = raw.strip("-")
+        if t not in KEEP_NUM and is_noise_token(t):
+            info = None
+        else:
+            gear = token_is_gear(t)
+            info = (t, gear, gear or t in GEAR_PARTS)
+        self.vocab[raw] = info
+        return info
+
+    def raw_tokens(self, text: str) -> List[str]:
+        return RE_CLEAN.sub(" ", html.unescape(text or "").lower()).split()
+
+    def infos(self, text: str) -> list:
+        vocab = self.vocab
+        out = []
+        for raw in self.raw_tokens(text):
+            info = vocab[raw] if raw in vocab else self._classify(raw)
+            if info is not None:
+                out.append(info)
+        return out
+
+    def tokenize(self, text: str) -> List[str]:
+        return [i[0] for i in self.infos(text)]
+
+    def tokenize_many(self, texts) -> List[List[str]]:
+        return [self.tokenize(t) for t in texts]
+
+    def count(self, text: str, words, bi, tri) -> None:
+        """Добавляет в счётчики слова и не-«железные» би-/триграммы текста (по 1 за вхождение)."""
+        infos = self.infos(text)
+        for t, gear, _ in infos:
+            if not gear:
+                words[t] += 1
+        n = len(infos)
+        for i in range(n - 1):
+            a, b = infos[i], infos[i + 1]
+            if a[2] or b[2]:
+                continue
+            bi[f"{a[0]} {b[0]}"] += 1
+        for i in range(n - 2):
+            a, b, c = infos[i], infos[i + 1], infos[i + 2]
+            if a[2] or b[2] or c[2]:
+                continue
+            tri[f"{a[0]} {b[0]} {c[0]}"] += 1
+
+    def count_many(self, texts, words, bi, tri) -> None:
+        for text in texts:
+            self.count(text, words, bi, tri)
+
+ENGINE = TokenEngine()
+
+# Подсчёт n-грамм: python — TokenEngine и Counter, numpy — целочисленный словарь
+# и векторный счёт (scripts/ngram_np.py), auto — numpy, если установлен.
+TRENDS_ENGINE = os.environ.get("TRENDS_ENGINE", "auto")
+VECTOR = None
+if TRENDS_ENGINE in ("auto", "numpy"):
+    try:
+        import ngram_np
+        VECTOR = ngram_np.VectorCounter(ENGINE)
+    except ImportError:
+        if TRENDS_ENGINE == "numpy":
+            print("WARN: TRENDS_ENGINE=numpy, but numpy is not installed; using python engine")
+ENGINE_NAME = "numpy" if VECTOR is not None else "python"   # в метриках этапа trends.count
+
+def vector_overflow(e: OverflowError) -> None:
+    """Словарь numpy-движка перерос int64-ключи триграмм: до конца процесса — Python-путь."""
+    global VECTOR, ENGINE_NAME
+    print(f"WARN: {e}; using python engine")
+    VECTOR, ENGINE_NAME = None, "python"
+
 def allowed_source(src: str) -> bool:
     s = (src or "").lower()
     return any(s.endswith(d) for d in ALLOWED_DOMAINS)
@@ -176,86 +294,572 @@ def weight_for_source(src: str) -> float:
     return DOMAIN_WEIGHTS.get(s, 1.0)
 
 # ---------- Агрегация по каталогу ----------
-def top_words_and_phrases(days: int = 7, topn_words: int = 30, topn_bi: int = 30, topn_tri: int = 20):
-    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
-    words = collections.Counter()
-    bi = collections.Counter()
-    tri = collections.Counter()
-
-    if not CATALOG.exists():
-        return [], [], []
+KINDS = ("words", "bi", "tri")
 
-    with open(CATALOG, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            src = row.get("source") or ""
-            if not allowed_source(src):
-                continue
-
-            dt_str = (row.get("published") or "").strip().replace("Z", "+00:00")
-            if not dt_str:
-                continue
-            try:
-                dt = datetime.datetime.fromisoformat(dt_str)
-            except Exception:
-                continue
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=datetime.timezone.utc)
-            if dt < cutoff:
-                continue
+def count_rows(rows) -> dict:
+    """
+    Невзвешенные счётчики по источникам: {source: {"words"|"bi"|"tri": Counter}}.
+    Веса доменов применяются только при слиянии (merge_counts).
+    """
+    if VECTOR is not None:
+        try:
+            return VECTOR.count_rows(rows)
+        except OverflowError as e:
+            vector_overflow(e)   # счётчики те же, шарды обоих путей взаимозаменяемы
+    return count_rows_py(rows)
+
+def count_rows_py(rows) -> dict:
+    out: dict = {}
+    for row in rows:
+        src = row.get("source") or ""
+        c = out.get(src)
+        if c is None:
+            c = out[src] = {k: collections.Counter() for k in KINDS}
+        txt = (row.get("title") or "") + " " + (row.get("summary") or "")
+        ENGINE.count(txt, c["words"], c["bi"], c["tri"])
+    return out
 
+def merge_counts(shards) -> Tuple[collections.Counter, collections.Counter, collections.Counter]:
+    """
+    Сливает счётчики {source: {kind: {gram: n}}}: целые счёты складываются по весу
+    источника, итог — fsum(w * n). Результат не зависит от порядка строк и шардов.
+    """
+    acc = {k: {} for k in KINDS}   # kind -> gram -> {weight: n}
+    for shard in shards:
+        for src, kinds in shard.items():
             w = weight_for_source(src)
-            txt = (row.get("title") or "") + " " + (row.get("summary") or "")
-            toks = tokenize(txt)
-            # слова
-            for t in toks:
-                if token_is_gear(t):
-                    continue
-                words[t] += w
-            # биграммы
-            for i in range(len(toks) - 1):
-                g = f"{toks[i]} {toks[i+1]}"
-                if gram_is_gear(g):
-                    continue
-                bi[g] += w
-            # триграммы
-            for i in range(len(toks) - 2):
-                g = f"{toks[i]} {toks[i+1]} {toks[i+2]}"
-                if gram_is_gear(g):
-                    continue
-                tri[g] += w
-
-    top_words = words.most_common(topn_words)
-    top_bi = bi.most_common(topn_bi)
-    top_tri = tri.most_common(topn_tri)
-    return top_words, top_bi, top_tri
+            for k in KINDS:
+                dst = acc[k]
+                for g, n in kinds[k].items():
+                    per = dst.get(g)
+                    if per is None:
+                        dst[g] = {w: n}
+                    else:
+                        per[w] = per.get(w, 0) + n
+    return tuple(
+        collections.Counter({g: math.fsum(w * n for w, n in per.items()) for g, per in acc[k].items()})
+        for k in KINDS
+    )
+
+def rank(counter, n: int) -> List[Tuple[str, float]]:
+    """
+    ТОП-n по убыванию веса, как Counter.most_common, но равные веса — по алфавиту, а не по
+    первому появлению: порядка строк нет ни у шардов, ни у numpy-движка (ngram_np._top тот же).
+    """
+    return heapq.nsmallest(n, counter.items(), key=lambda kv: (-kv[1], kv[0]))
+
+# ---------- Кэш дневных шардов ----------
+USE_SHARDS = os.environ.get("TRENDS_SHARDS", "1") != "0"
+TOKENIZER_VERSION = 1
+SHARD_KEEP_DAYS = 60
+
+def shard_signature() -> str:
+    """Отпечаток всего, от чего зависят невзвешенные счётчики: стоп-листы, регексы, токенайзер."""
+    spec = {
+        "tokenizer": TOKENIZER_VERSION,
+        "stop": sorted(STOP),
+        "brands": sorted(STOP_BRANDS),
+        "keep": sorted(KEEP_NUM),
+        "allowed": sorted(ALLOWED_DOMAINS),
+        "re": [RE_MM.pattern, RE_F.pattern, RE_WP.pattern, RE_URLISH.pattern],
+    }
+    return hashlib.sha1(json.dumps(spec, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def rows_digest(rows) -> str:
+    return uids_digest(r.get("uid") or "" for r in rows)
+
+def uids_digest(uids) -> str:
+    return hashlib.sha1("\n".join(sorted(uids)).encode("utf-8")).hexdigest()
+
+def day_counts(day: str, rows: list, signature: str, save: bool = True) -> dict:
+    """Счётчики за день из шарда, если тот собран по тем же строкам и правилам; иначе считаем."""
+    if not USE_SHARDS:
+        return count_rows(rows)
+    path = SHARDS_DIR / f"{day}.json"
+    digest = rows_digest(rows)
+    if path.exists():
+        try:
+            shard = json.loads(path.read_text(encoding="utf-8"))
+            if shard.get("signature") == signature and shard.get("digest") == digest:
+                return shard["counts"]
+        except Exception:
+            pass
+    counts = count_rows(rows)
+    if save:
+        save_shard(day, signature, digest, len(rows), counts)
+    return counts
+
+def save_shard(day: str, signature: str, digest: str, rows: int, counts: dict) -> None:
+    SHARDS_DIR.mkdir(parents=True, exist_ok=True)
+    path = SHARDS_DIR / f"{day}.json"
+    tmp = path.with_suffix(".tmp")
+    payload = {"signature": signature, "digest": digest, "rows": rows, "counts": counts}
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+def prune_shards(today: datetime.date) -> None:
+    if not SHARDS_DIR.exists():
+        return
+    oldest = (today - datetime.timedelta(days=SHARD_KEEP_DAYS)).isoformat()
+    for path in SHARDS_DIR.glob("*.json"):
+        if path.stem < oldest:
+            path.unlink()
+
+def window_cutoffs(now: datetime.datetime, windows) -> list[tuple[int, datetime.datetime]]:
+    """Границы окон [(дней, cutoff)] от узкого к широкому."""
+    return [(days, now - datetime.timedelta(days=days)) for days in sorted(set(windows))]
+
+def split_days(cutoffs) -> set[str]:
+    """UTC-дни, в которые попадает граница окна: такие дни неполные, делятся на части и не кэшируются."""
+    return {cutoff.date().isoformat() for _, cutoff in cutoffs}
+
+def window_bucket(row: dict, dt: datetime.datetime, cutoffs, split: set, per_day: bool = True):
+    """
+    Корзина строки: (UTC-день, 0) для целого дня внутри окон или (день, наименьшее окно
+    со строкой) для дня на границе окна. per_day=False — ("", наименьшее окно): без шардов
+    дни не нужны. None — строка вне самого широкого окна, не из списка источников или повтор.
+    """
+    tier = next((days for days, cutoff in cutoffs if dt >= cutoff), None)
+    if tier is None:
+        return None
+    day = window_day(row, dt)
+    if day is None:
+        return None
+    if not per_day:
+        return "", tier
+    return day, tier if day in split else 0
+
+def in_window(key: tuple[str, int], days: int, cutoff: datetime.datetime) -> bool:
+    day, tier = key
+    return tier <= days if tier else day > cutoff.date().isoformat()
+
+def window_buckets(cat, cutoffs, per_day: bool = True) -> dict:
+    """
+    Строки самого широкого окна по корзинам window_bucket — один проход по каталогу.
+    Повторы сюжетов (is_duplicate) не учитываются: каждый кластер считается один раз.
+    """
+    split = split_days(cutoffs)
+    buckets = collections.defaultdict(list)
+    for row in cat.window(cutoffs[-1][1]):
+        key = window_bucket(row, parse_published(row.get("published")), cutoffs, split, per_day)
+        if key:
+            buckets[key].append(row)
+    return buckets
+
+def window_day(row: dict, dt: datetime.datetime) -> str | None:
+    """UTC-день строки окна; None — источник не из списка или повтор сюжета."""
+    if not allowed_source(row.get("source") or ""):
+        return None
+    if is_duplicate(row):
+        return None
+    return dt.astimezone(datetime.timezone.utc).date().isoformat()
+
+# ---------- Параллельный режим ----------
+CHUNKS_PER_WORKER = 4   # кусков больше, чем процессов: медленный кусок не держит остальных
+
+def count_range(path: str, start: int, end: int, cutoffs: list, per_day: bool = True) -> dict:
+    """
+    Работа процесса: строки окон из куска [start, end) каталога -> невзвешенные
+    счётчики по корзинам (как window_buckets + day_counts) и uid корзины для отпечатка шарда.
+    cutoffs — [(дней, ISO-время границы)]; per_day=False — корзины без дней (шарды не пишутся).
+    """
+    t0 = time.perf_counter()
+    cutoffs = [(days, datetime.datetime.fromisoformat(since)) for days, since in cutoffs]
+    split = split_days(cutoffs)
+    buckets = collections.defaultdict(list)
+    n = 0
+    for row in iter_range(pathlib.Path(path), start, end):
+        n += 1
+        dt = parse_published(row.get("published"))
+        if dt is None:
+            continue
+        key = window_bucket(row, dt, cutoffs, split, per_day)
+        if key:
+            buckets[key].append(row)
+    return {
+        "counts": {key: count_rows(rows) for key, rows in buckets.items()},
+        "uids": {key: [r.get("uid") or "" for r in rows] for key, rows in buckets.items()},
+        "pid": os.getpid(), "rows": n, "bytes": end - start, "sec": time.perf_counter() - t0,
+    }
+
+def add_counts(dst: dict, src: dict) -> dict:
+    """Складывает счётчики {source: {kind: Counter}} из src в dst (целые, порядок не важен)."""
+    for source, kinds in src.items():
+        have = dst.get(source)
+        if have is None:
+            dst[source] = kinds
+            continue
+        for k in KINDS:
+            have[k].update(kinds[k])
+    return dst
+
+def count_parallel(ranges, cutoffs, workers: int, per_day: bool = True) -> dict:
+    """
+    {корзина: (счётчики, uid)} по кускам (файл, start, end) в workers процессах.
+    Печатает и пишет в метрики пропускную способность каждого процесса.
+    """
+    buckets: dict = {}
+    stats: dict = {}
+    bounds = [(days, cutoff.isoformat()) for days, cutoff in cutoffs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(count_range, str(path), a, b, bounds, per_day) for path, a, b in ranges]
+        for fut in futures:
+            res = fut.result()
+            for key, counts in res["counts"].items():
+                have = buckets.setdefault(key, ({}, []))
+                add_counts(have[0], counts)
+                have[1].extend(res["uids"][key])
+            st = stats.setdefault(res["pid"], {"chunks": 0, "rows": 0, "bytes": 0, "sec": 0.0})
+            st["chunks"] += 1
+            for key in ("rows", "bytes", "sec"):
+                st[key] += res[key]
+    for i, (pid, st) in enumerate(sorted(stats.items())):
+        rate = st["rows"] / st["sec"] if st["sec"] else 0.0
+        metrics.event("worker", worker=i, pid=pid, rows_per_sec=rate, **st)
+        print(f"worker {i}: {st['chunks']} chunk(s), {st['rows']} rows, {st['bytes'] / 1e6:.1f} MB "
+              f"in {st['sec']:.2f}s — {rate:.0f} rows/s, {st['bytes'] / 1e6 / st['sec'] if st['sec'] else 0:.1f} MB/s")
+    return buckets
+
+# ---------- Один проход — несколько окон и срезов ----------
+def aggregate(windows=(7,), workers: int = 1):
+    """
+    Один проход по самому широкому из окон: {корзина: счётчики {source: {kind: Counter}}}
+    и границы окон. Каждая строка читается и токенизируется один раз; окна и срезы по
+    источникам — слияние нужных корзин (view). Целые дни берутся из дневных шардов.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoffs = window_cutoffs(now, windows)
+
+    cat = open_catalog(CATALOG)
+    if not cat.path.exists():
+        cat.close()
+        return {}, cutoffs
+
+    signature = shard_signature()
+    if workers > 1:
+        # окно и подсчёт в процессах; шарды не читаются, но пишутся — следующий прогон их подхватит
+        ranges = cat.window_ranges(cutoffs[-1][1], workers * CHUNKS_PER_WORKER)
+        cat.close()
+        with metrics.stage("trends.count", workers=workers, chunks=len(ranges), engine=ENGINE_NAME) as st:
+            found = count_parallel(ranges, cutoffs, workers, per_day=USE_SHARDS)
+            st["rows"] = sum(len(uids) for _, uids in found.values())
+            st["pruned"] = getattr(cat, "pruned", 0)
+            if USE_SHARDS:
+                st["days"] = len({day for day, _ in found})
+                for (day, tier), (counts, uids) in found.items():
+                    if not tier:
+                        save_shard(day, signature, uids_digest(uids), len(uids), counts)
+                prune_shards(now.date())
+        return {key: counts for key, (counts, _) in found.items()}, cutoffs
+
+    with metrics.stage("trends.window") as st:
+        buckets = window_buckets(cat, cutoffs, per_day=USE_SHARDS)
+        cat.close()
+        st["rows"] = sum(len(rows) for rows in buckets.values())
+        st["pruned"] = getattr(cat, "pruned", 0)
+
+    with metrics.stage("trends.count", days=len({day for day, _ in buckets}), engine=ENGINE_NAME) as st:
+        # части дня на границе окна не кэшируем — шард всегда про целый день
+        counts = {key: day_counts(key[0], rows, signature) if not key[1] else count_rows(rows)
+                  for key, rows in sorted(buckets.items())}
+        st["engine"] = ENGINE_NAME   # мог смениться на python по ходу (vector_overflow)
+        if USE_SHARDS:
+            prune_shards(now.date())
+    return counts, cutoffs
+
+def view(buckets: dict, cutoffs, days: int, sources=None):
+    """Взвешенные (words, bi, tri) за окно days по корзинам aggregate(); sources — только эти источники."""
+    cutoff = dict(cutoffs)[days]
+    shards = (shard for key, shard in buckets.items() if in_window(key, days, cutoff))
+    if sources is not None:
+        shards = ({s: c for s, c in shard.items() if s in sources} for shard in shards)
+    return merge_counts(shards)
+
+def top_words_and_phrases(days: int = 7, topn_words: int = 30, topn_bi: int = 30, topn_tri: int = 20,
+                          workers: int = 1):
+    if VECTOR is not None and not USE_SHARDS and workers <= 1:
+        # без шардов всё окно считается в id-пространстве, строки — только для ТОПа
+        try:
+            return vector_top(days, topn_words, topn_bi, topn_tri)
+        except OverflowError as e:
+            vector_overflow(e)
+
+    buckets, cutoffs = aggregate((days,), workers)
+    with metrics.stage("trends.merge") as st:
+        words, bi, tri = view(buckets, cutoffs, days)
+        st["items"] = len(words) + len(bi) + len(tri)
+    return rank(words, topn_words), rank(bi, topn_bi), rank(tri, topn_tri)
+
+def vector_top(days: int, topn_words: int, topn_bi: int, topn_tri: int):
+    cutoffs = window_cutoffs(datetime.datetime.now(datetime.timezone.utc), (days,))
+    cat = open_catalog(CATALOG)
+    if not cat.path.exists():
+        cat.close()
+        return [], [], []
+    with metrics.stage("trends.window") as st:
+        buckets = window_buckets(cat, cutoffs, per_day=False)
+        cat.close()
+        st["rows"] = sum(len(rows) for rows in buckets.values())
+        st["pruned"] = getattr(cat, "pruned", 0)
+    with metrics.stage("trends.count", engine="numpy"):
+        by_weight = collections.defaultdict(list)
+        for rows in buckets.values():
+            for row in rows:
+                by_weight[weight_for_source(row.get("source"))].append(
+                    (row.get("title") or "") + " " + (row.get("summary") or ""))
+        return VECTOR.top(by_weight, topn_words, topn_bi, topn_tri)
+
+# ---------- Срезы для отчёта ----------
+REPORT_DAYS = 7          # основной ТОП
+REPORT_WINDOWS = (1, 7, 30)
+RISING_MIN = float(os.environ.get("TRENDS_RISING_MIN", "3"))   # взвешенных упоминаний за 7 дней, меньше — шум
+
+def rising(recent: collections.Counter, wide: collections.Counter, recent_days: int, wide_days: int,
+           n: int) -> List[Tuple[str, float, float]]:
+    """
+    Фразы, растущие за recent_days против остатка окна wide_days: отношение частот в день.
+    К обоим весам прибавляется RISING_MIN — новые и редкие фразы не дают бесконечность
+    и не вытесняют заметные. [(фраза, во сколько раз, вес за recent)]
+    """
+    older_days = wide_days - recent_days
+    out = []
+    for g, c in recent.items():
+        if c < RISING_MIN:
+            continue
+        before = max(0.0, wide.get(g, 0.0) - c)
+        out.append((g, ((c + RISING_MIN) / recent_days) / ((before + RISING_MIN) / older_days), c))
+    return heapq.nsmallest(n, out, key=lambda t: (-t[1], t[0]))
+
+def site_of(source: str) -> str:
+    return source[4:] if source.startswith("www.") else source
+
+def report_views(workers: int = 1) -> dict:
+    """Всё для отчёта за один проход: ТОП за 7 дней, сутки, 30 дней, рост, по сайтам и Telegram."""
+    buckets, cutoffs = aggregate(REPORT_WINDOWS, workers)
+    with metrics.stage("trends.merge") as st:
+        week = view(buckets, cutoffs, REPORT_DAYS)
+        day = view(buckets, cutoffs, 1)
+        month = view(buckets, cutoffs, 30)
+        sources = {s for key, shard in buckets.items() if in_window(key, REPORT_DAYS, dict(cutoffs)[REPORT_DAYS])
+                   for s in shard}
+        sites = collections.defaultdict(set)
+        for s in sources:
+            if s != "t.me":
+                sites[site_of(s)].add(s)
+        per_site = {site: view(buckets, cutoffs, REPORT_DAYS, srcs)[1] for site, srcs in sorted(sites.items())}
+        telegram = view(buckets, cutoffs, REPORT_DAYS, {"t.me"})
+        st["items"] = sum(len(c) for c in week)
+    words, bi, tri = week
+    return {
+        "top": (rank(words, 30), rank(bi, 30), rank(tri, 20)),
+        "day": rank(day[1], 10),
+        "month": rank(month[1], 15),
+        "rising": rising(bi, month[1], REPORT_DAYS, 30, 15),
+        "sites": {site: rank(c, 5) for site, c in per_site.items() if c},
+        "telegram": (rank(telegram[1], 10), rank(telegram[0], 10)),
+    }
+
+# ---------- Затухающие веса в ограниченной памяти ----------
+# TRENDS_SCORING=decay: вместо окна в 7 дней — вес строки w·2^(-возраст/полураспад) в трёх
+# Space-Saving по TRENDS_SKETCH_K счётчиков (sketch.py). Состояние и курсор каталога хранятся
+# вместе в data/cache/trends_sketch.json; прогон дочитывает только новые строки.
+SCORING = os.environ.get("TRENDS_SCORING", "window")   # window | decay
+SKETCH_K = int(os.environ.get("TRENDS_SKETCH_K", "4096"))
+HALF_LIFE_DAYS = float(os.environ.get("TRENDS_HALF_LIFE_DAYS", "3"))
+
+def sketch_signature() -> str:
+    """Правила токенизации, веса доменов и параметры: при смене состояние собирается заново."""
+    spec = [shard_signature(), sorted(DOMAIN_WEIGHTS.items()), SKETCH_K, HALF_LIFE_DAYS]
+    return hashlib.sha1(json.dumps(spec).encode("utf-8")).hexdigest()
+
+def ingest(rows, sinks, decay: ForwardDecay, now_ts: float) -> int:
+    """Добавляет строки (источник из списка, не повтор сюжета) в sinks words/bi/tri; число строк."""
+    n = 0
+    for row in rows:
+        dt = parse_published(row.get("published"))
+        if dt is None or window_day(row, dt) is None:
+            continue
+        w = weight_for_source(row.get("source")) * decay.weight(min(dt.timestamp(), now_ts))
+        counts = [collections.Counter() for _ in KINDS]
+        ENGINE.count((row.get("title") or "") + " " + (row.get("summary") or ""), *counts)
+        for sink, c in zip(sinks, counts):
+            for g, k in c.items():
+                sink.add(g, w * k)
+        n += 1
+    return n
+
+class ExactSink(collections.Counter):
+    """Точные затухающие веса для сверки со Space-Saving (--sketch-check)."""
+    def add(self, item: str, w: float) -> None:
+        self[item] += w
+
+def decayed_top(topn_words: int = 30, topn_bi: int = 30, topn_tri: int = 20, check: bool = False):
+    """
+    ТОП по затухающим весам: три списка (грамма, вес, погрешность) и сводка по каждому
+    словарю — гарантированная граница ошибки, а с check — сверка с точным подсчётом.
+    """
+    now_ts = time.time()
+    cat = open_catalog(CATALOG)
+    cursor = Cursor(cat.path, SKETCH_STATE)
+    signature = sketch_signature()
+    state = cursor.store.get("sketch")
+    fresh = cursor.start == 0 and not cursor.segment
+    if state.get("signature") != signature or fresh:
+        cursor.segment, cursor.offset = "", 0
+        decay = ForwardDecay(HALF_LIFE_DAYS * 86400, now_ts)
+        sinks = [SpaceSaving(SKETCH_K) for _ in KINDS]
+    else:
+        decay = ForwardDecay(HALF_LIFE_DAYS * 86400, state["landmark"])
+        sinks = [SpaceSaving.from_state(state[k]) for k in KINDS]
+    decay.advance(now_ts, sinks)
+
+    with metrics.stage("trends.sketch", rebuilt=cursor.offset == 0) as st:
+        st["rows"] = ingest(cat.appended(cursor), sinks, decay, now_ts)
+        st["items"] = sum(len(sk) for sk in sinks)
+    cat.close()
+    cursor.store.update("sketch", signature=signature, landmark=decay.landmark,
+                        **{k: sk.to_state() for k, sk in zip(KINDS, sinks)})
+    cursor.save()
+
+    exact = None
+    if check:
+        with metrics.stage("trends.sketch_check") as st:
+            exact = [ExactSink() for _ in KINDS]
+            cat = open_catalog(CATALOG)
+            st["rows"] = ingest(cat.rows(), exact, decay, now_ts)
+            cat.close()
+
+    f = decay.at(now_ts)
+    tops, notes = [], {}
+    for i, (kind, sk, n) in enumerate(zip(KINDS, sinks, (topn_words, topn_bi, topn_tri))):
+        top = [(g, c * f, err * f) for g, c, err in sk.top(n)]
+        note = {"counters": len(sk), "k": sk.k, "bound": sk.min_count() * f, "total": sk.total * f}
+        if exact is not None:
+            truth = exact[i]
+            ref = {g for g, _ in rank(truth, n)}
+            note["top"] = len(top)
+            note["overlap"] = len(ref & {g for g, _, _ in top})
+            note["max_error"] = max((truth[g] * f - c for g, c, _ in top), default=0.0)
+            note["within"] = all(c * (1 - 1e-9) <= truth[g] * f <= (c + err) * (1 + 1e-9) for g, c, err in top)
+        metrics.event("sketch", table=kind, **note)
+        tops.append(top)
+        notes[kind] = note
+    return (*tops, notes)
 
 # ---------- Сигналы с официальных тренд-страниц ----------
-def signals_from_vendor_pages() -> List[Tuple[str, float]]:
-    bag = collections.Counter()
-    for url in TREND_PAGES:
-        txt = fetch_text(url)
-        if not txt:
+def page_tokens(url: str, state: StateStore, signature: str, timeout: int = 25) -> collections.Counter:
+    """
+    Счётчик не-«железных» токенов страницы. Условный GET: при 304 или том же теле
+    страница не парсится и не токенизируется — берём счётчик из state.
+    При сетевой ошибке — последний сохранённый счётчик, если он собран теми же правилами.
+    """
+    for _ in range(2):
+        entry = state.get(url)
+        fresh = entry.get("signature") == signature and "tokens" in entry
+        if not fresh:
+            # правила токенизации сменились — нужен полный ответ, без валидаторов
+            state.update(url, etag=None, last_modified=None, hash=None)
+        try:
+            r, body = conditional_get(url, state, timeout=timeout)
+        except Exception as e:
+            skipped = isinstance(e, http_client.DeadlineExceeded)   # дедлайн прогона — не ошибка страницы
+            print(f"{'Trend page skipped' if skipped else 'WARN: trend page failed'} {url}: {e}")
+            metrics.note(path="cached" if fresh else "skipped" if skipped else "failed", error=repr(e)[:200])
+            return collections.Counter(entry.get("tokens") or {}) if fresh else collections.Counter()
+        if body is None:
+            if fresh:
+                print(f"Trend page not modified: {url}")
+                metrics.note(path="not_modified")
+                return collections.Counter(entry["tokens"])
+            state.update(url, hash=None)
             continue
-        toks = tokenize(txt)
-        for t in toks:
-            if token_is_gear(t):
-                continue
-            bag[t] += 2.0  # немного повышаем вес
-    return bag.most_common(40)
+        with metrics.timer("parse_sec"):
+            counts = collections.Counter(t for t, gear, _ in ENGINE.infos(page_text(r.text)) if not gear)
+        metrics.note(path="fetched", seen=sum(counts.values()))
+        state.update(url, tokens=dict(counts), signature=signature)
+        print(f"Trend page fetched: {url} tokens={sum(counts.values())}")
+        return counts
+    return collections.Counter()
+
+def vendor_page(url: str, state: StateStore, signature: str) -> collections.Counter:
+    with metrics.feed("vendor", url):
+        return page_tokens(url, state, signature)
+
+def signals_from_vendor_pages(workers: int = 4) -> List[Tuple[str, float]]:
+    state = StateStore(VENDOR_CACHE)
+    signature = shard_signature()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pages = list(pool.map(lambda url: vendor_page(url, state, signature), TREND_PAGES))
+    state.save()
+
+    bag = collections.Counter()
+    for counts in pages:
+        for t, n in counts.items():
+            bag[t] += 2.0 * n  # немного повышаем вес
+    return rank(bag, 40)
 
 # ---------- Сборка страницы ----------
-def write_report() -> None:
+def write_report(workers: int = 1, scoring: str = SCORING, check: bool = False) -> None:
     today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
 
-    top_words, top_bi, top_tri = top_words_and_phrases()
-    kw_pages = signals_from_vendor_pages()
+    notes = views = None
+    if scoring == "decay":
+        top_words, top_bi, top_tri, notes = decayed_top(check=check)
+    else:
+        views = report_views(workers)
+        top_words, top_bi, top_tri = views["top"]
+    with metrics.stage("trends.vendor_pages", feeds=len(TREND_PAGES)):
+        kw_pages = signals_from_vendor_pages()
 
     def fmt(lst, limit=None):
         if limit is not None:
             lst = lst[:limit]
+        if notes is not None and lst and len(lst[0]) == 3:
+            # гарантированный вес Space-Saving и погрешность: истинный вес в [c, c + err]
+            return [f"- {k} — {c:.1f}" + (f" (+{err:.1f})" if err >= 0.05 else "") for k, c, err in lst]
         return [f"- {k} — {int(c) if isinstance(c,(int,float)) else c}" for k,c in lst]
 
+    def sections():
+        """Срезы того же прохода (только TRENDS_SCORING=window)."""
+        if views is None:
+            return []
+        out = ["## Растущие фразы (7 дней против 30)",
+               *[f"- {g} — ×{x:.1f} ({int(c)} за 7 дн.)" for g, x, c in views["rising"]],
+               "",
+               "## За сутки",
+               *fmt(views["day"]),
+               "",
+               "## За 30 дней",
+               *fmt(views["month"]),
+               "",
+               "## По стокам (7 дней)"]
+        for site, top in views["sites"].items():
+            out.append(f"- **{site}**: " + ", ".join(g for g, _ in top))
+        tg_bi, tg_words = views["telegram"]
+        return out + ["",
+                      "## Только Telegram (7 дней)",
+                      *fmt(tg_bi),
+                      "",
+                      "Слова: " + ", ".join(g for g, _ in tg_words),
+                      ""]
+
+    def bounds():
+        if notes is None:
+            return []
+        out = ["## Точность оценок",
+               f"Веса затухают с полураспадом {HALF_LIFE_DAYS:g} дн.; на словарь — не больше {SKETCH_K} счётчиков "
+               "(Space-Saving). Вес — гарантированный минимум, в скобках — на сколько точный вес может быть больше.",
+               ""]
+        for kind, title in (("bi", "биграммы"), ("tri", "триграммы"), ("words", "слова")):
+            n = notes[kind]
+            line = (f"- {title}: {n['counters']}/{n['k']} счётчиков, вес вне таблицы ≤ {n['bound']:.2f} "
+                    f"(общий вес {n['total']:.1f})")
+            if "overlap" in n:
+                line += (f"; сверка с точным подсчётом: ТОП-{n['top']} совпадает на {n['overlap']}, "
+                         f"макс. занижение {n['max_error']:.2f}, границы {'соблюдены' if n['within'] else 'НАРУШЕНЫ'}")
+            out.append(line)
+        return out + [""]
+
     md = [
         "---",
         "layout: page",
@@ -277,6 +881,8 @@ def write_report() -> None:
         "## Сигналы из страниц трендов (Getty/Adobe/Shutterstock/Pond5)",
         *fmt(kw_pages, 25),
         "",
+        *sections(),
+        *bounds(),
         "> Используйте фразы как темы съёмок и ключевые слова при загрузке на стоки.",
         "",
     ]
@@ -285,5 +891,26 @@ def write_report() -> None:
     (OUT_DIR / "index.md").write_text("\n".join(md), encoding="utf-8")
 
 
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Отчёт docs/trends/index.md")
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("TRENDS_WORKERS", "1")),
+                    help="процессов для подсчёта по каталогу; 0 — по числу ядер")
+    ap.add_argument("--scoring", choices=("window", "decay"), default=SCORING,
+                    help="window — точные счётчики за 7 дней, decay — затухающие веса в Space-Saving")
+    ap.add_argument("--sketch-check", action="store_true",
+                    help="с --scoring decay: сверить оценки с точным подсчётом по всему каталогу")
+    args = ap.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    metrics.start("trends")
+    http_client.start()   # дедлайн сетевой части прогона (RUN_DEADLINE)
+    ok = False
+    try:
+        write_report(workers, args.scoring, args.sketch_check)
+        ok = True
+    finally:
+        metrics.finish(ok)
+
+
 if __name__ == "__main__":
-    write_report()
+    main()
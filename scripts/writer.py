@@ -1,7 +1,13 @@
-import csv, os, re, requests, sys
+import csv, os, re, sys, time, itertools, hashlib, heapq, threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from bs4 import BeautifulSoup
 
+import http_client
+import metrics
+from catalog import Cursor, UidIndex, open_catalog, parse_published
+from httpstate import StateStore
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 DOCS_DIR = os.path.join(os.path.dirname(__file__), "..", "docs")
 POSTS_DIR = os.path.join(DOCS_DIR, "_posts")
@@ -10,7 +16,26 @@ os.makedirs(POSTS_DIR, exist_ok=True)
 CATALOG = os.path.join(DATA_DIR, "catalog.csv")
 PUBLISHED = os.path.join(DATA_DIR, "published.csv")
 
+# Отбор кандидатов: oldest — по порядку каталога с сохранённым курсором (data/cache/writer_cursor.json),
+# newest — самые свежие, weight — по весу источника из trends, затем по свежести
+WRITER_ORDER = os.environ.get("WRITER_ORDER", "oldest")
+CURSOR_STATE = os.path.join(DATA_DIR, "cache", "writer_cursor.json")
+
 USE_OLLAMA = os.environ.get("USE_OLLAMA") == "1"
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3")
+OLLAMA_WORKERS = int(os.environ.get("OLLAMA_WORKERS", "2"))              # параллельных запросов к модели
+OLLAMA_TOKEN_BUDGET = int(os.environ.get("OLLAMA_TOKEN_BUDGET", "0"))    # токенов на прогон, 0 — без лимита
+OLLAMA_TIME_BUDGET = float(os.environ.get("OLLAMA_TIME_BUDGET", "600"))  # сек. на все выжимки прогона
+SUMMARY_CACHE = os.path.join(DATA_DIR, "cache", "summaries.json")
+
+# og:description: параллельная загрузка пулом соединений + кэш по ссылке
+DESC_CACHE = os.path.join(DATA_DIR, "cache", "descriptions.json")
+DESC_TTL = int(os.environ.get("WRITER_DESC_TTL", str(7 * 86400)))   # сек.
+WORKERS = int(os.environ.get("WRITER_WORKERS", "8"))
+HEAD_LIMIT = 512 * 1024   # дальше <head> не читаем
+RE_HEAD_END = re.compile(rb"</head\s*>", re.I)
+RE_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
 
 def slugify(txt):
     txt = txt.lower()
@@ -18,19 +43,9 @@ def slugify(txt):
     txt = re.sub(r"\s+", "-", txt).strip("-")
     return txt[:80] or "post"
 
-def load_catalog():
-    with open(CATALOG, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
-
 def load_published():
-    published = set()
-    if os.path.exists(PUBLISHED):
-        with open(PUBLISHED, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for r in reader:
-                published.add(r["uid"])
-    return published
+    # постоянный индекс uid (data/cache/published.uids.sqlite), дочитывает только новый хвост
+    return UidIndex(PUBLISHED)
 
 def append_published(uid, path):
     header = not os.path.exists(PUBLISHED)
@@ -40,43 +55,230 @@ def append_published(uid, path):
             writer.writeheader()
         writer.writerow({"uid": uid, "post_path": path})
 
+def published_ts(row):
+    dt = parse_published(row.get("published"))
+    return dt.timestamp() if dt else 0.0
+
+def select_batch(cat, published, limit, order=WRITER_ORDER):
+    """
+    Кандидаты для постов потоком, без загрузки каталога в память.
+    oldest: первые limit новых строк с места, где остановился прошлый запуск; возвращает и курсор,
+    его сохраняют только после того, как посты записаны.
+    newest/weight: куча на limit элементов по всем неопубликованным (heapq.nlargest).
+    """
+    if order == "oldest":
+        cursor = Cursor(cat.path, CURSOR_STATE)
+        todo = cat.unpublished(published, cursor)
+        batch = list(itertools.islice(todo, limit))
+        todo.close()
+        return batch, cursor
+    if order == "newest":
+        key = published_ts
+    elif order == "weight":
+        from trends import weight_for_source
+        key = lambda r: (weight_for_source(r.get("source")), published_ts(r))
+    else:
+        raise SystemExit(f"WRITER_ORDER: unknown policy {order!r} (oldest|newest|weight)")
+    return heapq.nlargest(limit, cat.unpublished(published), key=key), None
+
+def read_head(url):
+    # читаем страницу потоком и обрываем на </head>: мета-теги дальше не бывают;
+    # соединения — из общей сессии http_client (keep-alive, повторы, дедлайн прогона)
+    t0 = time.perf_counter()
+    with http_client.get(url, timeout=12, stream=True, record=False) as r:
+        if r.status_code >= 400:
+            # страница ошибки: её мета-теги не описание, и в кэш она попасть не должна
+            metrics.http(url, r.status_code, time.perf_counter() - t0, 0)
+            r.raise_for_status()
+        buf = b""
+        for chunk in r.iter_content(16 * 1024):
+            start = max(0, len(buf) - 8)
+            buf += chunk
+            m = RE_HEAD_END.search(buf, start)
+            if m:
+                buf = buf[:m.end()]
+                break
+            if len(buf) >= HEAD_LIMIT:
+                break
+        # charset из заголовка; иначе из <meta charset>, а не ISO-8859-1 по умолчанию requests
+        encoding = r.encoding if "charset" in r.headers.get("Content-Type", "").lower() else None
+    metrics.http(url, r.status_code, time.perf_counter() - t0, len(buf))
+    if not encoding:
+        m = RE_META_CHARSET.search(buf)
+        encoding = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        return buf.decode(encoding, errors="replace")
+    except LookupError:
+        return buf.decode("utf-8", errors="replace")
+
+def meta_description(html):
+    soup = BeautifulSoup(html, "html.parser")
+    og = soup.find("meta", attrs={"property":"og:description"})
+    if og and og.get("content"):
+        return og["content"]
+    desc = soup.find("meta", attrs={"name":"description"})
+    if desc and desc.get("content"):
+        return desc["content"]
+    return ""
+
 def fetch_description(url, fallback):
     try:
-        html = requests.get(url, timeout=12, headers={"User-Agent":"Mozilla/5.0"}).text
-        soup = BeautifulSoup(html, "html.parser")
-        og = soup.find("meta", attrs={"property":"og:description"})
-        if og and og.get("content"):
-            return og["content"]
-        desc = soup.find("meta", attrs={"name":"description"})
-        if desc and desc.get("content"):
-            return desc["content"]
+        desc = meta_description(read_head(url))
+        if desc:
+            return desc
     except Exception:
         pass
     return fallback or ""
 
+def prefetch_descriptions(rows):
+    """
+    Описания для всей пачки: свежие — из кэша data/cache/descriptions.json,
+    остальные — параллельно через общий пул соединений. Ошибки не кэшируются.
+    """
+    cache = StateStore(DESC_CACHE)
+    now = time.time()
+    for key in cache.keys():
+        if now - cache.get(key).get("ts", 0) > DESC_TTL:
+            cache.delete(key)
+
+    out = {}
+    missing = []
+    for row in rows:
+        link = row["link"]
+        hit = cache.get(link)
+        if "desc" in hit:
+            out[link] = hit["desc"]
+        elif link not in missing:
+            missing.append(link)
+
+    def load(link):
+        try:
+            return link, meta_description(read_head(link))
+        except http_client.DeadlineExceeded:
+            return link, None
+        except Exception as e:
+            print(f"WARN: description failed for {link}: {e}")
+            return link, None
+
+    cached = len(out)
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, WORKERS)) as pool:
+            for link, desc in pool.map(load, missing):
+                if desc is None:
+                    continue
+                cache.update(link, desc=desc, ts=now)
+                out[link] = desc
+    cache.save()
+    fetched = len(out) - cached
+    print(f"Descriptions: {cached} cached, {fetched} fetched, {len(missing) - fetched} failed")
+    return out
+
+def stub_summary(facts):
+    return "Кратко: " + (facts[:200] if facts else "")
+
+def summary_prompt(title, facts):
+    return f"Сделай краткую выжимку (3–5 предложений) и 5 буллетов пользы. Тема: {title}. Факты: {facts}"
+
+def summary_key(model, prompt, facts):
+    return hashlib.sha256("\x00".join([model, prompt, facts or ""]).encode("utf-8")).hexdigest()
+
+class Summarizer:
+    """
+    Выжимки через Ollama: не больше workers запросов одновременно, кэш по хэшу
+    (модель, промпт, факты) в data/cache/summaries.json и бюджет прогона по токенам
+    и времени. Вне бюджета или при ошибке — заглушка «Кратко: ...».
+    """
+
+    def __init__(self, url=OLLAMA_URL, model=OLLAMA_MODEL, workers=OLLAMA_WORKERS,
+                 token_budget=OLLAMA_TOKEN_BUDGET, time_budget=OLLAMA_TIME_BUDGET,
+                 cache_path=SUMMARY_CACHE):
+        self.url = url
+        self.model = model
+        self.workers = max(1, workers)
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.cache = StateStore(cache_path)
+        self.lock = threading.Lock()
+        self.tokens = 0
+        self.stats = {"cached": 0, "generated": 0, "fallback": 0}
+        self.deadline = None
+
+    def _left(self):
+        """Сколько секунд осталось (свой бюджет и дедлайн прогона); None — бюджет исчерпан."""
+        left = self.deadline - time.monotonic()
+        run_left = http_client.remaining()
+        if run_left is not None:
+            left = min(left, run_left - http_client.MIN_FETCH)
+        with self.lock:
+            over = self.token_budget and self.tokens >= self.token_budget
+        return None if over or left <= 0 else left
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def summarize(self, title, facts):
+        prompt = summary_prompt(title, facts)
+        key = summary_key(self.model, prompt, facts)
+        hit = self.cache.get(key)
+        if "response" in hit:
+            self._count("cached")
+            return hit["response"]
+        left = self._left()
+        if left is None:
+            self._count("fallback")
+            return stub_summary(facts)
+        try:
+            data = {"model": self.model, "prompt": prompt, "stream": False}
+            r = http_client.post(self.url, json=data, timeout=min(60, left))
+            if r.ok:
+                j = r.json()
+                text = j.get("response","").strip()
+                used = (j.get("prompt_eval_count") or 0) + (j.get("eval_count") or len(text) // 4)
+                with self.lock:
+                    self.tokens += used
+                if text:
+                    self.cache.update(key, response=text, model=self.model, ts=time.time())
+                    self._count("generated")
+                    return text
+        except Exception as e:
+            print(f"WARN: summary failed for {title[:60]!r}: {e}")
+        self._count("fallback")
+        return stub_summary(facts)
+
+    def summarize_many(self, items):
+        """items — список (title, facts); ответы в том же порядке."""
+        self.deadline = time.monotonic() + self.time_budget
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            out = list(pool.map(lambda it: self.summarize(*it), items))
+        self.cache.save()
+        took = time.monotonic() - t0
+        print(f"Summaries: {self.stats['generated']} generated, {self.stats['cached']} cached, "
+              f"{self.stats['fallback']} fallback, {self.tokens} tokens in {took:.1f}s")
+        return out
+
 def ai_summary(title, facts):
     if not USE_OLLAMA:
-        return "Кратко: " + (facts[:200] if facts else "")
-    try:
-        import json
-        prompt = f"Сделай краткую выжимку (3–5 предложений) и 5 буллетов пользы. Тема: {title}. Факты: {facts}"
-        data = {"model":"llama3", "prompt": prompt}
-        r = requests.post("http://localhost:11434/api/generate", json=data, timeout=60)
-        if r.ok:
-            j = r.json()
-            return j.get("response","").strip() or ("Кратко: " + (facts[:200] if facts else ""))
-    except Exception:
-        pass
-    return "Кратко: " + (facts[:200] if facts else "")
+        return stub_summary(facts)
+    return Summarizer(workers=1).summarize_many([(title, facts)])[0]
+
+def summarize_batch(items):
+    if not USE_OLLAMA:
+        return [stub_summary(facts) for _, facts in items]
+    return Summarizer().summarize_many(items)
 
-def write_post(row):
+def write_post(row, desc=None, body=None):
     title = row["title"]
     link = row["link"]
     date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     slug = slugify(title)
     filename = os.path.join(POSTS_DIR, f"{date}-{slug}.md")
-    desc = fetch_description(link, row.get("summary",""))
-    body = ai_summary(title, desc)
+    if desc is None:
+        desc = fetch_description(link, row.get("summary",""))
+    desc = desc or row.get("summary","")
+    if body is None:
+        body = ai_summary(title, desc)
     # Экранируем кавычки в заголовке
     safe_title = title.replace('"','\"')
     fm = f"---\nlayout: post\ntitle: \"{safe_title}\"\ndate: {date}\ntags: [дайджест]\n---\n"
@@ -85,20 +287,43 @@ def write_post(row):
         f.write(content)
     return filename
 
-def main(limit=5):
-    rows = load_catalog()
+def write(limit=5):
+    cat = open_catalog(CATALOG)
     published = load_published()
     created = []
-    for r in rows:
-        if r["uid"] in published:
-            continue
-        path = write_post(r)
-        rel = os.path.relpath(path, start=DOCS_DIR)
-        append_published(r["uid"], rel)
-        created.append(path)
-        if len(created) >= limit:
-            break
+    with metrics.stage("writer.select", order=WRITER_ORDER) as st:
+        batch, cursor = select_batch(cat, published, limit)
+        st["items"] = len(batch)
+    with metrics.stage("writer.descriptions") as st:
+        descs = prefetch_descriptions(batch)
+        st["items"] = len(descs)
+    facts = [descs.get(r["link"]) or r.get("summary","") for r in batch]
+    with metrics.stage("writer.summaries", ollama=USE_OLLAMA) as st:
+        bodies = summarize_batch([(r["title"], f) for r, f in zip(batch, facts)])
+        st["items"] = len(bodies)
+    with metrics.stage("writer.posts") as st:
+        for r, desc, body in zip(batch, facts, bodies):
+            path = write_post(r, desc, body)
+            rel = os.path.relpath(path, start=DOCS_DIR)
+            append_published(r["uid"], rel)
+            published.add(r["uid"])
+            created.append(path)
+        published.commit()
+        st["items"] = len(created)
+    if cursor is not None:
+        cursor.save()
+    cat.close()
     print("Created posts:\n" + "\n".join(created))
 
+def main(limit=5):
+    metrics.start("writer")
+    http_client.start()   # дедлайн сетевой части прогона (RUN_DEADLINE)
+    ok = False
+    try:
+        write(limit)
+        ok = True
+    finally:
+        metrics.finish(ok)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Починка хвоста каталога (catalog.repair_tail): оборванная запись отрезается,
+целая запись без перевода строки остаётся и получает \\r\\n.
+
+  python -m pytest tests
+"""
+
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from catalog import FIELDS, CatalogWriter, repair_tail  # noqa: E402
+
+HEADER = (",".join(FIELDS) + "\r\n").encode("utf-8")
+ROW = 'a1,"Заголовок, с запятой",https://example.com/1,example.com,2024-01-01T00:00:00+00:00,"текст\nв две строки",a1'.encode("utf-8")
+
+
+def catalog(tmp_path: pathlib.Path, body: bytes) -> pathlib.Path:
+    path = tmp_path / "catalog.csv"
+    path.write_bytes(HEADER + body)
+    return path
+
+
+def test_complete_row_without_newline_is_kept(tmp_path):
+    path = catalog(tmp_path, ROW)
+    assert repair_tail(path) == 0
+    assert path.read_bytes() == HEADER + ROW + b"\r\n"
+
+
+def test_torn_row_is_cut(tmp_path):
+    # посреди поля без кавычек (полей меньше) и внутри поля в кавычках (кавычка не закрыта)
+    for torn in (ROW[:ROW.index(b"example.com,") + 5], ROW[:ROW.index(b"\n") + 3]):
+        path = catalog(tmp_path, ROW + b"\r\n" + torn)
+        assert repair_tail(path) == len(torn)
+        assert path.read_bytes() == HEADER + ROW + b"\r\n"
+
+
+def test_torn_utf8_is_cut(tmp_path):
+    torn = ROW[:ROW.index("Заголовок".encode("utf-8")) + 1]   # полсимвола
+    path = catalog(tmp_path, ROW + b"\r\n" + torn)
+    assert repair_tail(path) == len(torn)
+
+
+def test_header_only_without_newline_is_kept(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_bytes(HEADER[:-2])
+    assert repair_tail(path) == 0
+    assert path.read_bytes() == HEADER
+
+
+def test_writer_appends_after_unterminated_row(tmp_path):
+    path = catalog(tmp_path, ROW)
+    w = CatalogWriter(path)
+    w.append(["b2", "t", "https://example.com/2", "example.com", "2024-01-02T00:00:00+00:00", "s", "b2"])
+    w.commit()
+    assert path.read_bytes().endswith(ROW + b"\r\nb2,t,https://example.com/2,example.com,2024-01-02T00:00:00+00:00,s,b2\r\n")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Догонка Telegram-канала (collector.tg_catch_up): дыра закрывается только страницами,
+которые до неё дошли; пустая страница листания оставляет её следующему запуску.
+
+  python -m pytest tests
+"""
+
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import collector  # noqa: E402
+
+
+def post(i: int) -> dict:
+    return {"link": f"https://t.me/chan/{i}", "title": f"post {i}"}
+
+
+def pages(monkeypatch, by_cursor: dict):
+    """parse_tg_html по словарю {after: страница}; страница-исключение — бросается."""
+    def fake(channel, after=0, query=""):
+        page = by_cursor[after]
+        if isinstance(page, Exception):
+            raise page
+        return page, False
+    monkeypatch.setattr(collector, "parse_tg_html", fake)
+    monkeypatch.setattr(collector.HEALTH, "paused", lambda channel, path: False)
+
+
+def test_catch_up_reads_gap(monkeypatch):
+    pages(monkeypatch, {10: [post(11), post(12)], 12: [post(13), post(14), post(15)]})
+    items, upto = collector.tg_catch_up("chan", 10, 14)
+    assert [it["title"] for it in items] == ["post 11", "post 12", "post 13"]
+    assert upto == 14
+
+
+def test_empty_page_keeps_gap(monkeypatch):
+    # JS-заглушка / лимит: страница без сообщений — дыру не закрываем
+    pages(monkeypatch, {10: [post(11)], 11: []})
+    items, upto = collector.tg_catch_up("chan", 10, 20)
+    assert [it["title"] for it in items] == ["post 11"]
+    assert upto == 11
+
+
+def test_known_only_page_keeps_gap(monkeypatch):
+    pages(monkeypatch, {10: None})   # tg_page_items: все сообщения уже известны
+    assert collector.tg_catch_up("chan", 10, 20) == ([], 10)
+
+
+def test_error_keeps_gap(monkeypatch):
+    pages(monkeypatch, {10: ValueError("no message blocks")})
+    assert collector.tg_catch_up("chan", 10, 20) == ([], 10)
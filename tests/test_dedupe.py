@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Склейка почти-дубликатов (scripts/dedupe.py): перепечатка сюжета попадает в кластер
+первой строки, а шаблонные посты с разными цифрами и датами — нет.
+
+  python -m pytest tests
+"""
+
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from dedupe import NearDupIndex, shingles, words_of  # noqa: E402
+
+# ежедневная сводка одного канала: меняются только дата и цифры, шинглов общих ~0.57
+WEATHER = ("Погода в Москве на {day} октября: днём до {t} градусов, ночью около {n}, ветер слабый. "
+           "Осадков не ожидается, атмосферное давление в норме, магнитных бурь синоптики не прогнозируют. "
+           "Подписывайтесь на канал, чтобы получать прогноз каждое утро.")
+DAYS = [dict(day=15, t=12, n=5), dict(day=16, t=10, n=4), dict(day=17, t=9, n=2),
+        dict(day=18, t=11, n=3), dict(day=19, t=8, n=1)]
+STORY = ("Минцифры предложило обязать маркетплейсы хранить данные о продавцах не менее трёх лет "
+         "и передавать их налоговой службе по запросу, законопроект опубликован для обсуждения")
+
+
+def index(tmp_path: pathlib.Path) -> NearDupIndex:
+    csv = tmp_path / "catalog.csv"
+    csv.write_text("uid,title,summary,published,cluster_id\n", encoding="utf-8")
+    return NearDupIndex(csv, tmp_path / "neardup.sqlite")
+
+
+def jaccard(a: str, b: str) -> float:
+    x, y = shingles(words_of(a)), shingles(words_of(b))
+    return len(x & y) / len(x | y)
+
+
+def test_template_posts_stay_apart(tmp_path):
+    texts = [WEATHER.format(**d) for d in DAYS]
+    assert jaccard(texts[0], texts[1]) > 0.5   # шаблон и правда почти тот же
+    dups = index(tmp_path)
+    try:
+        clusters = [dups.assign(f"weather-{i}", text, ts=1.7e9 + i) for i, text in enumerate(texts)]
+    finally:
+        dups.close()
+    assert clusters == [f"weather-{i}" for i in range(len(texts))]
+
+
+def test_reprint_joins_first_row(tmp_path):
+    reprint = STORY + ", сообщает ТАСС"
+    dups = index(tmp_path)
+    try:
+        first = dups.assign("story-0", STORY, ts=1.7e9)
+        second = dups.assign("story-1", reprint, ts=1.7e9 + 60)
+    finally:
+        dups.close()
+    assert (first, second) == ("story-0", "story-0")
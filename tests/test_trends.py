@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Подсчёт трендов (scripts/trends.py): numpy-движок при переполнении словаря
+переходит на Python-путь с тем же результатом; rank — как most_common, кроме
+порядка равных весов.
+
+  python -m pytest tests
+"""
+
+import collections
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import trends  # noqa: E402
+
+ngram_np = pytest.importorskip("ngram_np")
+
+ROWS = [
+    {"source": "example.com", "title": "Съёмка осеннего леса с дрона",
+     "summary": "Осенний лес с дрона снимают на рассвете, туман над рекой"},
+    {"source": "t.me", "title": "Туман над рекой на рассвете",
+     "summary": "Съёмка тумана и осеннего леса, советы по дрону"},
+    {"source": "example.com", "title": "Городской фестиваль света",
+     "summary": "Фестиваль света в городе: проекции на фасадах и толпы на улицах"},
+]
+
+
+class FakeCatalog:
+    path = ROOT   # существует
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def small_vocab(monkeypatch):
+    """Свежий numpy-движок со словарём на пару токенов: переполнение на первом же подсчёте."""
+    monkeypatch.setattr(ngram_np, "MAX_VOCAB", 4)
+    monkeypatch.setattr(trends, "VECTOR", ngram_np.VectorCounter(trends.ENGINE))
+    monkeypatch.setattr(trends, "ENGINE_NAME", "numpy")
+
+
+def test_count_rows_falls_back(small_vocab, capsys):
+    got = trends.count_rows(ROWS)
+    assert trends.VECTOR is None and trends.ENGINE_NAME == "python"
+    assert "WARN" in capsys.readouterr().out
+    assert got == trends.count_rows_py(ROWS)
+
+
+def test_vector_top_falls_back(small_vocab, monkeypatch):
+    monkeypatch.setattr(trends, "USE_SHARDS", False)
+    monkeypatch.setattr(trends, "open_catalog", lambda path: FakeCatalog())
+    monkeypatch.setattr(trends, "window_buckets", lambda cat, cutoffs, per_day: {("2024-01-01", 1): ROWS})
+    got = trends.top_words_and_phrases(7)
+    assert trends.VECTOR is None
+    words, bi, tri = trends.merge_counts([trends.count_rows_py(ROWS)])
+    assert got[0] and got == (trends.rank(words, 30), trends.rank(bi, 30), trends.rank(tri, 20))
+
+
+
+def test_rank_matches_most_common_up_to_ties():
+    # порядок вставки — «первое появление», как у счётчика по строкам каталога
+    counter = collections.Counter({"щ": 3.0, "б": 1.0, "я": 2.0, "а": 2.0, "ю": 2.0})
+    for n in range(1, len(counter) + 1):
+        got, want = trends.rank(counter, n), counter.most_common(n)
+        assert [w for _, w in got] == [w for _, w in want]
+    # равные веса: most_common — по первому появлению, rank — по алфавиту, в том числе на границе ТОПа
+    assert counter.most_common(2) == [("щ", 3.0), ("я", 2.0)]
+    assert trends.rank(counter, 2) == [("щ", 3.0), ("а", 2.0)]
+    assert trends.rank(counter, 5) == [("щ", 3.0), ("а", 2.0), ("ю", 2.0), ("я", 2.0), ("б", 1.0)]